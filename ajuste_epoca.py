@@ -0,0 +1,260 @@
+# Licensed under the EUPL
+# Módulo ajuste_epoca.py
+
+import numpy as np
+import catalogos
+import precesion
+
+# Ajuste de la época y del desplazamiento en longitud de un catálogo antiguo.
+# Se emparejan las estrellas del catálogo antiguo, por ejemplo el del Almagesto, con las
+# estrellas actuales, por código de constelación y número de secuencia, se precesan las
+# estrellas actuales a todas las épocas de una rejilla, y se calcula a la vez, con
+# operaciones matriciales, la suma de los cuadrados de las diferencias de longitud en
+# cada época, para todas las estrellas, cada constelación y cada región.
+# La época ajustada es la que hace mínima esa suma; el desplazamiento es la media de las
+# diferencias de longitud, antigua menos actual precesada, en la época del catálogo. Un
+# desplazamiento negativo sitúa las longitudes antiguas en una época anterior.
+EPOCA_PTOLOMEO = 138.0
+EPOCAS = np.arange(-1000.0, 1501.0, 1.0)
+
+# Épocas nominales de los catálogos antiguos. Las longitudes alfonsíes "ptolomeo" son las
+# del Almagesto, y las "j2000" las de las tablas alfonsíes, 17° 8' mayores. Las de Teón
+# tienen un desplazamiento propio, que se corrige al identificar las estrellas.
+EPOCAS_CATALOGOS = {
+    "ptolomeo": EPOCA_PTOLOMEO,
+    "alfonso_ptolomeo": EPOCA_PTOLOMEO,
+    "alfonso_j2000": 1252.0,
+    "teon": EPOCA_PTOLOMEO,
+}
+
+# Radio, en grados, de la identificación de las estrellas actuales con las antiguas.
+RADIO_IDENTIFICACION = 2.0
+
+
+# Diferencia de dos longitudes en grados, entre -180° y 180°.
+def diferencia_longitud(lon_a, lon_b):
+
+    return (np.asarray(lon_a, dtype=np.float64) - lon_b + 180.0) % 360.0 - 180.0
+
+
+# Clave de cada estrella: código de la constelación, una "C" en las estrellas informadas
+# cerca, que el Almagesto numera aparte, y número de secuencia.
+def claves_estrellas(codigos, secuencias, cerca=None):
+
+    claves = np.char.add(np.asarray(codigos, dtype="U2"), np.char.zfill(np.asarray(secuencias).astype(str), 3))
+    if cerca is not None:
+        claves = np.char.add(claves, np.where(cerca, "C", ""))
+
+    return claves
+
+
+# Emparejamiento de dos listas de claves. Se devuelven los índices de las estrellas
+# emparejadas en cada lista; las claves repetidas o sin pareja se descartan.
+def emparejar_claves(claves_a, claves_b):
+
+    unicas_a, cuenta_a = np.unique(claves_a, return_counts=True)
+    unicas_b, cuenta_b = np.unique(claves_b, return_counts=True)
+    validas = np.intersect1d(unicas_a[cuenta_a == 1], unicas_b[cuenta_b == 1])
+
+    _, indices_a, _ = np.intersect1d(claves_a, validas, return_indices=True)
+    _, indices_b, _ = np.intersect1d(claves_b, validas, return_indices=True)
+
+    return indices_a, indices_b
+
+
+# Identificación de estrellas actuales con un catálogo antiguo.
+# Los números de secuencia de los ficheros de estrellas actuales no son los del Almagesto,
+# por lo que se asigna a cada estrella actual el número de secuencia de la estrella
+# antigua de su constelación más próxima, una vez precesada a la época del catálogo y
+# corregida la mediana de las diferencias de longitud. Solo se aceptan las parejas que
+# son mutuamente las más próximas, a menos del radio indicado. Se devuelve el número de
+# secuencia, o -1, y si es una estrella informada cerca.
+def identificar_secuencias(antiguo, codigos, lon, lat, radio=RADIO_IDENTIFICACION):
+
+    cerca = antiguo.get("cerca", np.zeros(len(antiguo["codigo"]), dtype=bool))
+    vectores_antiguos = precesion.vectores(antiguo["lon"], antiguo["lat"])
+    otra_constelacion = np.asarray(codigos)[:, np.newaxis] != antiguo["codigo"][np.newaxis, :]
+
+    correccion = 0.0
+    for _ in range(2):
+        coseno = precesion.vectores(np.asarray(lon) + correccion, lat) @ vectores_antiguos.T
+        coseno[otra_constelacion] = -2.0
+        mas_proxima = np.argmax(coseno, axis=1)
+        separacion = np.degrees(np.arccos(np.clip(coseno[np.arange(len(mas_proxima)), mas_proxima], -1.0, 1.0)))
+        aceptadas = separacion < radio
+        if aceptadas.any():
+            correccion = correccion + np.median(
+                diferencia_longitud(antiguo["lon"][mas_proxima[aceptadas]], np.asarray(lon)[aceptadas] + correccion)
+            )
+
+    mutua = np.argmax(coseno, axis=0)[mas_proxima] == np.arange(len(mas_proxima))
+    aceptadas = aceptadas & mutua
+
+    secuencias = np.where(aceptadas, antiguo["secuencia"][mas_proxima], -1)
+
+    return secuencias, aceptadas & cerca[mas_proxima]
+
+
+# Parejas de estrellas de un catálogo antiguo y de un fichero de estrellas actuales.
+# Se devuelven los índices de las estrellas emparejadas en cada catálogo y las
+# longitudes y latitudes J2000 de las estrellas actuales emparejadas.
+def parejas_catalogos(antiguo="ptolomeo", actual="actuales", epoca_catalogo=EPOCA_PTOLOMEO):
+
+    estrellas_antiguas = catalogos.cargar_catalogo(antiguo)
+    estrellas_actuales = catalogos.cargar_catalogo(actual)
+    lon_j2000, lat_j2000 = precesion.posiciones_j2000(actual)
+
+    lon, lat = precesion.precesar(lon_j2000, lat_j2000, epoca_catalogo)
+    secuencias, cerca = identificar_secuencias(estrellas_antiguas, estrellas_actuales["codigo"], lon, lat)
+    claves_actuales = claves_estrellas(estrellas_actuales["codigo"], secuencias, cerca)
+    claves_actuales[secuencias < 0] = ""
+
+    claves_antiguas = claves_estrellas(
+        estrellas_antiguas["codigo"], estrellas_antiguas["secuencia"], estrellas_antiguas.get("cerca")
+    )
+    indices_antiguos, indices_actuales = emparejar_claves(claves_antiguas, claves_actuales)
+
+    return indices_antiguos, indices_actuales, lon_j2000[indices_actuales], lat_j2000[indices_actuales]
+
+
+# Región de cada estrella de un catálogo: "zodiacal", si el catálogo distingue las
+# constelaciones zodiacales, y si no "boreal" o "austral".
+def regiones_estrellas(estrellas):
+
+    regiones = np.where(estrellas["region"] == "BOR", "boreal", "austral")
+    if "zodiacal" in estrellas:
+        regiones = np.where(estrellas["zodiacal"], "zodiacal", regiones)
+
+    return regiones
+
+
+# Matriz de pertenencia de las estrellas a los grupos del ajuste: una columna para todas
+# las estrellas, una por constelación y una por región. Se devuelven la matriz y los
+# nombres de los grupos, como pares (tipo, nombre).
+def matriz_grupos(codigos, regiones):
+
+    grupos = [("global", "global")]
+    columnas = [np.ones(len(codigos), dtype=bool)]
+    for tipo, valores in (("constelaciones", codigos), ("regiones", regiones)):
+        for valor in np.unique(valores):
+            grupos.append((tipo, str(valor)))
+            columnas.append(valores == valor)
+
+    return np.stack(columnas, axis=1).astype(np.float64), grupos
+
+
+# Preparación del ajuste: parejas de estrellas, rejilla de épocas con las estrellas
+# actuales precesadas a cada época, y matriz de grupos. La preparación se hace una sola
+# vez, y después se puede ajustar muchas veces, por ejemplo con longitudes perturbadas.
+def preparar_ajuste(antiguo="ptolomeo", actual="actuales", epoca_catalogo=EPOCA_PTOLOMEO, epocas=EPOCAS):
+
+    indices_antiguos, indices_actuales, lon_j2000, lat_j2000 = parejas_catalogos(antiguo, actual, epoca_catalogo)
+    estrellas = catalogos.cargar_catalogo(antiguo)
+
+    epocas = np.asarray(epocas, dtype=np.float64)
+    lon_rejilla, lat_rejilla = precesion.precesar(lon_j2000, lat_j2000, epocas)
+    lon_catalogo, lat_catalogo = precesion.precesar(lon_j2000, lat_j2000, epoca_catalogo)
+
+    codigos = estrellas["codigo"][indices_antiguos]
+    pertenencia, grupos = matriz_grupos(codigos, regiones_estrellas(estrellas)[indices_antiguos])
+
+    return {
+        "antiguo": antiguo,
+        "actual": actual,
+        "epoca_catalogo": float(epoca_catalogo),
+        "epocas": epocas,
+        "indices_antiguos": indices_antiguos,
+        "indices_actuales": indices_actuales,
+        "codigos": codigos,
+        "lon": np.asarray(estrellas["lon"][indices_antiguos], dtype=np.float64),
+        "lat": np.asarray(estrellas["lat"][indices_antiguos], dtype=np.float64),
+        "lon_rejilla": lon_rejilla,
+        "lat_rejilla": lat_rejilla,
+        "lon_catalogo": lon_catalogo,
+        "lat_catalogo": lat_catalogo,
+        "pertenencia": pertenencia,
+        "grupos": grupos,
+    }
+
+
+# Mínimo de cada columna de una matriz de costes sobre una rejilla uniforme de épocas,
+# afinado con la parábola que pasa por el mínimo y sus dos vecinos.
+def minimo_rejilla(epocas, costes):
+
+    indice = np.argmin(costes, axis=0)
+    interior = np.clip(indice, 1, len(epocas) - 2)
+    columnas = np.arange(costes.shape[1])
+    anterior = costes[interior - 1, columnas]
+    central = costes[interior, columnas]
+    siguiente = costes[interior + 1, columnas]
+
+    curvatura = anterior - 2.0 * central + siguiente
+    with np.errstate(divide="ignore", invalid="ignore"):
+        paso = np.where(curvatura > 0, 0.5 * (anterior - siguiente) / curvatura, 0.0)
+    paso = np.where(indice == interior, np.clip(paso, -1.0, 1.0), 0.0)
+
+    return epocas[indice] + paso * (epocas[1] - epocas[0] if len(epocas) > 1 else 0.0)
+
+
+# Ajuste de la época y del desplazamiento en longitud.
+# Con las longitudes del catálogo antiguo, o con otras longitudes de las mismas estrellas,
+# se calculan las diferencias con las estrellas actuales en todas las épocas de la
+# rejilla, una matriz de épocas por estrellas, y se suman por grupos con un solo producto
+# de matrices. Se devuelve, por grupo, el número de estrellas, el desplazamiento medio y
+# su desviación típica en la época del catálogo, la época ajustada, los años que la
+# separan de la época del catálogo y el error cuadrático medio en la época ajustada.
+def ajustar(preparado, lon=None):
+
+    if lon is None:
+        lon = preparado["lon"]
+
+    diferencias = diferencia_longitud(lon, preparado["lon_rejilla"])
+    pertenencia = preparado["pertenencia"]
+    estrellas = pertenencia.sum(axis=0)
+    costes = (diferencias * diferencias) @ pertenencia
+
+    epocas_ajustadas = minimo_rejilla(preparado["epocas"], costes)
+    rms = np.sqrt(costes.min(axis=0) / estrellas)
+
+    diferencias_catalogo = diferencia_longitud(lon, preparado["lon_catalogo"])
+    desplazamiento = (diferencias_catalogo @ pertenencia) / estrellas
+    varianza = ((diferencias_catalogo * diferencias_catalogo) @ pertenencia) / estrellas - desplazamiento**2
+    desviacion = np.sqrt(np.maximum(varianza, 0.0))
+
+    return {
+        "epoca_ajustada": epocas_ajustadas,
+        "desplazamiento": desplazamiento,
+        "desviacion": desviacion,
+        "rms": rms,
+        "estrellas": estrellas,
+    }
+
+
+# Informe del ajuste, con un diccionario para todas las estrellas, otro por constelación y
+# otro por región.
+def informe_ajuste(preparado, resultado):
+
+    informe = {"global": None, "constelaciones": {}, "regiones": {}}
+    for indice, (tipo, nombre) in enumerate(preparado["grupos"]):
+        entrada = {
+            "estrellas": int(resultado["estrellas"][indice]),
+            "desplazamiento": float(resultado["desplazamiento"][indice]),
+            "desviacion": float(resultado["desviacion"][indice]),
+            "epoca": float(resultado["epoca_ajustada"][indice]),
+            "anos": float(resultado["epoca_ajustada"][indice] - preparado["epoca_catalogo"]),
+            "rms": float(resultado["rms"][indice]),
+        }
+        if tipo == "global":
+            informe["global"] = entrada
+        else:
+            informe[tipo][nombre] = entrada
+
+    return informe
+
+
+# Ajuste completo de un catálogo antiguo frente a las estrellas actuales.
+def ajuste_epoca(antiguo="ptolomeo", actual="actuales", epoca_catalogo=EPOCA_PTOLOMEO, epocas=EPOCAS):
+
+    preparado = preparar_ajuste(antiguo, actual, epoca_catalogo, epocas)
+
+    return informe_ajuste(preparado, ajustar(preparado))
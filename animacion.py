@@ -0,0 +1,279 @@
+# Licensed under the EUPL
+# Módulo animacion.py
+
+import argparse
+import os
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+from PIL import Image
+import catalogos
+import constelaciones
+import formats
+import precesion
+import proyeccion
+
+# Animación del barrido de la precesión.
+# Las estrellas actuales se precesan desde J2000 a una serie de épocas y se mueven sobre
+# las estrellas fijas del Almagesto, en el planisferio AzimuthalEquidistant o en el
+# gráfico PlateCarrée de una constelación. Cada proceso crea una sola figura, dibuja una
+# sola vez la retícula, las etiquetas y el Almagesto, y guarda ese fondo; en cada
+# fotograma restaura el fondo, cambia las posiciones de la colección de puntos de las
+# estrellas actuales con set_offsets y dibuja solo esa colección y el título con el año.
+# Los fotogramas se reparten por lotes de épocas consecutivas entre los procesos, y cada
+# lote se precesa y se proyecta de una vez. Las épocas son años astronómicos: el año 0 es
+# el 1 a.C., y el -299 el 300 a.C.
+EPOCA_INICIAL = -299.0
+EPOCA_FINAL = 2000.0
+FOTOGRAMAS = 500
+LOTE = 25
+PULGADAS = 10
+DPI = 80
+INTERVALO = 40
+
+# Argumentos de los gráficos de la animación: Almagesto y estrellas actuales, sin etiquetas.
+ARGUMENTOS_PLANISFERIO = ["s", "s", "n", "n", "n", "n", "s", "s", "n"]
+ARGUMENTOS_CONSTELACION = ["n", "n", "s", "n", "n", "s"]
+
+FICHERO_FOTOGRAMA = "fotograma_%05d.png"
+
+_animacion = None
+
+
+# Texto de un año astronómico, en años antes o después de Cristo.
+def texto_epoca(epoca):
+
+    ano = int(round(epoca))
+    if ano <= 0:
+        return str(1 - ano) + " a.C."
+
+    return str(ano) + " d.C."
+
+
+# Preparación de la figura de la animación.
+# Se dibuja el gráfico de la vista, "planisferio" o "constelacion", con las estrellas
+# actuales en la época inicial, se ajusta su tamaño, con el lado mayor de las pulgadas
+# indicadas, y se guarda el fondo sin la colección de las estrellas actuales ni el título.
+# Se devuelve un diccionario con la figura, la colección, el fondo y las longitudes y
+# latitudes J2000 de las estrellas de la colección.
+def preparar_animacion(vista="planisferio", codigo=None, pulgadas=PULGADAS, dpi=DPI, epoca=EPOCA_INICIAL, figura=None):
+
+    if vista == "planisferio":
+        nombre = formats.CATALOGOS_PLANISFERIO["j2000"]
+        seleccion = slice(None)
+        fig = formats.impresion_reticula_AzimuthalEquidistant(
+            *ARGUMENTOS_PLANISFERIO, mostrar="n", figura=figura, epoca=epoca
+        )
+    else:
+        conf = constelaciones.configuracion(codigo, "n", "n", "n", "s")
+        nombre, _, seleccion, _, _, _ = formats.capas_constelacion(conf, "n", *ARGUMENTOS_CONSTELACION[2:], epoca)[-1]
+        fig = formats.impresion_reticula_PlateCarree_Constelacion(
+            codigo, *ARGUMENTOS_CONSTELACION, mostrar="n", figura=figura, epoca=epoca
+        )
+
+    fig.set_size_inches(fig.get_size_inches() * pulgadas / max(fig.get_size_inches()))
+    fig.set_dpi(dpi)
+    ax = fig.axes[0]
+    puntos = next(coleccion for coleccion in ax.collections if coleccion.get_gid() == nombre)
+    titulo = ax.get_title()
+
+    puntos.set_animated(True)
+    ax.title.set_animated(True)
+    fig.canvas.draw()
+
+    lon, lat = precesion.posiciones_j2000(nombre)
+
+    return {
+        "figura": fig,
+        "ax": ax,
+        "puntos": puntos,
+        "titulo": titulo,
+        "fondo": fig.canvas.copy_from_bbox(fig.bbox),
+        "lon": lon[seleccion],
+        "lat": lat[seleccion],
+    }
+
+
+# Coordenadas nativas de las estrellas actuales de la animación en unas épocas: dos
+# matrices de épocas por estrellas, con una sola precesión y una sola proyección.
+def posiciones_epocas(animacion, epocas):
+
+    lon, lat = precesion.precesar(animacion["lon"], animacion["lat"], np.asarray(epocas, dtype=np.float64))
+    x, y = proyeccion.proyectar(animacion["ax"].projection, lon.ravel(), lat.ravel())
+
+    return x.reshape(lon.shape), y.reshape(lat.shape)
+
+
+# Dibujo de un fotograma sobre el fondo guardado, con las coordenadas nativas de las
+# estrellas actuales en su época. Se devuelve la imagen del fotograma.
+def dibujar_fotograma(animacion, epoca, x, y):
+
+    fig = animacion["figura"]
+    ax = animacion["ax"]
+
+    fig.canvas.restore_region(animacion["fondo"])
+    animacion["puntos"].set_offsets(np.column_stack([x, y]))
+    ax.title.set_text(animacion["titulo"].strip() + ", " + texto_epoca(epoca))
+    ax.draw_artist(animacion["puntos"])
+    ax.draw_artist(ax.title)
+
+    return Image.fromarray(np.asarray(fig.canvas.buffer_rgba())).convert("RGB")
+
+
+# Preparación de cada proceso de la animación: motor Agg, catálogos y figura.
+def iniciar_proceso(vista, codigo, pulgadas, dpi, epoca):
+
+    global _animacion
+
+    matplotlib.use("Agg", force=True)
+
+    for nombre in catalogos.CATALOGOS:
+        catalogos.cargar_catalogo(nombre)
+
+    _animacion = preparar_animacion(vista, codigo, pulgadas, dpi, epoca, plt.figure())
+
+
+# Impresión de un lote de fotogramas consecutivos en el directorio indicado.
+# Se devuelven las rutas de los fotogramas.
+def imprimir_lote(indices, epocas, directorio):
+
+    x, y = posiciones_epocas(_animacion, epocas)
+
+    ficheros = []
+    for fila, (indice, epoca) in enumerate(zip(indices, epocas)):
+        ruta = os.path.join(directorio, FICHERO_FOTOGRAMA % indice)
+        dibujar_fotograma(_animacion, epoca, x[fila], y[fila]).save(ruta)
+        ficheros.append(ruta)
+
+    return ficheros
+
+
+# Montaje de un GIF con los fotogramas, con el intervalo indicado en milisegundos.
+def montar_gif(ficheros, ruta, intervalo=INTERVALO):
+
+    with Image.open(ficheros[0]) as primera:
+        primera.save(
+            ruta,
+            save_all=True,
+            append_images=(Image.open(fichero) for fichero in ficheros[1:]),
+            duration=intervalo,
+            loop=0,
+        )
+
+
+# Montaje de un vídeo MP4 con los fotogramas, con el ffmpeg que tenga configurado
+# matplotlib.
+def montar_mp4(directorio, ruta, intervalo=INTERVALO):
+
+    subprocess.run(
+        [
+            matplotlib.rcParams["animation.ffmpeg_path"],
+            "-y",
+            "-loglevel",
+            "error",
+            "-framerate",
+            str(1000.0 / intervalo),
+            "-i",
+            os.path.join(directorio, FICHERO_FOTOGRAMA),
+            "-vf",
+            "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-pix_fmt",
+            "yuv420p",
+            ruta,
+        ],
+        check=True,
+    )
+
+
+# Animación del barrido de la precesión, en un conjunto de procesos.
+# Se imprimen los fotogramas de las épocas, de la inicial a la final, en el directorio de
+# salida, y se montan en los formatos "gif", "mp4" o "png"; con "png" se conservan los
+# fotogramas numerados, y sin él se borran después del montaje. Se devuelve un resumen
+# con las épocas, los ficheros escritos y los segundos empleados.
+def animar(
+    directorio,
+    vista="planisferio",
+    codigo=None,
+    inicio=EPOCA_INICIAL,
+    fin=EPOCA_FINAL,
+    fotogramas=FOTOGRAMAS,
+    formatos=("gif",),
+    procesos=None,
+    lote=LOTE,
+    pulgadas=PULGADAS,
+    dpi=DPI,
+    intervalo=INTERVALO,
+):
+
+    os.makedirs(directorio, exist_ok=True)
+    inicio_reloj = time.perf_counter()
+
+    epocas = np.linspace(inicio, fin, fotogramas)
+    lotes = [np.arange(primero, min(primero + lote, fotogramas)) for primero in range(0, fotogramas, lote)]
+
+    with ProcessPoolExecutor(
+        max_workers=procesos, initializer=iniciar_proceso, initargs=(vista, codigo, pulgadas, dpi, inicio)
+    ) as ejecutor:
+        pendientes = [ejecutor.submit(imprimir_lote, indices, epocas[indices], directorio) for indices in lotes]
+        fotogramas_impresos = [fichero for pendiente in pendientes for fichero in pendiente.result()]
+
+    nombre = "precesion_" + (vista if vista == "planisferio" else codigo)
+    ficheros = []
+    if "gif" in formatos:
+        ficheros.append(os.path.join(directorio, nombre + ".gif"))
+        montar_gif(fotogramas_impresos, ficheros[-1], intervalo)
+    if "mp4" in formatos:
+        ficheros.append(os.path.join(directorio, nombre + ".mp4"))
+        montar_mp4(directorio, ficheros[-1], intervalo)
+    if "png" in formatos:
+        ficheros.extend(fotogramas_impresos)
+    else:
+        for fichero in fotogramas_impresos:
+            os.remove(fichero)
+
+    return {
+        "vista": vista,
+        "codigo": codigo,
+        "epocas": epocas,
+        "ficheros": ficheros,
+        "procesos": procesos or os.cpu_count(),
+        "segundos": time.perf_counter() - inicio_reloj,
+    }
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Animación del barrido de la precesión.")
+    parser.add_argument("directorio", help="directorio de salida")
+    parser.add_argument("--constelacion", default=None, help="código de la constelación; por omisión, el planisferio")
+    parser.add_argument("--inicio", type=float, default=EPOCA_INICIAL, help="año astronómico inicial")
+    parser.add_argument("--fin", type=float, default=EPOCA_FINAL, help="año astronómico final")
+    parser.add_argument("--fotogramas", type=int, default=FOTOGRAMAS)
+    parser.add_argument("--formatos", nargs="+", default=["gif"], choices=["gif", "mp4", "png"])
+    parser.add_argument("--procesos", type=int, default=None)
+    parser.add_argument("--lote", type=int, default=LOTE)
+    parser.add_argument("--pulgadas", type=float, default=PULGADAS)
+    parser.add_argument("--dpi", type=int, default=DPI)
+    argumentos = parser.parse_args()
+
+    resumen = animar(
+        argumentos.directorio,
+        "planisferio" if argumentos.constelacion is None else "constelacion",
+        argumentos.constelacion,
+        argumentos.inicio,
+        argumentos.fin,
+        argumentos.fotogramas,
+        argumentos.formatos,
+        argumentos.procesos,
+        argumentos.lote,
+        argumentos.pulgadas,
+        argumentos.dpi,
+    )
+    print(len(resumen["epocas"]), "fotogramas en", round(resumen["segundos"], 1), "segundos")
+
+
+if __name__ == "__main__":
+    main()
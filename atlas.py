@@ -0,0 +1,373 @@
+# Licensed under the EUPL
+# Módulo atlas.py
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+import catalogos
+import cache_catalogos
+import constelaciones
+import formats
+
+# Combinaciones de catálogos de los gráficos de constelación del atlas.
+# Cada combinación indica los argumentos diferencia_ptolomeo_alfonso, ptolomeo, teon,
+# alfonso y j2000 de impresion_reticula_PlateCarree_Constelacion. Con "requiere", la
+# combinación solo se genera para las constelaciones que tienen estrellas en ese
+# catálogo.
+COMBINACIONES = {
+    "ptolomeo_j2000": {"argumentos": ["n", "s", "n", "n", "s"]},
+    "ptolomeo_alfonso": {"argumentos": ["n", "s", "n", "s", "n"]},
+    "diferencia_ptolomeo_alfonso": {"argumentos": ["s", "s", "n", "s", "n"]},
+    "alfonso_j2000": {"argumentos": ["n", "n", "n", "s", "s"]},
+    "ptolomeo_teon_j2000": {"argumentos": ["n", "s", "s", "n", "s"], "requiere": "teon"},
+}
+
+# Planisferios del atlas, con los nueve argumentos de impresion_reticula_AzimuthalEquidistant.
+PLANISFERIOS = {
+    "planisferio_ptolomeo_j2000": ["s", "s", "s", "n", "s", "s", "s", "s", "s"],
+    "planisferio_ptolomeo_alfonso": ["s", "s", "s", "s", "s", "s", "n", "s", "s"],
+}
+
+FICHERO_MANIFIESTO = "manifiesto.json"
+
+# Base de datos de la impresión incremental.
+# En el directorio de salida se guarda, por cada gráfico, la huella de las filas de los
+# catálogos que intervienen en él y de los ajustes de impresión. Al volver a construir el
+# atlas solo se imprimen los gráficos cuya huella ha cambiado o cuyos ficheros faltan.
+# De las filas solo forman parte de la huella las columnas que dibuja cada tipo de
+# gráfico: los desplazamientos y anclas de las etiquetas de los gráficos de constelación
+# o los del planisferio. Los nombres de las estrellas no aparecen en los gráficos. La huella incluye el código de los módulos que intervienen en la impresión de los
+# gráficos, de modo que un cambio en cualquiera de ellos vuelve a imprimir el atlas.
+FICHERO_CONSTRUCCION = "construccion.json"
+VERSION_CONSTRUCCION = 3
+CAMPOS_HUELLA = {
+    "constelacion": (
+        "codigo",
+        "secuencia",
+        "cerca",
+        "lon",
+        "lat",
+        "tam",
+        "desp_lon",
+        "desp_lat",
+        "ancla_lon",
+        "ancla_lat",
+    ),
+    "planisferio": (
+        "codigo",
+        "secuencia",
+        "cerca",
+        "lon",
+        "lat",
+        "tam",
+        "desp_lon_planisferio",
+        "desp_lat_planisferio",
+        "ancla_lon_planisferio",
+        "ancla_lat_planisferio",
+    ),
+}
+MODULOS_IMPRESION = (
+    "formats",
+    "etiquetas",
+    "detalle",
+    "proyeccion",
+    "precesion",
+    "ajuste_epoca",
+    "indice",
+    "constelaciones",
+    "catalogos",
+)
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+_figura = None
+
+
+# Lista de trabajos del atlas.
+# Cada trabajo es un diccionario con su nombre, que es también el nombre de los ficheros
+# de salida, su tipo, "constelacion" o "planisferio", y los argumentos de la función de
+# impresión. Por omisión se generan todas las constelaciones del registro, con todas las
+# combinaciones, y todos los planisferios.
+def trabajos_atlas(codigos=None, combinaciones=None, planisferios=None):
+
+    trabajos = []
+
+    for nombre in PLANISFERIOS if planisferios is None else planisferios:
+        trabajos.append({"nombre": nombre, "tipo": "planisferio", "argumentos": PLANISFERIOS[nombre]})
+
+    for codigo in constelaciones.CONSTELACIONES if codigos is None else codigos:
+        for nombre in COMBINACIONES if combinaciones is None else combinaciones:
+            combinacion = COMBINACIONES[nombre]
+            if "requiere" in combinacion:
+                if codigo not in np.unique(catalogos.cargar_catalogo(combinacion["requiere"])["codigo"]):
+                    continue
+            trabajos.append(
+                {
+                    "nombre": codigo + "_" + nombre,
+                    "tipo": "constelacion",
+                    "argumentos": [codigo, combinacion["argumentos"][0], "s"] + combinacion["argumentos"][1:],
+                }
+            )
+
+    return trabajos
+
+
+# Preparación de cada proceso de impresión.
+# Se usa el motor Agg, sin ventanas, se cargan todos los catálogos una sola vez y se crea
+# la figura que se reutiliza en todos los trabajos del proceso.
+def iniciar_proceso():
+
+    global _figura
+
+    matplotlib.use("Agg", force=True)
+
+    for nombre in catalogos.CATALOGOS:
+        catalogos.cargar_catalogo(nombre)
+
+    _figura = plt.figure()
+
+
+# Impresión de un trabajo del atlas en los formatos indicados.
+# Se devuelve la entrada del manifiesto: nombre, ficheros escritos, segundos empleados y
+# proceso que lo ha impreso.
+def imprimir_trabajo(trabajo, directorio, formatos, dpi):
+
+    inicio = time.perf_counter()
+
+    if trabajo["tipo"] == "planisferio":
+        fig = formats.impresion_reticula_AzimuthalEquidistant(*trabajo["argumentos"], mostrar="n", figura=_figura)
+    else:
+        fig = formats.impresion_reticula_PlateCarree_Constelacion(*trabajo["argumentos"], mostrar="n", figura=_figura)
+
+    ficheros = []
+    for formato in formatos:
+        ruta = os.path.join(directorio, trabajo["nombre"] + "." + formato)
+        fig.savefig(ruta, dpi=dpi)
+        ficheros.append(ruta)
+
+    return {
+        "nombre": trabajo["nombre"],
+        "tipo": trabajo["tipo"],
+        "argumentos": trabajo["argumentos"],
+        "ficheros": ficheros,
+        "segundos": time.perf_counter() - inicio,
+        "proceso": os.getpid(),
+    }
+
+
+# Trabajos del manifiesto guardado en un directorio de salida, o lista vacía si no existe.
+def leer_manifiesto(directorio):
+
+    try:
+        with open(os.path.join(directorio, FICHERO_MANIFIESTO), "r", encoding="utf-8") as archivo:
+            return json.load(archivo)["trabajos"]
+    except (OSError, ValueError, KeyError):
+        return []
+
+
+# Impresión por lotes del atlas, sin ventanas, en un conjunto de procesos.
+# Se imprimen los trabajos indicados, o todos los de trabajos_atlas(), en los formatos
+# "png", "svg" o "pdf", y se escribe en el directorio de salida el manifiesto con los
+# ficheros y los tiempos de cada trabajo. Los planisferios, que son los trabajos más
+# largos, se reparten en primer lugar. Con combinar=True, los trabajos impresos sustituyen
+# a los del mismo nombre en el manifiesto guardado y se conservan los demás.
+def generar_atlas(directorio, formatos=("png",), trabajos=None, procesos=None, dpi=100, combinar=False):
+
+    if trabajos is None:
+        trabajos = trabajos_atlas()
+
+    trabajos = sorted(trabajos, key=lambda trabajo: trabajo["tipo"] != "planisferio")
+    os.makedirs(directorio, exist_ok=True)
+    inicio = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=procesos, initializer=iniciar_proceso) as ejecutor:
+        pendientes = [ejecutor.submit(imprimir_trabajo, t, directorio, list(formatos), dpi) for t in trabajos]
+        resultados = [pendiente.result() for pendiente in pendientes]
+
+    if combinar:
+        nuevos = {resultado["nombre"]: resultado for resultado in resultados}
+        guardados = leer_manifiesto(directorio)
+        resultados = [nuevos.pop(guardado["nombre"], guardado) for guardado in guardados] + list(nuevos.values())
+
+    manifiesto = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "formatos": list(formatos),
+        "dpi": dpi,
+        "procesos": procesos or os.cpu_count(),
+        "segundos": time.perf_counter() - inicio,
+        "trabajos": resultados,
+    }
+    with open(os.path.join(directorio, FICHERO_MANIFIESTO), "w", encoding="utf-8") as archivo:
+        json.dump(manifiesto, archivo, indent=1, ensure_ascii=False)
+
+    return manifiesto
+
+
+# Filas de los catálogos que intervienen en un trabajo del atlas.
+# Se devuelve una lista de pares con el nombre del catálogo y la selección de sus filas:
+# en los planisferios, todas las filas de los catálogos que se dibujan; en las
+# constelaciones, las mismas capas que usa impresion_reticula_PlateCarree_Constelacion.
+def filas_trabajo(trabajo):
+
+    argumentos = trabajo["argumentos"]
+
+    if trabajo["tipo"] == "planisferio":
+        filas = []
+        for posicion, variable in ((0, "ptolomeo"), (3, "alfonso"), (6, "j2000")):
+            if argumentos[posicion] == "s" and "s" in argumentos[posicion + 1 : posicion + 3]:
+                filas.append((formats.CATALOGOS_PLANISFERIO[variable], slice(None)))
+        return filas
+
+    codigo, diferencia, _, ptolomeo, teon, alfonso, j2000 = argumentos
+    conf = constelaciones.configuracion(codigo, diferencia, teon, alfonso, j2000)
+    capas = formats.capas_constelacion(conf, diferencia, ptolomeo, teon, alfonso, j2000)
+
+    return [(nombre, seleccion) for nombre, _, seleccion, _, _, _ in capas]
+
+
+# Huella de un trabajo del atlas.
+# Resumen SHA-256 de los ajustes de impresión (tipo, argumentos, registro de la
+# constelación, formatos, resolución, módulos de impresión y versión de matplotlib) y de
+# las columnas que dibuja el tipo de gráfico en las filas que intervienen en él.
+def huella_trabajo(trabajo, formatos, dpi):
+
+    ajustes = [VERSION_CONSTRUCCION, trabajo["tipo"], trabajo["argumentos"], list(formatos), dpi]
+    if trabajo["tipo"] == "constelacion":
+        codigo, diferencia, _, _, teon, alfonso, j2000 = trabajo["argumentos"]
+        ajustes.append(constelaciones.configuracion(codigo, diferencia, teon, alfonso, j2000))
+    for modulo in MODULOS_IMPRESION:
+        ajustes.append(cache_catalogos.resumen_fichero(os.path.join(DIRECTORIO, modulo + ".py")))
+    ajustes.append(matplotlib.__version__)
+
+    huella = hashlib.sha256(json.dumps(ajustes, sort_keys=True).encode("utf-8"))
+    for nombre, seleccion in filas_trabajo(trabajo):
+        estrellas = catalogos.cargar_catalogo(nombre)
+        huella.update(nombre.encode("utf-8"))
+        for campo in CAMPOS_HUELLA[trabajo["tipo"]]:
+            if campo in estrellas:
+                huella.update(campo.encode("utf-8"))
+                huella.update(np.ascontiguousarray(estrellas[campo][seleccion]).tobytes())
+
+    return huella.hexdigest()
+
+
+# Huellas guardadas en la base de datos de la impresión incremental de un directorio de
+# salida, por nombre de trabajo. Si no existe o es de otra versión, se devuelve un
+# diccionario vacío.
+def leer_construccion(directorio):
+
+    try:
+        with open(os.path.join(directorio, FICHERO_CONSTRUCCION), "r", encoding="utf-8") as archivo:
+            construccion = json.load(archivo)
+    except (OSError, ValueError):
+        return {}
+
+    if construccion.get("version") != VERSION_CONSTRUCCION:
+        return {}
+
+    return construccion["trabajos"]
+
+
+# Escritura de la base de datos de la impresión incremental, con un fichero temporal.
+def escribir_construccion(directorio, trabajos):
+
+    temporal = os.path.join(directorio, FICHERO_CONSTRUCCION + ".%d.tmp" % os.getpid())
+    with open(temporal, "w", encoding="utf-8") as archivo:
+        json.dump({"version": VERSION_CONSTRUCCION, "trabajos": trabajos}, archivo, indent=1, ensure_ascii=False)
+    os.replace(temporal, os.path.join(directorio, FICHERO_CONSTRUCCION))
+
+
+# Impresión incremental del atlas.
+# Se calcula la huella de cada trabajo y se imprimen, con generar_atlas(), solo los
+# trabajos cuya huella no coincide con la guardada en la base de datos del directorio de
+# salida, o a los que les falta alguno de sus ficheros. Con forzar=True se imprimen
+# todos. Se devuelve un diccionario con los trabajos impresos, los que no han cambiado y
+# el manifiesto de la impresión, o None si no se ha impreso ninguno.
+def construir_atlas(directorio, formatos=("png",), trabajos=None, procesos=None, dpi=100, forzar=False):
+
+    if trabajos is None:
+        trabajos = trabajos_atlas()
+
+    os.makedirs(directorio, exist_ok=True)
+    construccion = leer_construccion(directorio)
+
+    huellas = {}
+    pendientes = []
+    sin_cambios = []
+    for trabajo in trabajos:
+        huella = huella_trabajo(trabajo, formatos, dpi)
+        huellas[trabajo["nombre"]] = huella
+        guardado = construccion.get(trabajo["nombre"])
+        ficheros = [os.path.join(directorio, trabajo["nombre"] + "." + formato) for formato in formatos]
+        if (
+            forzar
+            or guardado is None
+            or guardado["huella"] != huella
+            or not all(os.path.exists(fichero) for fichero in ficheros)
+        ):
+            pendientes.append(trabajo)
+        else:
+            sin_cambios.append(trabajo["nombre"])
+
+    manifiesto = None
+    if pendientes:
+        manifiesto = generar_atlas(directorio, formatos, pendientes, procesos, dpi, combinar=True)
+        impresos = set(trabajo["nombre"] for trabajo in pendientes)
+        for resultado in manifiesto["trabajos"]:
+            if resultado["nombre"] not in impresos:
+                continue
+            construccion[resultado["nombre"]] = {
+                "huella": huellas[resultado["nombre"]],
+                "tipo": resultado["tipo"],
+                "argumentos": resultado["argumentos"],
+                "ficheros": resultado["ficheros"],
+            }
+        escribir_construccion(directorio, construccion)
+
+    return {
+        "impresos": [trabajo["nombre"] for trabajo in pendientes],
+        "sin_cambios": sin_cambios,
+        "manifiesto": manifiesto,
+    }
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Impresión por lotes del atlas de constelaciones.")
+    parser.add_argument("directorio", help="directorio de salida")
+    parser.add_argument("--formatos", nargs="+", default=["png"], choices=["png", "svg", "pdf"])
+    parser.add_argument("--constelaciones", nargs="+", default=None, help="códigos de las constelaciones")
+    parser.add_argument("--combinaciones", nargs="+", default=None, choices=list(COMBINACIONES))
+    parser.add_argument("--planisferios", nargs="*", default=None, choices=list(PLANISFERIOS))
+    parser.add_argument("--procesos", type=int, default=None)
+    parser.add_argument("--dpi", type=int, default=100)
+    parser.add_argument("--incremental", action="store_true", help="imprimir solo los gráficos que han cambiado")
+    parser.add_argument("--forzar", action="store_true", help="con --incremental, imprimir todos los gráficos")
+    argumentos = parser.parse_args()
+
+    trabajos = trabajos_atlas(argumentos.constelaciones, argumentos.combinaciones, argumentos.planisferios)
+    if argumentos.incremental:
+        construccion = construir_atlas(
+            argumentos.directorio,
+            argumentos.formatos,
+            trabajos,
+            argumentos.procesos,
+            argumentos.dpi,
+            argumentos.forzar,
+        )
+        print(len(construccion["impresos"]), "gráficos impresos,", len(construccion["sin_cambios"]), "sin cambios")
+        return
+
+    manifiesto = generar_atlas(
+        argumentos.directorio, argumentos.formatos, trabajos, argumentos.procesos, argumentos.dpi
+    )
+    print(len(manifiesto["trabajos"]), "gráficos en", round(manifiesto["segundos"], 1), "segundos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# Licensed under the EUPL
+# Módulo cache_catalogos.py
+
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+
+# Copia binaria de los catálogos analizados.
+# Junto a cada fichero plano, "fichero.prn", se guarda un directorio "fichero.prn.cache"
+# con un fichero ".npy" por columna, que se puede abrir con np.load(mmap_mode="r"), y un
+# fichero "firma.json" con el tamaño, la fecha de modificación y el resumen SHA-256 del
+# fichero plano del que proceden, además de la descripción de los campos con que se
+# leyó. La copia es válida mientras coincidan el tamaño, la fecha y la descripción; si
+# cambian el tamaño o la fecha, se compara el resumen del contenido, y solo si también
+# cambia se vuelve a analizar el fichero plano.
+SUFIJO_CACHE = ".cache"
+FICHERO_FIRMA = "firma.json"
+
+
+# Directorio de la copia binaria de un fichero plano.
+def directorio_cache(ruta):
+
+    return ruta + SUFIJO_CACHE
+
+
+# Resumen SHA-256 del contenido de un fichero plano.
+def resumen_fichero(ruta):
+
+    resumen = hashlib.sha256()
+    with open(ruta, "rb") as archivo:
+        for bloque in iter(lambda: archivo.read(1 << 20), b""):
+            resumen.update(bloque)
+
+    return resumen.hexdigest()
+
+
+# Firma de un fichero plano: tamaño, fecha de modificación en nanosegundos y descripción
+# de los campos. El resumen del contenido solo se calcula si se pide.
+def firma_fichero(ruta, descripcion, con_resumen=False):
+
+    estado = os.stat(ruta)
+    firma = {"tamano": estado.st_size, "modificacion": estado.st_mtime_ns, "descripcion": descripcion}
+    if con_resumen:
+        firma["resumen"] = resumen_fichero(ruta)
+
+    return firma
+
+
+# Firma guardada en la copia binaria de un fichero plano, o None si no existe.
+def leer_firma(ruta):
+
+    try:
+        with open(os.path.join(directorio_cache(ruta), FICHERO_FIRMA), "r", encoding="utf-8") as archivo:
+            return json.load(archivo)
+    except (OSError, ValueError):
+        return None
+
+
+# Escritura de la firma de la copia binaria de un fichero plano, con un fichero temporal.
+def escribir_firma(ruta, firma):
+
+    directorio = directorio_cache(ruta)
+    temporal = os.path.join(directorio, FICHERO_FIRMA + ".%d.tmp" % os.getpid())
+    with open(temporal, "w", encoding="utf-8") as archivo:
+        json.dump(firma, archivo, indent=1)
+    os.replace(temporal, os.path.join(directorio, FICHERO_FIRMA))
+
+
+# Comprobación de la copia binaria de un fichero plano.
+# Devuelve la firma guardada si la copia sigue siendo válida, o None si hay que volver a
+# analizar el fichero. Si solo ha cambiado la fecha de modificación, pero no el
+# contenido, se actualiza la firma y la copia se sigue usando.
+def comprobar_cache(ruta, descripcion):
+
+    guardada = leer_firma(ruta)
+    if guardada is None:
+        return None
+
+    actual = firma_fichero(ruta, descripcion)
+    if guardada["descripcion"] != descripcion:
+        return None
+    if guardada["tamano"] == actual["tamano"] and guardada["modificacion"] == actual["modificacion"]:
+        return guardada
+
+    if guardada["tamano"] != actual["tamano"] or guardada["resumen"] != resumen_fichero(ruta):
+        return None
+
+    guardada["modificacion"] = actual["modificacion"]
+    try:
+        escribir_firma(ruta, guardada)
+    except OSError:
+        pass
+
+    return guardada
+
+
+# Lectura de la copia binaria de un fichero plano.
+# Devuelve un diccionario de columnas abiertas con np.load(mmap_mode="r"), o None si la
+# copia no existe o ya no corresponde al fichero plano.
+def leer_cache(ruta, descripcion):
+
+    firma = comprobar_cache(ruta, descripcion)
+    if firma is None:
+        return None
+
+    directorio = directorio_cache(ruta)
+    tabla = {}
+    try:
+        for campo in firma["campos"]:
+            tabla[campo] = np.load(os.path.join(directorio, campo + ".npy"), mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+    return tabla
+
+
+# Escritura de la copia binaria de un fichero plano.
+# Cada columna se escribe en un fichero temporal que después se renombra, y la firma se
+# escribe la última, de modo que varios procesos pueden crear la misma copia a la vez.
+# La firma debe tomarse con firma_fichero(con_resumen=True) antes de analizar el fichero
+# plano; si no se indica, se toma aquí. Si el fichero plano ha cambiado desde que se tomó
+# la firma, las columnas pueden ser de otro contenido y la firma no se escribe, de modo
+# que la copia no es válida; la firma anterior se borra antes de escribir las columnas.
+# Si el directorio de datos no admite escritura, no se guarda la copia.
+def escribir_cache(ruta, descripcion, tabla, firma=None):
+
+    directorio = directorio_cache(ruta)
+    if firma is None:
+        firma = firma_fichero(ruta, descripcion, con_resumen=True)
+    firma = dict(firma, campos=list(tabla))
+
+    try:
+        os.makedirs(directorio, exist_ok=True)
+        if os.path.exists(os.path.join(directorio, FICHERO_FIRMA)):
+            os.remove(os.path.join(directorio, FICHERO_FIRMA))
+        for campo, columna in tabla.items():
+            temporal = os.path.join(directorio, campo + ".%d.tmp" % os.getpid())
+            with open(temporal, "wb") as archivo:
+                np.save(archivo, np.ascontiguousarray(columna))
+            os.replace(temporal, os.path.join(directorio, campo + ".npy"))
+        actual = firma_fichero(ruta, descripcion)
+        if actual["tamano"] != firma["tamano"] or actual["modificacion"] != firma["modificacion"]:
+            return False
+        escribir_firma(ruta, firma)
+    except OSError:
+        return False
+
+    return True
+
+
+# Estado de la copia binaria de un fichero plano: si existe, si es válida, su tamaño en
+# disco y la firma guardada.
+def estado_cache(ruta, descripcion):
+
+    directorio = directorio_cache(ruta)
+    firma = leer_firma(ruta)
+
+    tamano = 0
+    if os.path.isdir(directorio):
+        for nombre in os.listdir(directorio):
+            tamano = tamano + os.path.getsize(os.path.join(directorio, nombre))
+
+    return {
+        "fichero": ruta,
+        "directorio": directorio,
+        "existe": firma is not None,
+        "valida": firma is not None and comprobar_cache(ruta, descripcion) is not None,
+        "tamano": tamano,
+        "firma": firma,
+    }
+
+
+# Borrado de la copia binaria de un fichero plano.
+def purgar_cache(ruta):
+
+    directorio = directorio_cache(ruta)
+    if not os.path.isdir(directorio):
+        return False
+
+    shutil.rmtree(directorio)
+
+    return True
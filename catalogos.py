@@ -0,0 +1,520 @@
+# Licensed under the EUPL
+# Módulo catalogos.py
+
+import codecs
+import hashlib
+import json
+import mmap
+import os
+import numpy as np
+import cache_catalogos
+
+# Directorio donde se encuentran los ficheros planos de los catálogos.
+DIRECTORIO_DATOS = os.path.dirname(os.path.abspath(__file__))
+
+
+# Descripción de los seis catálogos de estrellas.
+# Cada catálogo indica el fichero plano que lo contiene, la codificación de sus textos,
+# y la posición (inicio, fin) de cada campo dentro de la línea, contada en caracteres.
+# Los campos comunes son:
+# 1) "region", si la constelación es boreal (BOR) o austral (AUS).
+# 2) "codigo", código de la constelación, tal como aparece en el fichero.
+# 3) "secuencia", número de secuencia de la estrella dentro de la constelación.
+# 4) "nombre", nombre latino o castellano de la estrella.
+# 5) "lon", "lat", longitud y latitud eclípticas.
+# 6) "tam", tamaño del punto, característico de su magnitud visual.
+# 7) "desp_lon", "desp_lat", desplazamiento de la etiqueta en los gráficos de constelación.
+# 8) "ancla_lon", "ancla_lat", letras "L", "R", "C" y "T", "B", "C", que sitúan la etiqueta.
+# 9) "magnitud", clase de magnitud, de 1 a 6, en los catálogos antiguos, y magnitud visual
+# en los de estrellas actuales. Las estrellas nebulosas u oscuras de los catálogos
+# antiguos, "N", "O" o "neb.", no tienen magnitud.
+# Los campos terminados en "_planisferio" son los desplazamientos y anclas de las etiquetas
+# en el planisferio AzimuthalEquidistant. En el Almagesto, "zodiacal" es una "Z" que
+# identifica las constelaciones zodiacales y "cerca" una "C" en las estrellas "informadas
+# cerca" de la constelación.
+CATALOGOS = {
+    "ptolomeo": {
+        "fichero": "Constelaciones y estrellas ptolemaicas.prn",
+        "codificacion": "latin-1",
+        "campos": {
+            "region": (0, 3),
+            "zodiacal": (3, 4),
+            "codigo": (4, 6),
+            "cerca": (6, 7),
+            "secuencia": (7, 10),
+            "nombre": (12, 100),
+            "lon": (100, 105),
+            "lat": (106, 111),
+            "tam": (112, 115),
+            "desp_lon": (116, 119),
+            "desp_lat": (120, 123),
+            "ancla_lon": (124, 125),
+            "ancla_lat": (126, 127),
+            "desp_lon_planisferio": (128, 131),
+            "desp_lat_planisferio": (132, 135),
+            "ancla_lon_planisferio": (136, 137),
+            "ancla_lat_planisferio": (138, 139),
+            "magnitud": (140, 141),
+        },
+    },
+    "alfonso_ptolomeo": {
+        "fichero": "Constelaciones alfonsíes ptolomeo - python.prn",
+        "codificacion": "latin-1",
+        "campos": {
+            "region": (0, 3),
+            "codigo": (6, 8),
+            "secuencia": (9, 11),
+            "nombre": (13, 123),
+            "lon": (123, 129),
+            "lat": (133, 139),
+            "tam": (143, 146),
+            "desp_lon": (147, 150),
+            "desp_lat": (152, 155),
+            "ancla_lon": (157, 158),
+            "ancla_lat": (160, 161),
+            "magnitud": (163, 164),
+        },
+    },
+    "alfonso_j2000": {
+        "fichero": "Constelaciones alfonsíes j2000 - python.prn",
+        "codificacion": "latin-1",
+        "campos": {
+            "region": (0, 3),
+            "codigo": (6, 8),
+            "secuencia": (9, 11),
+            "nombre": (13, 123),
+            "lon": (123, 129),
+            "lat": (133, 139),
+            "tam": (143, 146),
+            "desp_lon": (150, 153),
+            "desp_lat": (156, 159),
+            "ancla_lon": (161, 162),
+            "ancla_lat": (164, 165),
+            "magnitud": (167, 168),
+        },
+    },
+    "actuales": {
+        "fichero": "Constelaciones y estrellas actuales.prn",
+        "codificacion": "latin-1",
+        "campos": {
+            "codigo": (0, 2),
+            "secuencia": (2, 5),
+            "nombre": (5, 28),
+            "lon": (28, 34),
+            "lat": (40, 46),
+            "tam": (52, 55),
+            "desp_lon": (57, 60),
+            "desp_lat": (62, 65),
+            "ancla_lon": (67, 68),
+            "ancla_lat": (70, 71),
+            "desp_lon_planisferio": (73, 76),
+            "desp_lat_planisferio": (78, 81),
+            "ancla_lon_planisferio": (83, 84),
+            "ancla_lat_planisferio": (86, 87),
+            "magnitud": (113, 117),
+        },
+    },
+    "actuales_alfonso": {
+        "fichero": "Constelaciones y estrellas actuales alfonso - python.prn",
+        "codificacion": "latin-1",
+        "campos": {
+            "codigo": (0, 3),
+            "secuencia": (3, 6),
+            "nombre": (6, 29),
+            "lon": (29, 35),
+            "lat": (41, 47),
+            "tam": (53, 56),
+            "desp_lon": (59, 62),
+            "desp_lat": (65, 68),
+            "ancla_lon": (70, 71),
+            "ancla_lat": (73, 74),
+            "magnitud": (101, 105),
+        },
+    },
+    "teon": {
+        "fichero": "Lugares de las fijas de los doce signos de Teón de Alejandría - python.prn",
+        "codificacion": "utf-8",
+        "campos": {
+            "region": (0, 3),
+            "codigo": (6, 9),
+            "secuencia": (10, 12),
+            "nombre": (14, 90),
+            "lon": (90, 97),
+            "lat": (98, 105),
+            "tam": (108, 112),
+            "desp_lon": (113, 116),
+            "desp_lat": (119, 122),
+            "ancla_lon": (124, 125),
+            "ancla_lat": (127, 128),
+            "magnitud": (130, 134),
+        },
+    },
+}
+
+# Los ficheros de Teón y de las estrellas actuales alfonsíes usan códigos de tres letras.
+# Se traducen al código de dos letras del Almagesto, para que todas las constelaciones
+# se seleccionen con el mismo código.
+CODIGOS_TRES_LETRAS = {
+    "AQU": "AQ",
+    "ARI": "AR",
+    "BOO": "BO",
+    "CAN": "CR",
+    "CAP": "CP",
+    "CAS": "CS",
+    "COB": "CB",
+    "CYG": "CY",
+    "GEM": "GE",
+    "LEO": "LE",
+    "LIB": "LI",
+    "LYR": "LY",
+    "MAV": "MA",
+    "MIV": "MI",
+    "ORI": "OR",
+    "PIS": "PI",
+    "SAG": "SG",
+    "SCO": "SC",
+    "TAU": "TA",
+    "VIR": "VI",
+}
+
+CAMPOS_REALES = ("lon", "lat", "tam", "desp_lon", "desp_lat", "desp_lon_planisferio", "desp_lat_planisferio")
+
+# Número de filas de cada trozo en la lectura por trozos de los catálogos grandes.
+FILAS_TROZO = 10000
+
+# Versión del análisis de los ficheros planos. Se cambia cuando cambia el tipo o el
+# contenido de las columnas, para que no se usen copias binarias anteriores.
+VERSION_ANALISIS = 1
+
+_catalogos_cargados = {}
+
+
+# Caracteres de unos bytes en UTF-8, un byte por carácter: los caracteres de Latin-1 con
+# su código de Latin-1, y los demás con "?". Se toma el primer byte de cada carácter, y
+# los caracteres de dos bytes que empiezan por 0xC2 o 0xC3, los de Latin-1 que no son
+# ASCII, se completan con el byte siguiente, sin descodificar el texto.
+def caracteres_utf8(datos):
+
+    if datos.isascii():
+        return datos
+
+    datos = np.frombuffer(datos, dtype=np.uint8)
+    iniciales = np.flatnonzero((datos & 0xC0) != 0x80)
+    caracteres = datos[iniciales]
+
+    multiples = np.flatnonzero(caracteres >= 0x80)
+    primeros = caracteres[multiples].astype(np.uint16)
+    siguientes = datos[np.minimum(iniciales[multiples] + 1, len(datos) - 1)].astype(np.uint16)
+    latinos = ((primeros == 0xC2) | (primeros == 0xC3)) & ((siguientes & 0xC0) == 0x80)
+    caracteres[multiples] = np.where(latinos, ((primeros & 0x1F) << 6) | (siguientes & 0x3F), ord("?"))
+
+    return caracteres.tobytes()
+
+
+# Caracteres de unos bytes de un fichero plano en la codificación indicada, un byte por
+# carácter, con el código de Latin-1 o con "?" si no existe en Latin-1. Los bytes en
+# Latin-1 ya son los caracteres, y los de UTF-8 se convierten sin descodificar el texto;
+# las demás codificaciones se descodifican.
+def caracteres_fichero(datos, codificacion):
+
+    nombre = codecs.lookup(codificacion).name
+    if nombre == "iso8859-1":
+        return datos
+    if nombre == "utf-8":
+        return caracteres_utf8(datos)
+
+    return datos.decode(codificacion).encode("latin-1", errors="replace")
+
+
+# Matriz de las líneas de unos caracteres, como en leer_matriz, y si se ha llegado a la
+# primera línea vacía. Las líneas se cortan o se rellenan con blancos hasta la anchura
+# indicada o, por omisión, hasta la de la más larga.
+def matriz_lineas(caracteres, ancho=None):
+
+    lineas = caracteres.splitlines()
+    vacias = [numero for numero, longitud in enumerate(map(len, lineas)) if longitud <= 1]
+    if vacias:
+        lineas = lineas[: vacias[0]]
+    if ancho is None:
+        ancho = max(map(len, lineas), default=0)
+
+    datos = b"".join([linea[:ancho].ljust(ancho) for linea in lineas])
+
+    return np.frombuffer(datos, dtype=np.uint8).reshape(len(lineas), ancho), len(vacias) > 0
+
+
+# Lectura de las líneas de un fichero plano como una matriz de bytes.
+# Se lee el fichero completo de una vez, en binario, y se trabaja sobre sus bytes con la
+# codificación del catálogo, sin descodificar el texto ni depender de la configuración
+# regional. Como en las rutinas de impresión, la lectura termina en la primera línea
+# vacía. Las líneas se rellenan con blancos hasta la longitud de la más larga, y se
+# devuelve una matriz de enteros de 8 bits, una fila por estrella y una columna por
+# carácter, de modo que las posiciones de los campos se cuentan en caracteres también en
+# los ficheros en UTF-8. Solo las columnas de texto, como los nombres, se descodifican
+# después, en columna_texto.
+def leer_matriz(ruta, codificacion):
+
+    with open(ruta, "rb") as archivo:
+        datos = archivo.read()
+
+    return matriz_lineas(caracteres_fichero(datos, codificacion))[0]
+
+
+# Conversión de una columna de la matriz de bytes en números reales.
+# La coma decimal se sustituye por un punto en toda la columna a la vez. Los campos en
+# blanco se devuelven como NaN.
+def columna_real(matriz, inicio, fin):
+
+    campo = matriz[:, inicio:fin].copy()
+    campo[campo == ord(",")] = ord(".")
+    vacio = (campo == ord(" ")).all(axis=1)
+    campo[vacio, 0] = ord("0")
+
+    valores = campo.view("S%d" % (fin - inicio)).ravel().astype(np.float32)
+    valores[vacio] = np.nan
+
+    return valores
+
+
+# Conversión de una columna de la matriz de bytes en números enteros.
+def columna_entera(matriz, inicio, fin):
+
+    campo = np.ascontiguousarray(matriz[:, inicio:fin])
+
+    return campo.view("S%d" % (fin - inicio)).ravel().astype(np.int16)
+
+
+# Conversión de una columna de la matriz de bytes en textos, sin blancos a los lados.
+# Los caracteres de la matriz son los de Latin-1, cuyo código es el mismo en Unicode, de
+# modo que los textos se forman ampliando cada byte a 32 bits, sin descodificarlos.
+def columna_texto(matriz, inicio, fin):
+
+    campo = matriz[:, inicio:fin].astype(np.uint32)
+
+    return np.char.strip(campo.view("U%d" % (fin - inicio)).ravel())
+
+
+# Conversión de la columna de magnitudes en números reales. Las clases de magnitud que no
+# son números, como las de las estrellas nebulosas, se devuelven como NaN.
+def columna_magnitud(matriz, inicio, fin):
+
+    textos = np.char.replace(columna_texto(matriz, inicio, fin), ",", ".")
+    numericos = np.char.isdigit(np.char.replace(textos, ".", "", 1))
+
+    return np.where(numericos, textos, "nan").astype(np.float32)
+
+
+# Conversión de una columna de la matriz de bytes según su campo: números reales en
+# float32, secuencia en int16, marcas en booleanos, magnitudes y textos.
+def analizar_columna(matriz, campo, inicio, fin):
+
+    if campo in CAMPOS_REALES:
+        return columna_real(matriz, inicio, fin)
+    if campo == "secuencia":
+        return columna_entera(matriz, inicio, fin)
+    if campo == "zodiacal":
+        return columna_texto(matriz, inicio, fin) == "Z"
+    if campo == "cerca":
+        return columna_texto(matriz, inicio, fin) == "C"
+    if campo == "magnitud":
+        return columna_magnitud(matriz, inicio, fin)
+
+    return columna_texto(matriz, inicio, fin)
+
+
+# Traducción de los códigos de constelación de un fichero al código de dos letras del
+# Almagesto. Solo se traduce cada código distinto una vez.
+def traducir_codigos(codigos):
+
+    distintos, posiciones = np.unique(np.asarray(codigos, dtype=str), return_inverse=True)
+    traducidos = np.array([CODIGOS_TRES_LETRAS.get(c, c) for c in distintos], dtype="U2")
+
+    return traducidos[posiciones.ravel()]
+
+
+# Análisis de una matriz de bytes con la posición de los campos indicada.
+# Se devuelve un diccionario con una columna por campo, y se añaden las columnas
+# "codigo", con el código de dos letras del Almagesto, y "codigo_fichero", con el código
+# tal como aparece en el fichero.
+def analizar_matriz(matriz, campos):
+
+    tabla = {}
+    for campo, (inicio, fin) in campos.items():
+        tabla[campo] = analizar_columna(matriz, campo, inicio, fin)
+
+    tabla["codigo_fichero"] = tabla["codigo"]
+    tabla["codigo"] = traducir_codigos(tabla["codigo"])
+
+    return tabla
+
+
+# Lectura de un catálogo completo en columnas NumPy.
+# Se analiza el fichero en una sola pasada, con analizar_matriz.
+def analizar_catalogo(nombre):
+
+    descripcion = CATALOGOS[nombre]
+
+    return analizar_matriz(leer_matriz(ruta_catalogo(nombre), descripcion["codificacion"]), descripcion["campos"])
+
+
+# Lectura por trozos de las líneas de un fichero plano.
+# El fichero se proyecta en memoria y se recorre por bloques de líneas completas, de unos
+# bytes como los de las filas indicadas, sin leerlo entero, y se devuelven matrices de
+# bytes como las de leer_matriz, de como mucho las filas indicadas y de la anchura
+# indicada; las líneas se cortan o se rellenan con blancos hasta esa anchura. Como en
+# leer_matriz, la lectura termina en la primera línea vacía.
+def leer_trozos(ruta, codificacion, ancho, filas=FILAS_TROZO):
+
+    pendientes = np.zeros((0, ancho), dtype=np.uint8)
+    with open(ruta, "rb") as archivo:
+        if os.fstat(archivo.fileno()).st_size == 0:
+            return
+        with mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            posicion, terminado = 0, False
+            while posicion < len(mapa) and not terminado:
+                final = min(posicion + filas * (ancho + 2), len(mapa))
+                if final < len(mapa):
+                    final = mapa.find(b"\n", final - 1) + 1 or len(mapa)
+                matriz, terminado = matriz_lineas(caracteres_fichero(mapa[posicion:final], codificacion), ancho)
+                pendientes = np.concatenate((pendientes, matriz))
+                while len(pendientes) >= filas:
+                    yield pendientes[:filas]
+                    pendientes = pendientes[filas:]
+                posicion = final
+
+    if len(pendientes):
+        yield pendientes
+
+
+# Filas de un trozo que cumplen los filtros indicados: códigos de constelación de dos
+# letras, magnitud máxima, y caja de longitudes y latitudes, (lon_min, lon_max, lat_min,
+# lat_max), en la que lon_min puede ser mayor que lon_max si la caja cruza el meridiano
+# origen. Cada filtro solo convierte su columna, y solo en las filas que han pasado los
+# anteriores. Las estrellas sin magnitud no pasan el filtro de magnitud.
+def filtrar_trozo(matriz, campos, codigos=None, magnitud_maxima=None, caja=None):
+
+    filas = np.arange(len(matriz))
+
+    if codigos is not None:
+        codigo = traducir_codigos(columna_texto(matriz[filas], *campos["codigo"]))
+        filas = filas[np.isin(codigo, codigos)]
+
+    if magnitud_maxima is not None:
+        magnitud = columna_magnitud(matriz[filas], *campos["magnitud"])
+        with np.errstate(invalid="ignore"):
+            filas = filas[magnitud <= magnitud_maxima]
+
+    if caja is not None:
+        lon_min, lon_max, lat_min, lat_max = caja
+        lon = columna_real(matriz[filas], *campos["lon"]) % 360.0
+        lat = columna_real(matriz[filas], *campos["lat"])
+        if lon_min % 360.0 <= lon_max % 360.0:
+            en_lon = (lon >= lon_min % 360.0) & (lon <= lon_max % 360.0)
+        else:
+            en_lon = (lon >= lon_min % 360.0) | (lon <= lon_max % 360.0)
+        filas = filas[en_lon & (lat >= lat_min) & (lat <= lat_max)]
+
+    return filas
+
+
+# Lectura por trozos de un catálogo grande, en el formato de columnas de uno de los
+# catálogos, por omisión el de las estrellas actuales.
+# El catálogo se indica por su nombre o por la ruta de su fichero plano. Se devuelven,
+# uno a uno, diccionarios de columnas como los de cargar_catalogo, con las estrellas de
+# cada trozo de filas que cumplen los filtros de filtrar_trozo, de modo que la memoria
+# máxima depende del tamaño del trozo y no del tamaño del fichero. Los trozos sin
+# estrellas que cumplan los filtros no se devuelven.
+def trozos_catalogo(catalogo, formato="actuales", filas=FILAS_TROZO, codigos=None, magnitud_maxima=None, caja=None):
+
+    if catalogo in CATALOGOS:
+        formato = catalogo
+        catalogo = ruta_catalogo(catalogo)
+    descripcion = CATALOGOS[formato]
+    campos = descripcion["campos"]
+    ancho = max(fin for _, fin in campos.values())
+
+    for matriz in leer_trozos(catalogo, descripcion["codificacion"], ancho, filas):
+        seleccion = filtrar_trozo(matriz, campos, codigos, magnitud_maxima, caja)
+        if len(seleccion):
+            yield analizar_matriz(matriz[seleccion], campos)
+
+
+# Ruta del fichero plano de un catálogo.
+def ruta_catalogo(nombre):
+
+    return os.path.join(DIRECTORIO_DATOS, CATALOGOS[nombre]["fichero"])
+
+
+# Descripción de un catálogo para la copia binaria: resumen de la versión del análisis,
+# la codificación, la posición de los campos y la traducción de los códigos.
+def descripcion_catalogo(nombre):
+
+    descripcion = json.dumps(
+        [VERSION_ANALISIS, CATALOGOS[nombre], CODIGOS_TRES_LETRAS], sort_keys=True, ensure_ascii=True
+    )
+
+    return hashlib.sha256(descripcion.encode("ascii")).hexdigest()
+
+
+# Catálogo de estrellas, leído una sola vez por proceso.
+# El primer uso de cada catálogo abre su copia binaria, si existe y corresponde al fichero
+# plano; si no, analiza el fichero plano y guarda la copia binaria para los siguientes
+# procesos, con la firma del fichero plano tomada antes de analizarlo. Los siguientes
+# usos devuelven las mismas columnas, de modo que una serie de gráficos no vuelve a leer
+# los ficheros. Con usar_cache=False no se lee ni se escribe la copia binaria.
+def cargar_catalogo(nombre, usar_cache=True):
+
+    if nombre not in _catalogos_cargados:
+        tabla = None
+        if usar_cache:
+            tabla = cache_catalogos.leer_cache(ruta_catalogo(nombre), descripcion_catalogo(nombre))
+        if tabla is None:
+            firma = None
+            if usar_cache:
+                firma = cache_catalogos.firma_fichero(
+                    ruta_catalogo(nombre), descripcion_catalogo(nombre), con_resumen=True
+                )
+            tabla = analizar_catalogo(nombre)
+            if usar_cache:
+                cache_catalogos.escribir_cache(ruta_catalogo(nombre), descripcion_catalogo(nombre), tabla, firma)
+        _catalogos_cargados[nombre] = tabla
+
+    return _catalogos_cargados[nombre]
+
+
+# Preparación de las copias binarias de los catálogos indicados, o de todos.
+# Se analizan de nuevo los ficheros planos cuyas copias no existen o no son válidas. Se
+# devuelve el estado de cada copia.
+def calentar_cache(nombres=None):
+
+    estados = {}
+    for nombre in nombres or CATALOGOS:
+        ruta = ruta_catalogo(nombre)
+        if cache_catalogos.leer_cache(ruta, descripcion_catalogo(nombre)) is None:
+            firma = cache_catalogos.firma_fichero(ruta, descripcion_catalogo(nombre), con_resumen=True)
+            cache_catalogos.escribir_cache(ruta, descripcion_catalogo(nombre), analizar_catalogo(nombre), firma)
+        estados[nombre] = cache_catalogos.estado_cache(ruta, descripcion_catalogo(nombre))
+
+    return estados
+
+
+# Estado de las copias binarias de los catálogos indicados, o de todos.
+def inspeccionar_cache(nombres=None):
+
+    estados = {}
+    for nombre in nombres or CATALOGOS:
+        estados[nombre] = cache_catalogos.estado_cache(ruta_catalogo(nombre), descripcion_catalogo(nombre))
+
+    return estados
+
+
+# Borrado de las copias binarias de los catálogos indicados, o de todos. También se
+# olvidan los catálogos ya cargados en el proceso.
+def purgar_cache(nombres=None):
+
+    borrados = {}
+    for nombre in nombres or CATALOGOS:
+        _catalogos_cargados.pop(nombre, None)
+        borrados[nombre] = cache_catalogos.purgar_cache(ruta_catalogo(nombre))
+
+    return borrados
@@ -0,0 +1,461 @@
+# Licensed under the EUPL
+# Módulo constelaciones.py
+
+import numpy as np
+
+# Registro de las constelaciones de los gráficos PlateCarrée.
+# Cada constelación se identifica por el código corto, de dos caracteres, del Almagesto,
+# y tiene:
+# 1) "titulo", título del gráfico.
+# 2) "longitud_central", 0 o 180, longitud central de la proyección PlateCarrée. Con 180,
+# las etiquetas de las longitudes se suman 180 grados.
+# 3) "extension", [long_min, long_max, lat_min, lat_max] del gráfico. Si no se indica, se
+# calcula a partir de las estrellas que se dibujan.
+# 4) "add_360", grados que se suman a las etiquetas de las longitudes negativas.
+# 5) "figura", tamaño de la figura en pulgadas, si no es el de FIGURA_CONSTELACION.
+# 6) "codigos", códigos de las estrellas que se seleccionan en todos los catálogos, si no
+# es solo el de la constelación.
+# 7) "cerca", True para dibujar solo las estrellas "informadas cerca" del Almagesto, o
+# False para excluirlas. Si no se indica, se dibujan todas.
+# 8) "variantes", valores que sustituyen a los anteriores según los catálogos que se
+# comparan: "teon", "alfonso_j2000", "alfonso" y "diferencia" (diferencia entre los
+# catálogos del Almagesto y de Alfonso X). Se aplica la primera variante, en ese orden,
+# que corresponda a los catálogos que se comparan.
+# 9) "grupos", códigos que se añaden a la selección de un catálogo, "ptolomeo", "teon",
+# "alfonso" o "j2000", cuando corresponde la variante indicada.
+FIGURA_CONSTELACION = [10, 20]
+
+ORDEN_VARIANTES = ("teon", "alfonso_j2000", "alfonso", "diferencia")
+
+CONSTELACIONES = {
+    "MA": {  # osa mayor
+        "titulo": "MAIORIS VRSAE",
+        "longitud_central": 0,
+        "extension": [80, 160, 10, 60],
+        "variantes": {
+            "alfonso_j2000": {"extension": [70, 170, 10, 60]},
+            "diferencia": {"extension": [70, 170, 10, 60]},
+        },
+    },
+    "MI": {  # osa menor
+        "titulo": "MINORIS VRSAE",
+        "longitud_central": 0,
+        "extension": [50, 120, 60, 90],
+        "variantes": {
+            "alfonso_j2000": {"extension": [70, 140, 60, 90]},
+            "diferencia": {"extension": [50, 140, 60, 90]},
+        },
+    },
+    "DR": {  # dragón
+        "titulo": "DRACONIS",
+        "longitud_central": 0,
+        "extension": [-180, 180, 50, 90],
+        "add_360": 360,
+        "figura": [30, 60],
+    },
+    "CF": {  # cefeo
+        "titulo": "CEPHEUS",
+        "longitud_central": 0,
+        "extension": [-30, 90, 50, 80],
+        "add_360": 360,
+    },
+    "BO": {  # bootes
+        "titulo": "BOOTES",
+        "longitud_central": 180,
+        "extension": [150, 200, 20, 70],
+        "variantes": {
+            "alfonso_j2000": {"extension": [150, 220, 20, 70]},
+            "diferencia": {"extension": [150, 220, 20, 70]},
+        },
+    },
+    "CB": {  # corona borealis
+        "titulo": "CORONA BOREALIS",
+        "longitud_central": 180,
+        "extension": [190, 210, 40, 60],
+        "variantes": {
+            "alfonso_j2000": {"extension": [190, 230, 40, 60]},
+            "diferencia": {"extension": [190, 220, 40, 60]},
+        },
+    },
+    "HE": {  # hércules
+        "titulo": "HERCULES",
+        "longitud_central": 180,
+        "extension": [180, 250, 30, 80],
+        "variantes": {"diferencia": {"extension": [180, 260, 30, 80]}},
+    },
+    "LY": {  # lira
+        "titulo": "LYRA",
+        "longitud_central": 180,
+        "extension": [250, 280, 50, 70],
+        "variantes": {
+            "alfonso_j2000": {"extension": [270, 290, 50, 70]},
+            "diferencia": {"extension": [250, 290, 50, 70]},
+        },
+    },
+    "CY": {  # cisne o auis callina
+        "titulo": "CYGNUS",
+        "longitud_central": 180,
+        "extension": [270, 320, 30, 80],
+        "variantes": {
+            "alfonso_j2000": {"extension": [280, 340, 30, 80]},
+            "diferencia": {"extension": [270, 340, 30, 80]},
+        },
+    },
+    "CS": {  # cassiopeia
+        "titulo": "CASSIOPEIA",
+        "longitud_central": 0,
+        "extension": [0, 30, 40, 60],
+        "variantes": {
+            "alfonso_j2000": {"extension": [10, 50, 40, 60]},
+            "diferencia": {"extension": [0, 50, 40, 60]},
+        },
+    },
+    "PR": {  # perseus
+        "titulo": "PERSEUS",
+        "longitud_central": 0,
+        "extension": [20, 50, 10, 50],
+        "variantes": {"diferencia": {"extension": [20, 70, 10, 50]}},
+    },
+    "AU": {  # auriga
+        "titulo": "AURIGA",
+        "longitud_central": 0,
+        "extension": [40, 70, 0, 40],
+        "variantes": {"diferencia": {"extension": [40, 90, 0, 40]}},
+    },
+    "OP": {  # ophiucus
+        "titulo": "OPHIUCUS",
+        "longitud_central": 180,
+        "extension": [210, 250, -10, 40],
+        "variantes": {
+            "alfonso_j2000": {"extension": [190, 270, -10, 50]},
+            "diferencia": {"extension": [210, 280, -10, 50]},
+        },
+        # Las ruedas de Alfonso X incluyen la serpiente en Ofiuco.
+        "grupos": {"alfonso": {"ptolomeo": ["SO"]}},
+    },
+    "SO": {  # serpentis ophiuchi
+        "titulo": "SERPENTIS OPHIUCHI",
+        "longitud_central": 180,
+        "extension": [190, 260, 0, 50],
+    },
+    "ST": {  # sagitta
+        "titulo": "SAGITTA",
+        "longitud_central": 180,
+        "extension": [270, 290, 30, 50],
+        "variantes": {"diferencia": {"extension": [270, 300, 30, 50]}},
+    },
+    "AL": {  # aquila
+        "titulo": "AQUILA",
+        "longitud_central": 180,
+        "extension": [260, 310, 10, 40],
+    },
+    "DE": {  # delphinis
+        "titulo": "DELPHINIS",
+        "longitud_central": 180,
+        "extension": [270, 300, 10, 40],
+        "variantes": {"diferencia": {"extension": [270, 320, 10, 40]}},
+    },
+    "PQ": {  # praecisionis equi
+        "titulo": "PRAECISIONIS EQUI",
+        "longitud_central": 180,
+        "extension": [290, 300, 20, 30],
+        "variantes": {"diferencia": {"extension": [290, 320, 20, 30]}},
+    },
+    "EQ": {  # equi
+        "titulo": "EQUI",
+        "longitud_central": 0,
+        "extension": [-60, -10, 10, 50],
+    },
+    "AD": {  # andrómeda
+        "titulo": "ANDROMEDA",
+        "longitud_central": 0,
+        "extension": [-20, 20, 10, 50],
+        "variantes": {"diferencia": {"extension": [-20, 40, 10, 50]}},
+    },
+    "TR": {  # trianguli
+        "titulo": "TRIANGULI",
+        "longitud_central": 0,
+        "extension": [10, 20, 10, 30],
+        "variantes": {"diferencia": {"extension": [10, 40, 10, 30]}},
+    },
+    "AR": {  # aries
+        "titulo": "ARIES",
+        "longitud_central": 0,
+        "extension": [0, 30, -10, 20],
+        "variantes": {
+            "alfonso_j2000": {"extension": [20, 50, -10, 20]},
+            "diferencia": {"extension": [0, 50, -10, 20]},
+        },
+    },
+    "TA": {  # tauro
+        "titulo": "TAURUS",
+        "longitud_central": 0,
+        "extension": [20, 70, -20, 10],
+        "variantes": {
+            "alfonso_j2000": {"extension": [30, 90, -20, 10]},
+            "diferencia": {"extension": [20, 90, -20, 10]},
+        },
+    },
+    "GE": {  # gemini
+        "titulo": "GEMINI",
+        "longitud_central": 0,
+        "extension": [60, 100, -20, 20],
+        "variantes": {
+            "alfonso_j2000": {"extension": [70, 120, -20, 20]},
+            "diferencia": {"extension": [60, 120, -20, 20]},
+        },
+    },
+    "CR": {  # cancer
+        "titulo": "CANCER",
+        "longitud_central": 0,
+        "extension": [80, 120, -20, 20],
+        "variantes": {
+            "alfonso_j2000": {"extension": [80, 130, -20, 20]},
+            "diferencia": {"extension": [80, 130, -20, 20]},
+        },
+    },
+    "LE": {  # leo
+        "titulo": "LEO",
+        "longitud_central": 0,
+        "extension": [100, 150, -10, 40],
+        "variantes": {
+            "alfonso_j2000": {"extension": [120, 170, -35, 40]},
+            "diferencia": {"extension": [100, 170, -35, 40]},
+        },
+    },
+    "VI": {  # virgo
+        "titulo": "VIRGO",
+        "longitud_central": 180,
+        "extension": [140, 200, -10, 30],
+        "variantes": {
+            "alfonso_j2000": {"extension": [150, 220, -10, 30]},
+            "diferencia": {"extension": [140, 220, -10, 30]},
+        },
+    },
+    "LI": {  # libra
+        "titulo": "LIBRA",
+        "longitud_central": 180,
+        "extension": [190, 220, -20, 20],
+        "variantes": {
+            "teon": {"titulo": "LIBRA/ESCORPION", "extension": [190, 250, -30, 20]},
+            "alfonso_j2000": {"extension": [210, 240, -20, 20]},
+            "diferencia": {"extension": [190, 240, -20, 20]},
+        },
+        # Teón incluye las pinzas del escorpión en la libra.
+        "grupos": {"teon": {"j2000": ["SC"]}},
+    },
+    "SC": {  # escorpión
+        "titulo": "SCORPIUS",
+        "longitud_central": 180,
+        "extension": [200, 250, -30, 20],
+        "variantes": {
+            "alfonso_j2000": {"extension": [220, 270, -30, 20]},
+            "diferencia": {"extension": [200, 270, -30, 20]},
+        },
+    },
+    "SG": {  # sagitario
+        "titulo": "SAGITTARIUS",
+        "longitud_central": 180,
+        "extension": [240, 280, -30, 10],
+        "variantes": {
+            "teon": {"extension": [230, 280, -30, 10]},
+            "alfonso_j2000": {"extension": [250, 300, -30, 10]},
+            "diferencia": {"extension": [240, 300, -30, 10]},
+        },
+    },
+    "CP": {  # capricornio
+        "titulo": "CAPRICORNUS",
+        "longitud_central": 180,
+        "extension": [270, 300, -10, 10],
+        "variantes": {
+            "teon": {"extension": [260, 300, -10, 10]},
+            "alfonso_j2000": {"extension": [290, 320, -10, 10]},
+            "diferencia": {"extension": [270, 320, -10, 10]},
+        },
+    },
+    "AQ": {  # aquario
+        "titulo": "AQUARIUS",
+        "longitud_central": 180,
+        "extension": [280, 340, -30, 20],
+        "variantes": {
+            "alfonso_j2000": {"extension": [290, 350, -30, 20]},
+            "diferencia": {"extension": [280, 350, -30, 20]},
+        },
+    },
+    "PI": {  # pisces
+        "titulo": "PISCES",
+        "longitud_central": 0,
+        "extension": [-50, 10, -20, 30],
+        "variantes": {
+            "alfonso_j2000": {"extension": [-50, 30, -20, 30]},
+            "diferencia": {"extension": [-50, 30, -20, 30]},
+        },
+    },
+    "CT": {  # cetus
+        "titulo": "CETUS",
+        "longitud_central": 0,
+        "extension": [-30, 30, -40, 0],
+        "variantes": {"diferencia": {"extension": [-30, 40, -40, 0]}},
+    },
+    "OR": {  # orionis
+        "titulo": "ORIONIS",
+        "longitud_central": 0,
+        "extension": [40, 70, -40, 0],
+        "variantes": {"alfonso_j2000": {"extension": [50, 90, -40, 0]}},
+    },
+    "AM": {  # eridanus
+        "titulo": "ERIDANUS",
+        "longitud_central": 0,
+        "extension": [-10, 50, -60, -20],
+        "variantes": {"alfonso": {"extension": [-10, 90, -60, 0]}},
+    },
+    "LP": {  # leporis
+        "titulo": "LEPORIS",
+        "longitud_central": 0,
+        "extension": [40, 80, -50, -30],
+        "variantes": {"diferencia": {"extension": [40, 90, -50, -30]}},
+    },
+    "CN": {  # canis
+        "titulo": "CANIS",
+        "longitud_central": 0,
+        "extension": [40, 100, -70, -20],
+        "variantes": {"diferencia": {"extension": [40, 110, -70, -20]}},
+    },
+    "PC": {  # precanis
+        "titulo": "PRECANIS",
+        "longitud_central": 0,
+        "extension": [80, 100, -20, -10],
+        "variantes": {"diferencia": {"extension": [80, 110, -20, -10]}},
+    },
+    "AG": {  # navis
+        "titulo": "NAVIS",
+        "longitud_central": 0,
+        "extension": [60, 170, -80, -40],
+        "figura": [20, 50],
+        "variantes": {"diferencia": {"extension": [60, 180, -80, -40]}},
+    },
+    "HY": {  # hydra
+        "titulo": "HYDRA",
+        "longitud_central": 180,
+        "extension": [70, 200, -50, 0],
+        "figura": [20, 50],
+        "variantes": {"diferencia": {"extension": [70, 220, -50, 0]}},
+    },
+    "PT": {  # patera
+        "titulo": "PATERA",
+        "longitud_central": 180,
+        "extension": [140, 165, -30, -10],
+        "variantes": {"diferencia": {"extension": [140, 180, -30, -10]}},
+    },
+    "CO": {  # corvus
+        "titulo": "CORVUS",
+        "longitud_central": 180,
+        "extension": [160, 180, -30, -10],
+        "variantes": {"diferencia": {"extension": [160, 190, -30, -10]}},
+    },
+    "CE": {  # centaurus
+        "titulo": "CENTAURUS",
+        "longitud_central": 180,
+        "extension": [170, 230, -60, 0],
+        "variantes": {"diferencia": {"extension": [170, 240, -60, 0]}},
+    },
+    "FE": {  # fera
+        "titulo": "FERA",
+        "longitud_central": 180,
+        "extension": [200, 220, -40, 0],
+    },
+    "TU": {  # turibuli
+        "titulo": "TURIBULI",
+        "longitud_central": 180,
+        "extension": [230, 250, -40, -10],
+        "variantes": {"diferencia": {"extension": [230, 260, -40, -10]}},
+    },
+    "CA": {  # corona australis
+        "titulo": "CORONA AUSTRALIS",
+        "longitud_central": 180,
+        "extension": [240, 260, -30, -10],
+        "variantes": {"diferencia": {"extension": [240, 280, -30, -10]}},
+    },
+    "PA": {  # pisces austrinus
+        "titulo": "PISCES AUSTRINUS",
+        "longitud_central": 180,
+        "extension": [270, 310, -30, -10],
+        "variantes": {"diferencia": {"extension": [270, 330, -30, -10]}},
+    },
+}
+
+
+# Variantes que corresponden a los catálogos que se comparan, en orden de preferencia.
+def variantes_activas(diferencia_ptolomeo_alfonso="n", teon="n", alfonso="n", j2000="n"):
+
+    activas = {
+        "teon": teon == "s",
+        "alfonso_j2000": alfonso == "s" and j2000 == "s",
+        "alfonso": alfonso == "s",
+        "diferencia": diferencia_ptolomeo_alfonso == "s",
+    }
+
+    return [variante for variante in ORDEN_VARIANTES if activas[variante]]
+
+
+# Configuración de un gráfico de constelación.
+# Se parte de los valores de la constelación, se completan los que faltan y se aplica la
+# primera variante que corresponda. Los "grupos" se reducen a los códigos que se añaden
+# a cada catálogo con las variantes activas.
+def configuracion(Constelacion, diferencia_ptolomeo_alfonso="n", teon="n", alfonso="n", j2000="n"):
+
+    entrada = CONSTELACIONES[Constelacion]
+    activas = variantes_activas(diferencia_ptolomeo_alfonso, teon, alfonso, j2000)
+
+    conf = {
+        "codigo": Constelacion,
+        "codigos": [Constelacion],
+        "cerca": None,
+        "extension": None,
+        "add_360": 0,
+        "figura": FIGURA_CONSTELACION,
+    }
+    conf.update({clave: valor for clave, valor in entrada.items() if clave not in ("variantes", "grupos")})
+    for variante in activas:
+        if variante in entrada.get("variantes", {}):
+            conf.update(entrada["variantes"][variante])
+            break
+
+    conf["grupos"] = {}
+    for variante, grupos in entrada.get("grupos", {}).items():
+        if variante in activas:
+            for catalogo, codigos in grupos.items():
+                conf["grupos"][catalogo] = conf["grupos"].get(catalogo, []) + codigos
+    conf["add_180"] = conf["longitud_central"]
+
+    return conf
+
+
+# Estrellas de un catálogo que se dibujan en el gráfico de una constelación.
+# El catálogo es uno de "ptolomeo", "teon", "alfonso" o "j2000".
+def seleccionar(estrellas, conf, catalogo):
+
+    seleccion = np.isin(estrellas["codigo"], conf["codigos"] + conf["grupos"].get(catalogo, []))
+    if conf["cerca"] is not None and "cerca" in estrellas:
+        seleccion = seleccion & (estrellas["cerca"] == conf["cerca"])
+
+    return seleccion
+
+
+# Extensión de un gráfico calculada a partir de las estrellas que se dibujan.
+# Las longitudes se refieren a la longitud central de la proyección, para que las
+# constelaciones que cruzan el meridiano origen no ocupen todo el gráfico. Se añade el
+# margen indicado, en grados, y se redondea a múltiplos de 10 grados, como las marcas
+# de los ejes.
+def extension_automatica(lon, lat, longitud_central, margen=5):
+
+    lon = np.asarray(lon, dtype=np.float64)
+    lat = np.asarray(lat, dtype=np.float64)
+    relativa = (lon - longitud_central + 180) % 360 - 180
+
+    long_min = int(np.floor((relativa.min() - margen) / 10) * 10) + longitud_central
+    long_max = int(np.ceil((relativa.max() + margen) / 10) * 10) + longitud_central
+    lat_min = max(int(np.floor((lat.min() - margen) / 10) * 10), -90)
+    lat_max = min(int(np.ceil((lat.max() + margen) / 10) * 10), 90)
+
+    return [long_min, long_max, lat_min, lat_max]
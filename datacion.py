@@ -0,0 +1,159 @@
+# Licensed under the EUPL
+# Módulo datacion.py
+
+import numpy as np
+import ajuste_epoca
+import catalogos
+import precesion
+
+# Datación de los catálogos antiguos por las latitudes eclípticas.
+# El giro de la precesión solo cambia las longitudes, pero el movimiento de la eclíptica
+# cambia lentamente las latitudes de las estrellas, de modo que las latitudes de un
+# catálogo indican por sí mismas la época de la observación. Para cada época de una
+# rejilla se precesan las estrellas actuales, con el movimiento de la eclíptica, y se
+# suman los cuadrados de las diferencias de latitud con cada catálogo antiguo, por
+# constelación y por región. Todas las estrellas emparejadas de todos los catálogos se
+# precesan a todas las épocas de una vez, y las sumas de todos los grupos se calculan con
+# un solo producto de matrices.
+CATALOGOS_DATACION = ("ptolomeo", "alfonso_j2000", "teon")
+
+# Fichero de estrellas actuales con que se empareja cada catálogo antiguo, con los mismos
+# códigos de constelación.
+ACTUALES_CATALOGOS = {
+    "ptolomeo": "actuales",
+    "alfonso_ptolomeo": "actuales_alfonso",
+    "alfonso_j2000": "actuales_alfonso",
+    "teon": "actuales",
+}
+
+
+# Preparación de la datación: parejas de estrellas de cada catálogo, latitudes de las
+# estrellas actuales emparejadas en todas las épocas de la rejilla, y matriz de grupos,
+# con un bloque de columnas por catálogo.
+def preparar_datacion(nombres=CATALOGOS_DATACION, epocas=ajuste_epoca.EPOCAS):
+
+    lon_j2000 = []
+    lat_j2000 = []
+    lat = []
+    bloques = []
+    grupos = []
+    for nombre in nombres:
+        epoca_catalogo = ajuste_epoca.EPOCAS_CATALOGOS.get(nombre, ajuste_epoca.EPOCA_PTOLOMEO)
+        indices_antiguos, _, lon_pareja, lat_pareja = ajuste_epoca.parejas_catalogos(
+            nombre, ACTUALES_CATALOGOS.get(nombre, "actuales"), epoca_catalogo
+        )
+        estrellas = catalogos.cargar_catalogo(nombre)
+        pertenencia, grupos_catalogo = ajuste_epoca.matriz_grupos(
+            estrellas["codigo"][indices_antiguos], ajuste_epoca.regiones_estrellas(estrellas)[indices_antiguos]
+        )
+        lon_j2000.append(lon_pareja)
+        lat_j2000.append(lat_pareja)
+        lat.append(np.asarray(estrellas["lat"][indices_antiguos], dtype=np.float64))
+        bloques.append(pertenencia)
+        grupos.extend((nombre, tipo, grupo) for tipo, grupo in grupos_catalogo)
+
+    pertenencia = np.zeros((sum(len(b) for b in bloques), sum(b.shape[1] for b in bloques)))
+    fila = columna = 0
+    for bloque in bloques:
+        pertenencia[fila : fila + bloque.shape[0], columna : columna + bloque.shape[1]] = bloque
+        fila = fila + bloque.shape[0]
+        columna = columna + bloque.shape[1]
+
+    epocas = np.asarray(epocas, dtype=np.float64)
+    _, lat_rejilla = precesion.precesar(np.concatenate(lon_j2000), np.concatenate(lat_j2000), epocas)
+
+    return {
+        "catalogos": list(nombres),
+        "epocas": epocas,
+        "lat": np.concatenate(lat),
+        "lat_rejilla": lat_rejilla,
+        "pertenencia": pertenencia,
+        "grupos": grupos,
+    }
+
+
+# Incertidumbre de la época de menor suma de cuadrados de cada grupo, por la curvatura de
+# la curva de la suma de cuadrados en el mínimo. Con la varianza de las latitudes estimada
+# por la suma mínima, s² = S_min / (n - 1), el error típico de la época es
+# sqrt(2 s² / S''), donde S'' es la segunda derivada de la suma respecto a la época. Se
+# devuelve, por grupo, si el mínimo está en el borde de la rejilla, en cuyo caso la época
+# no queda determinada, y el error típico en años, NaN en los mínimos del borde, en los
+# grupos de una sola estrella o si la curva no es convexa en el mínimo.
+def incertidumbre_rejilla(epocas, costes, estrellas):
+
+    indice = np.argmin(costes, axis=0)
+    en_borde = (indice == 0) | (indice == len(epocas) - 1)
+    if len(epocas) < 3:
+        return en_borde, np.full(costes.shape[1], np.nan)
+
+    interior = np.clip(indice, 1, len(epocas) - 2)
+    columnas = np.arange(costes.shape[1])
+    paso = epocas[1] - epocas[0]
+    segunda = (costes[interior - 1, columnas] - 2.0 * costes[interior, columnas] + costes[interior + 1, columnas]) / (
+        paso * paso
+    )
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        varianza = costes[indice, columnas] / (estrellas - 1.0)
+        error = np.sqrt(2.0 * varianza / segunda)
+    error = np.where(en_borde | (estrellas < 2) | ~(segunda > 0), np.nan, error)
+
+    return en_borde, error
+
+
+# Datación por las latitudes, con las latitudes de los catálogos o con otras latitudes de
+# las mismas estrellas. Se devuelve, por grupo, la época de menor suma de cuadrados, si
+# está en el borde de la rejilla, su error típico, el error cuadrático medio en esa época,
+# el número de estrellas y la curva de la suma de cuadrados en todas las épocas, una
+# matriz de épocas por grupos.
+def datar(preparado, lat=None):
+
+    if lat is None:
+        lat = preparado["lat"]
+
+    diferencias = lat - preparado["lat_rejilla"]
+    pertenencia = preparado["pertenencia"]
+    estrellas = pertenencia.sum(axis=0)
+    costes = (diferencias * diferencias) @ pertenencia
+    en_borde, error = incertidumbre_rejilla(preparado["epocas"], costes, estrellas)
+
+    return {
+        "epoca": ajuste_epoca.minimo_rejilla(preparado["epocas"], costes),
+        "en_borde": en_borde,
+        "error": error,
+        "rms": np.sqrt(costes.min(axis=0) / estrellas),
+        "estrellas": estrellas,
+        "costes": costes,
+    }
+
+
+# Informe de la datación, con una entrada por catálogo, y en cada una un diccionario para
+# todas las estrellas, otro por constelación y otro por región. Las épocas con
+# "en_borde" son el extremo de la rejilla y no una datación: la suma de cuadrados sigue
+# bajando fuera de ella.
+def informe_datacion(preparado, resultado):
+
+    informe = {}
+    for indice, (catalogo, tipo, nombre) in enumerate(preparado["grupos"]):
+        entrada = {
+            "estrellas": int(resultado["estrellas"][indice]),
+            "epoca": float(resultado["epoca"][indice]),
+            "en_borde": bool(resultado["en_borde"][indice]),
+            "error": float(resultado["error"][indice]),
+            "rms": float(resultado["rms"][indice]),
+        }
+        informe_catalogo = informe.setdefault(catalogo, {"global": None, "constelaciones": {}, "regiones": {}})
+        if tipo == "global":
+            informe_catalogo["global"] = entrada
+        else:
+            informe_catalogo[tipo][nombre] = entrada
+
+    return informe
+
+
+# Datación completa de los catálogos antiguos por las latitudes.
+def datacion(nombres=CATALOGOS_DATACION, epocas=ajuste_epoca.EPOCAS):
+
+    preparado = preparar_datacion(nombres, epocas)
+
+    return informe_datacion(preparado, datar(preparado))
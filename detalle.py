@@ -0,0 +1,103 @@
+# Licensed under the EUPL
+# Módulo detalle.py
+
+import numpy as np
+
+# Nivel de detalle de los gráficos por el brillo de las estrellas.
+# El tamaño del punto de cada estrella, "tam", es característico de su magnitud visual, y
+# es el campo común a todos los catálogos. Las estrellas de cada catálogo se ordenan una
+# sola vez de mayor a menor tamaño, con las que no tienen tamaño al final, de modo que las
+# estrellas que superan un umbral de tamaño, o las N más brillantes, son siempre el
+# principio del orden, y su selección es un solo corte. El número de estrellas se puede
+# fijar también por una densidad en el gráfico, en estrellas por pulgada cuadrada de los
+# ejes, para que un gráfico pequeño o una vista alejada no se llenen de puntos y de
+# etiquetas. Las mismas funciones sirven para el planisferio, los gráficos de
+# constelación, las teselas y las vistas interactivas.
+
+_ordenes = {}
+
+
+# Orden de brillo de unos tamaños de punto: índices de las estrellas de mayor a menor
+# tamaño, con los NaN al final, y tamaños en ese orden.
+def ordenar_brillo(tam):
+
+    tam = np.asarray(tam, dtype=np.float64)
+    clave = np.where(np.isnan(tam), np.inf, -tam)
+    indices = np.argsort(clave, kind="stable")
+
+    return {"indices": indices, "tam": tam[indices]}
+
+
+# Orden de brillo de un catálogo. Se guarda por la columna de tamaños, de modo que las
+# copias de un catálogo precesadas a otra época comparten el orden; si el catálogo se
+# vuelve a cargar, se ordena de nuevo.
+def orden_brillo(estrellas):
+
+    tam = estrellas["tam"]
+    guardado = _ordenes.get(id(tam))
+    if guardado is None or guardado[0] is not tam:
+        guardado = (tam, ordenar_brillo(tam))
+        _ordenes[id(tam)] = guardado
+
+    return guardado[1]
+
+
+# Número de estrellas de un orden de brillo con un tamaño de punto igual o mayor que el
+# indicado, con una búsqueda binaria.
+def numero_brillantes(orden, tam_minimo):
+
+    validos = np.count_nonzero(~np.isnan(orden["tam"]))
+
+    return int(np.searchsorted(-orden["tam"][:validos], -tam_minimo, side="right"))
+
+
+# Corte de un orden de brillo: índices de las estrellas con el tamaño mínimo indicado,
+# de la selección indicada, como máscara o índices de las filas, y como mucho del número
+# indicado, de la más brillante a la menos brillante.
+def corte_brillo(orden, seleccion=None, tam_minimo=None, numero=None):
+
+    indices = orden["indices"]
+    if tam_minimo is not None:
+        indices = indices[: numero_brillantes(orden, tam_minimo)]
+
+    if seleccion is not None:
+        mascara = np.zeros(len(orden["indices"]), dtype=bool)
+        mascara[seleccion] = True
+        indices = indices[mascara[indices]]
+
+    if numero is not None:
+        indices = indices[: max(int(numero), 0)]
+
+    return indices
+
+
+# Área en pulgadas cuadradas de los ejes de un gráfico, una vez fijada su proporción.
+def area_ejes(ax):
+
+    ax.apply_aspect()
+    caja = ax.get_window_extent()
+
+    return caja.width * caja.height / ax.figure.dpi**2
+
+
+# Número de estrellas para una densidad en estrellas por pulgada cuadrada de los ejes, o
+# None si no se indica densidad.
+def numero_densidad(ax, densidad):
+
+    if densidad is None:
+        return None
+
+    return int(round(densidad * area_ejes(ax)))
+
+
+# Selección por nivel de detalle de las estrellas de un catálogo en un gráfico: filas de
+# la selección indicada con el tamaño mínimo indicado y, como mucho, las de la densidad
+# indicada en los ejes. Sin tamaño mínimo ni densidad se devuelve la selección tal cual.
+def seleccion_detalle(ax, estrellas, seleccion=slice(None), tam_minimo=None, densidad=None):
+
+    if tam_minimo is None and densidad is None:
+        return seleccion
+
+    filas = corte_brillo(orden_brillo(estrellas), seleccion, tam_minimo, numero_densidad(ax, densidad))
+
+    return np.sort(filas)
@@ -0,0 +1,225 @@
+# Licensed under the EUPL
+# Módulo etiquetas.py
+
+import numpy as np
+import matplotlib
+from matplotlib.font_manager import FontProperties
+from matplotlib.textpath import TextToPath
+
+# Colocación automática de las etiquetas de un gráfico.
+# Se colocan a la vez todas las etiquetas de todos los catálogos de un gráfico, en el
+# espacio de la pantalla, una vez fijadas la extensión y la proporción de los ejes. Las
+# cajas de los puntos de las estrellas y de las etiquetas ya colocadas se guardan en una
+# rejilla uniforme de celdas, de modo que cada caja nueva solo se compara con las cajas
+# de las celdas que ocupa, y el coste total es el de ordenar las etiquetas. Para cada
+# etiqueta se prueba en primer lugar la posición de los ficheros, con su desplazamiento y
+# sus anclas, y después ocho posiciones alrededor del punto de la estrella, en dos
+# anillos, cada uno de la posición más cercana a la más lejana de la de los ficheros; se
+# elige la primera que no se solapa con ninguna caja, o, si todas se solapan, la de menor
+# solapamiento. Las etiquetas de las estrellas más brillantes se colocan antes.
+# Separación en puntos entre el punto de la estrella y su etiqueta.
+SEPARACION = 2.0
+
+# Posiciones alrededor del punto de la estrella: dirección horizontal y vertical, y
+# alineación horizontal y vertical de la etiqueta.
+POSICIONES = (
+    (1.0, 0.0, "left", "center"),
+    (-1.0, 0.0, "right", "center"),
+    (0.0, 1.0, "center", "bottom"),
+    (0.0, -1.0, "center", "top"),
+    (0.7, 0.7, "left", "bottom"),
+    (-0.7, 0.7, "right", "bottom"),
+    (0.7, -0.7, "left", "top"),
+    (-0.7, -0.7, "right", "top"),
+)
+
+# Distancias de las posiciones al punto de la estrella, en múltiplos de la separación
+# mínima: si el primer anillo de posiciones está ocupado, se prueba el segundo.
+ANILLOS = (1.0, 2.5)
+
+_medidas = {}
+_trazos = TextToPath()
+
+
+# Anchura y altura en puntos de un texto con un tamaño y un grosor de letra. Se miden una
+# sola vez por texto, tamaño y grosor, sin dibujarlos.
+def medir_texto(texto, size, weight):
+
+    clave = (texto, size, weight)
+    if clave not in _medidas:
+        ancho, alto, _ = _trazos.get_text_width_height_descent(
+            texto, FontProperties(size=size, weight=weight), ismath=False
+        )
+        _medidas[clave] = (ancho, alto)
+
+    return _medidas[clave]
+
+
+# Caja de un texto anclado en un punto con una alineación: x0, y0, x1, y1.
+def caja_texto(x, y, ha, va, ancho, alto):
+
+    if ha == "left":
+        x0 = x
+    elif ha == "right":
+        x0 = x - ancho
+    else:
+        x0 = x - ancho / 2.0
+
+    if va == "bottom":
+        y0 = y
+    elif va == "top":
+        y0 = y - alto
+    else:
+        y0 = y - alto / 2.0
+
+    return (x0, y0, x0 + ancho, y0 + alto)
+
+
+# Rejilla uniforme de cajas, con el lado de las celdas en píxeles.
+def nueva_rejilla(lado):
+
+    return {"lado": lado, "celdas": {}, "cajas": []}
+
+
+# Celdas que ocupa una caja.
+def celdas_caja(rejilla, caja):
+
+    lado = rejilla["lado"]
+    i0, j0 = int(caja[0] // lado), int(caja[1] // lado)
+    i1, j1 = int(caja[2] // lado), int(caja[3] // lado)
+
+    return [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)]
+
+
+# Inserción de una caja en la rejilla.
+def insertar(rejilla, caja):
+
+    numero = len(rejilla["cajas"])
+    rejilla["cajas"].append(caja)
+    for celda in celdas_caja(rejilla, caja):
+        rejilla["celdas"].setdefault(celda, []).append(numero)
+
+
+# Área de solapamiento de una caja con las cajas de la rejilla.
+def solapamiento(rejilla, caja):
+
+    vistas = set()
+    area = 0.0
+    for celda in celdas_caja(rejilla, caja):
+        for numero in rejilla["celdas"].get(celda, ()):
+            if numero in vistas:
+                continue
+            vistas.add(numero)
+            otra = rejilla["cajas"][numero]
+            ancho = min(caja[2], otra[2]) - max(caja[0], otra[0])
+            alto = min(caja[3], otra[3]) - max(caja[1], otra[1])
+            if ancho > 0 and alto > 0:
+                area = area + ancho * alto
+
+    return area
+
+
+# Área de una caja que queda fuera de los límites de los ejes.
+def fuera_limites(caja, limites):
+
+    ancho = max(0.0, min(caja[2], limites[2]) - max(caja[0], limites[0]))
+    alto = max(0.0, min(caja[3], limites[3]) - max(caja[1], limites[1]))
+
+    return (caja[2] - caja[0]) * (caja[3] - caja[1]) - ancho * alto
+
+
+# Posiciones candidatas de una etiqueta: la de los ficheros y las de alrededor del punto
+# de la estrella, por anillos, y en cada anillo ordenadas por su distancia a la de los
+# ficheros.
+def candidatas_etiqueta(x, y, radio, x_preferida, y_preferida, ha_preferida, va_preferida):
+
+    candidatas = [(x_preferida, y_preferida, ha_preferida, va_preferida)]
+    for anillo in ANILLOS:
+        alrededor = [(x + dx * radio * anillo, y + dy * radio * anillo, ha, va) for dx, dy, ha, va in POSICIONES]
+        alrededor.sort(key=lambda candidata: (candidata[0] - x_preferida) ** 2 + (candidata[1] - y_preferida) ** 2)
+        candidatas.extend(alrededor)
+
+    return candidatas
+
+
+# Colocación de las etiquetas de un gráfico.
+# Cada grupo es un diccionario con las coordenadas nativas de los puntos de las estrellas,
+# "x" e "y", las de la posición de sus etiquetas en los ficheros, "x_etiq" e "y_etiq", sus
+# alineaciones, "ha" y "va", los textos, los tamaños de los puntos, "tam", y el estilo de
+# las etiquetas. Las etiquetas se añaden al gráfico con annotate, y se devuelve el número
+# de etiquetas que no han encontrado una posición libre.
+def colocar_etiquetas(ax, grupos):
+
+    if not grupos:
+        return 0
+
+    ax.apply_aspect()
+    escala = ax.figure.dpi / 72.0
+    transformacion = ax.transData
+    inversa = transformacion.inverted()
+
+    puntos = transformacion.transform(
+        np.column_stack([np.concatenate([g["x"] for g in grupos]), np.concatenate([g["y"] for g in grupos])])
+    )
+    preferidas = transformacion.transform(
+        np.column_stack([np.concatenate([g["x_etiq"] for g in grupos]), np.concatenate([g["y_etiq"] for g in grupos])])
+    )
+    tam = np.concatenate([np.asarray(g["tam"], dtype=np.float64) for g in grupos])
+    radios = np.sqrt(np.pi) / 2.0 * tam * escala
+    ha = np.concatenate([g["ha"] for g in grupos])
+    va = np.concatenate([g["va"] for g in grupos])
+    textos = np.concatenate([g["textos"] for g in grupos])
+    estilos = [g["estilo"] for g in grupos for _ in range(len(g["textos"]))]
+
+    medidas = (
+        np.array(
+            [
+                medir_texto(
+                    str(texto),
+                    estilo.get("size", matplotlib.rcParams["font.size"]),
+                    estilo.get("weight", "normal"),
+                )
+                for texto, estilo in zip(textos, estilos)
+            ]
+        ).reshape(-1, 2)
+        * escala
+    )
+
+    if len(medidas) == 0:
+        return 0
+
+    validas = np.isfinite(puntos).all(axis=1) & np.isfinite(preferidas).all(axis=1)
+    rejilla = nueva_rejilla(max(float(np.median(medidas[:, 0])), float(np.median(medidas[:, 1])), 1.0))
+    for (x, y), radio in zip(puntos[validas], radios[validas]):
+        insertar(rejilla, (x - radio, y - radio, x + radio, y + radio))
+
+    limites = ax.bbox.extents
+    solapadas = 0
+    for i in np.argsort(-tam, kind="stable"):
+        if not validas[i]:
+            continue
+        ancho, alto = medidas[i]
+        mejor = None
+        for candidata in candidatas_etiqueta(
+            puntos[i, 0],
+            puntos[i, 1],
+            radios[i] + SEPARACION * escala,
+            preferidas[i, 0],
+            preferidas[i, 1],
+            ha[i],
+            va[i],
+        ):
+            caja = caja_texto(*candidata, ancho, alto)
+            coste = solapamiento(rejilla, caja) + fuera_limites(caja, limites)
+            if mejor is None or coste < mejor[0]:
+                mejor = (coste, candidata, caja)
+            if coste == 0:
+                break
+        coste, (x, y, ha_etiq, va_etiq), caja = mejor
+        solapadas = solapadas + (coste > 0)
+        insertar(rejilla, caja)
+
+        x, y = inversa.transform((x, y))
+        ax.annotate(textos[i], (x, y), ha=ha_etiq, va=va_etiq, transform=ax.transData, **estilos[i])
+
+    return solapadas
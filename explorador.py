@@ -0,0 +1,343 @@
+# Licensed under the EUPL
+# Módulo explorador.py
+
+import argparse
+import numpy as np
+import matplotlib.pyplot as plt
+from scipy.spatial import cKDTree
+import ajuste_epoca
+import catalogos
+import constelaciones
+import datacion
+import detalle
+import formats
+import precesion
+
+# Explorador interactivo del planisferio y de los gráficos de constelación.
+# El gráfico se dibuja con todos los catálogos y las colecciones de puntos de las
+# estrellas se marcan como animadas, de modo que el dibujo completo de la figura, al
+# abrirla, desplazarla o ampliarla, solo dibuja la retícula y los textos, que se guardan
+# como fondo. Encima del fondo se dibujan las capas de estrellas y la estrella señalada,
+# sin volver a dibujar el resto de la figura. Las coordenadas nativas de todas las
+# estrellas de todas las capas se guardan en un árbol KD, en el que se busca la estrella
+# más próxima al puntero al moverlo o al pulsar; su descripción, código, secuencia,
+# nombre y residuo, se toma de los catálogos en memoria, sin volver a leer los ficheros.
+# Con una densidad, en estrellas por pulgada cuadrada, en cada dibujo completo solo se
+# dejan en cada capa las estrellas más brillantes de la vista hasta esa densidad, con el
+# nivel de detalle del módulo detalle.py, de modo que al ampliar aparecen las más débiles.
+PULGADAS = 10
+
+# Distancia máxima en píxeles entre el puntero y la estrella señalada.
+TOLERANCIA = 10
+
+# Argumentos de los gráficos del explorador: todos los catálogos, sin etiquetas.
+ARGUMENTOS_PLANISFERIO = ["s", "s", "n", "s", "s", "n", "s", "s", "n"]
+ARGUMENTOS_CONSTELACION = ["n", "n", "s", "s", "s", "s"]
+
+# Catálogo antiguo con el que se calculan los residuos de cada fichero de estrellas
+# actuales.
+ANTIGUOS_ACTUALES = {"actuales": "ptolomeo", "actuales_alfonso": "alfonso_j2000"}
+
+_residuos = {}
+
+
+# Residuos de las estrellas de un catálogo: separación en grados entre cada estrella
+# antigua y su estrella actual emparejada, precesada a la época del catálogo, o entre cada
+# estrella actual y su estrella antigua. Las estrellas sin pareja tienen NaN. Se calculan
+# una sola vez por catálogo.
+def residuos_catalogo(nombre):
+
+    if nombre not in _residuos:
+        residuos = np.full(len(catalogos.cargar_catalogo(nombre)["codigo"]), np.nan)
+        antiguo = ANTIGUOS_ACTUALES.get(nombre, nombre)
+        if antiguo in datacion.ACTUALES_CATALOGOS:
+            epoca = ajuste_epoca.EPOCAS_CATALOGOS.get(antiguo, ajuste_epoca.EPOCA_PTOLOMEO)
+            indices_antiguos, indices_actuales, lon_j2000, lat_j2000 = ajuste_epoca.parejas_catalogos(
+                antiguo, datacion.ACTUALES_CATALOGOS[antiguo], epoca
+            )
+            estrellas = catalogos.cargar_catalogo(antiguo)
+            coseno = np.einsum(
+                "ij,ij->i",
+                precesion.vectores(*precesion.precesar(lon_j2000, lat_j2000, epoca)),
+                precesion.vectores(estrellas["lon"][indices_antiguos], estrellas["lat"][indices_antiguos]),
+            )
+            indices = indices_antiguos if antiguo == nombre else indices_actuales
+            residuos[indices] = np.degrees(np.arccos(np.clip(coseno, -1.0, 1.0)))
+        _residuos[nombre] = residuos
+
+    return _residuos[nombre]
+
+
+# Capas de estrellas del explorador: lista de pares con el nombre del catálogo y los
+# índices de las filas que se dibujan, en el mismo orden que los puntos de su colección.
+def capas_explorador(vista, codigo=None, epoca=None):
+
+    if vista == "planisferio":
+        return [
+            (nombre, np.arange(len(catalogos.cargar_catalogo(nombre)["codigo"])))
+            for nombre, plotear in zip(formats.CATALOGOS_PLANISFERIO.values(), ARGUMENTOS_PLANISFERIO[1::3])
+            if plotear == "s"
+        ]
+
+    conf = constelaciones.configuracion(codigo, *ARGUMENTOS_CONSTELACION[:1], *ARGUMENTOS_CONSTELACION[3:])
+    capas = formats.capas_constelacion(conf, ARGUMENTOS_CONSTELACION[0], *ARGUMENTOS_CONSTELACION[2:], epoca)
+
+    return [(nombre, np.arange(len(estrellas["codigo"]))[seleccion]) for nombre, estrellas, seleccion, _, _, _ in capas]
+
+
+# Índice espacial de las estrellas de las colecciones de puntos de un gráfico.
+# Se devuelve el árbol KD de las coordenadas nativas de todos los puntos, y, por punto, el
+# número de su capa y la fila de su estrella en el catálogo.
+def indice_espacial(colecciones, capas):
+
+    puntos = np.concatenate([coleccion.get_offsets() for coleccion in colecciones] + [np.zeros((0, 2))])
+    capa = np.concatenate([np.full(len(filas), numero) for numero, (_, filas) in enumerate(capas)] + [[]])
+    filas = np.concatenate([filas for _, filas in capas] + [[]])
+
+    return cKDTree(puntos), capa.astype(int), filas.astype(int)
+
+
+# Descripción de una estrella: catálogo, código, secuencia, nombre y residuo.
+def describir_estrella(estrellas, nombre, fila, residuos):
+
+    texto = nombre + ": " + str(estrellas["codigo"][fila]) + " " + str(estrellas["secuencia"][fila])
+    if "cerca" in estrellas and estrellas["cerca"][fila]:
+        texto = texto + "C"
+    texto = texto + "\n" + str(estrellas["nombre"][fila]).strip()
+    if np.isfinite(residuos[fila]):
+        texto = texto + "\nResiduo: " + format(residuos[fila], ".2f") + "˚"
+
+    return texto
+
+
+# Preparación del explorador sobre la figura del gráfico de la vista, "planisferio" o
+# "constelacion". Se devuelve un diccionario con el estado del explorador: figura, capas,
+# colecciones, índice espacial, fondos guardados y estrella señalada.
+def preparar_explorador(vista="planisferio", codigo=None, epoca=None, pulgadas=PULGADAS, figura=None, densidad=None):
+
+    if vista == "planisferio":
+        fig = formats.impresion_reticula_AzimuthalEquidistant(
+            *ARGUMENTOS_PLANISFERIO, mostrar="n", figura=figura, epoca=epoca
+        )
+    else:
+        fig = formats.impresion_reticula_PlateCarree_Constelacion(
+            codigo, *ARGUMENTOS_CONSTELACION, mostrar="n", figura=figura, epoca=epoca
+        )
+    fig.set_size_inches(fig.get_size_inches() * pulgadas / max(fig.get_size_inches()))
+    ax = fig.axes[0]
+
+    capas = capas_explorador(vista, codigo, epoca)
+    colecciones = [
+        next(coleccion for coleccion in ax.collections if coleccion.get_gid() == nombre) for nombre, _ in capas
+    ]
+    for coleccion in colecciones:
+        coleccion.set_animated(True)
+    arbol, capa, filas = indice_espacial(colecciones, capas)
+
+    estrellas = []
+    for nombre, _ in capas:
+        if epoca is not None and nombre in precesion.GIROS_J2000:
+            estrellas.append(precesion.catalogo_en_epoca(nombre, epoca))
+        else:
+            estrellas.append(catalogos.cargar_catalogo(nombre))
+
+    senal = ax.scatter([], [], s=200, facecolors="none", edgecolors="red", linewidths=1.5, transform=ax.transData)
+    senal.set_animated(True)
+    rotulo = ax.annotate(
+        "",
+        (0, 0),
+        xytext=(15, 15),
+        textcoords="offset points",
+        color="black",
+        size=9,
+        bbox={"boxstyle": "round", "facecolor": "lightyellow", "alpha": 0.9},
+        annotation_clip=False,
+    )
+    rotulo.set_animated(True)
+    rotulo.set_visible(False)
+
+    estado = {
+        "figura": fig,
+        "ax": ax,
+        "capas": capas,
+        "estrellas": estrellas,
+        "residuos": [residuos_catalogo(nombre) for nombre, _ in capas],
+        "colecciones": colecciones,
+        "densidad": densidad,
+        "completas": [
+            (filas, coleccion.get_offsets().copy(), coleccion.get_sizes().copy())
+            for (_, filas), coleccion in zip(capas, colecciones)
+        ],
+        "arbol": arbol,
+        "capa": capa,
+        "filas": filas,
+        "senal": senal,
+        "rotulo": rotulo,
+        "fondo": None,
+        "fondo_estrellas": None,
+        "senalada": None,
+    }
+
+    fig.canvas.mpl_connect("draw_event", lambda evento: guardar_fondo(estado, evento))
+    fig.canvas.mpl_connect("motion_notify_event", lambda evento: mover(estado, evento))
+    fig.canvas.mpl_connect("button_press_event", lambda evento: pulsar(estado, evento))
+
+    return estado
+
+
+# Guardado del fondo después de cada dibujo completo de la figura, y dibujo encima de las
+# capas de estrellas, que se guarda como un segundo fondo sobre el que se dibuja la
+# estrella señalada. Al guardar la figura en un fichero no hay fondo que guardar, y las
+# capas se dibujan directamente con el mismo dibujante.
+def guardar_fondo(estado, evento):
+
+    if evento.canvas.is_saving():
+        for artista in estado["colecciones"] + [estado["senal"], estado["rotulo"]]:
+            artista.draw(evento.renderer)
+        return
+
+    aplicar_detalle(estado)
+    estado["fondo"] = evento.canvas.copy_from_bbox(estado["figura"].bbox)
+    for coleccion in estado["colecciones"]:
+        estado["figura"].draw_artist(coleccion)
+    estado["fondo_estrellas"] = evento.canvas.copy_from_bbox(estado["figura"].bbox)
+    redibujar(estado)
+
+
+# Nivel de detalle de las capas de estrellas en la vista actual: en cada capa se dejan las
+# estrellas más brillantes de las que caen dentro de los límites de los ejes, hasta la
+# densidad del explorador, y se vuelve a construir el índice espacial con los puntos que
+# quedan. Se deja de señalar la estrella señalada.
+def aplicar_detalle(estado):
+
+    if estado["densidad"] is None:
+        return
+
+    ax = estado["ax"]
+    x0, x1 = sorted(ax.get_xlim())
+    y0, y1 = sorted(ax.get_ylim())
+    numero = detalle.numero_densidad(ax, estado["densidad"])
+
+    capas = []
+    for (nombre, _), coleccion, (filas, puntos, tamanos) in zip(
+        estado["capas"], estado["colecciones"], estado["completas"]
+    ):
+        visibles = (puntos[:, 0] >= x0) & (puntos[:, 0] <= x1) & (puntos[:, 1] >= y0) & (puntos[:, 1] <= y1)
+        elegidas = np.sort(detalle.corte_brillo(detalle.ordenar_brillo(tamanos), visibles, numero=numero))
+        coleccion.set_offsets(puntos[elegidas])
+        coleccion.set_sizes(tamanos[elegidas])
+        capas.append((nombre, filas[elegidas]))
+
+    estado["capas"] = capas
+    estado["arbol"], estado["capa"], estado["filas"] = indice_espacial(estado["colecciones"], capas)
+    estado["senalada"] = None
+    estado["senal"].set_offsets(np.zeros((0, 2)))
+    estado["rotulo"].set_visible(False)
+
+
+# Dibujo de la estrella señalada sobre el fondo con las capas de estrellas.
+def redibujar(estado):
+
+    if estado["fondo_estrellas"] is None:
+        return
+
+    canvas = estado["figura"].canvas
+    canvas.restore_region(estado["fondo_estrellas"])
+    estado["figura"].draw_artist(estado["senal"])
+    estado["figura"].draw_artist(estado["rotulo"])
+    canvas.blit(estado["figura"].bbox)
+
+
+# Estrella más próxima a un evento del ratón, dentro de la tolerancia en píxeles, como
+# índice de su punto en el árbol, o None.
+def estrella_cercana(estado, evento):
+
+    if evento.inaxes is not estado["ax"] or evento.xdata is None or estado["arbol"].n == 0:
+        return None
+
+    _, indice = estado["arbol"].query([evento.xdata, evento.ydata])
+    x, y = estado["ax"].transData.transform(estado["arbol"].data[indice])
+    if np.hypot(x - evento.x, y - evento.y) > TOLERANCIA:
+        return None
+
+    return int(indice)
+
+
+# Señalización de una estrella, por su índice en el árbol, o de ninguna. El rótulo se
+# coloca hacia el centro del gráfico para que no se salga de la figura.
+def senalar(estado, indice):
+
+    if indice == estado["senalada"]:
+        return
+
+    estado["senalada"] = indice
+    if indice is None:
+        estado["senal"].set_offsets(np.zeros((0, 2)))
+        estado["rotulo"].set_visible(False)
+    else:
+        capa = estado["capa"][indice]
+        fila = estado["filas"][indice]
+        punto = estado["arbol"].data[indice]
+        estado["senal"].set_offsets([punto])
+        estado["rotulo"].xy = punto
+        derecha = estado["ax"].transData.transform(punto)[0] > estado["ax"].bbox.x0 + estado["ax"].bbox.width / 2
+        estado["rotulo"].set_position((-15, 15) if derecha else (15, 15))
+        estado["rotulo"].set_horizontalalignment("right" if derecha else "left")
+        estado["rotulo"].set_text(
+            describir_estrella(estado["estrellas"][capa], estado["capas"][capa][0], fila, estado["residuos"][capa])
+        )
+        estado["rotulo"].set_visible(True)
+
+    redibujar(estado)
+
+
+# Movimiento del ratón: se señala la estrella más próxima al puntero.
+def mover(estado, evento):
+
+    if evento.button is not None:
+        return
+
+    senalar(estado, estrella_cercana(estado, evento))
+
+
+# Pulsación del ratón: se señala la estrella más próxima y se escribe su descripción.
+def pulsar(estado, evento):
+
+    indice = estrella_cercana(estado, evento)
+    senalar(estado, indice)
+    if indice is not None:
+        print(estado["rotulo"].get_text().replace("\n", " - "))
+
+
+# Apertura del explorador interactivo del planisferio o de una constelación.
+def explorar(vista="planisferio", codigo=None, epoca=None, pulgadas=PULGADAS, densidad=None):
+
+    for nombre in catalogos.CATALOGOS:
+        catalogos.cargar_catalogo(nombre)
+
+    estado = preparar_explorador(vista, codigo, epoca, pulgadas, densidad=densidad)
+    plt.show()
+
+    return estado
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Explorador interactivo de los catálogos de estrellas.")
+    parser.add_argument("--constelacion", default=None, help="código de la constelación; por omisión, el planisferio")
+    parser.add_argument("--epoca", type=float, default=None, help="año de las estrellas actuales")
+    parser.add_argument("--pulgadas", type=float, default=PULGADAS)
+    parser.add_argument("--densidad", type=float, default=None, help="estrellas por pulgada cuadrada de cada capa")
+    argumentos = parser.parse_args()
+
+    explorar(
+        "planisferio" if argumentos.constelacion is None else "constelacion",
+        argumentos.constelacion,
+        argumentos.epoca,
+        argumentos.pulgadas,
+        argumentos.densidad,
+    )
+
+
+if __name__ == "__main__":
+    main()
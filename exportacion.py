@@ -0,0 +1,245 @@
+# Licensed under the EUPL
+# Módulo exportacion.py
+
+import argparse
+import os
+import struct
+import time
+import zlib
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.text import Annotation
+import formats
+
+# Exportación por franjas del planisferio a alta resolución.
+# El planisferio de 40x40 pulgadas a 600 ppp es una imagen de 24.000x24.000 píxeles, que
+# no cabe en memoria de una vez. La figura se dibuja por franjas horizontales: en cada
+# franja la figura tiene la anchura completa y la altura de la franja, y los ejes se
+# colocan en la misma posición absoluta que en la figura completa, desplazados hacia
+# arriba, de modo que la proyección, la retícula y las etiquetas son las mismas en todas
+# las franjas. Cada franja se escribe en el fichero en cuanto se dibuja, comprimida en un
+# PNG o sin comprimir en un TIFF, y la memoria máxima depende solo de la memoria indicada,
+# no de la resolución de salida. Las etiquetas de las estrellas que quedan lejos de una
+# franja no se dibujan en ella.
+DPI = 600
+MEMORIA = 256 * 1024 * 1024
+
+# Bytes de memoria por píxel de una franja: la imagen RGBA del dibujo y su copia RGB.
+BYTES_PIXEL = 8
+
+# Argumentos por omisión del planisferio: Almagesto y estrellas actuales, con etiquetas.
+ARGUMENTOS = ["s", "s", "s", "n", "n", "n", "s", "s", "s"]
+
+# Margen en puntos alrededor de cada franja dentro del que se dibujan las etiquetas.
+MARGEN_ETIQUETAS = 30
+
+# Tamaño máximo de un TIFF clásico, con desplazamientos de 32 bits.
+TAMANO_MAXIMO_TIFF = 2**32 - 2**20
+
+
+# Fragmento de un PNG: longitud, tipo, datos y CRC.
+def fragmento_png(tipo, datos):
+
+    return struct.pack(">I", len(datos)) + tipo + datos + struct.pack(">I", zlib.crc32(tipo + datos) & 0xFFFFFFFF)
+
+
+# Apertura de una imagen RGB de salida, PNG o TIFF según la extensión del fichero, con su
+# anchura y altura en píxeles y su resolución en puntos por pulgada. Se devuelve el
+# estado del escritor.
+def abrir_imagen(ruta, ancho, alto, dpi):
+
+    formato = "tiff" if os.path.splitext(ruta)[1].lower() in (".tif", ".tiff") else "png"
+    if formato == "tiff" and ancho * alto * 3 > TAMANO_MAXIMO_TIFF:
+        raise ValueError("La imagen de " + str(ancho) + "x" + str(alto) + " píxeles no cabe en un TIFF clásico")
+
+    archivo = open(ruta, "wb")
+    imagen = {"formato": formato, "archivo": archivo, "ancho": ancho, "alto": alto, "dpi": dpi, "filas": 0}
+
+    if formato == "png":
+        archivo.write(b"\x89PNG\r\n\x1a\n")
+        archivo.write(fragmento_png(b"IHDR", struct.pack(">IIBBBBB", ancho, alto, 8, 2, 0, 0, 0)))
+        por_metro = int(round(dpi / 0.0254))
+        archivo.write(fragmento_png(b"pHYs", struct.pack(">IIB", por_metro, por_metro, 1)))
+        imagen["compresor"] = zlib.compressobj(6)
+    else:
+        archivo.write(b"II*\x00" + struct.pack("<I", 0))
+        imagen["franjas"] = []
+
+    return imagen
+
+
+# Escritura de una franja de filas, una matriz de filas por anchura por 3 de bytes RGB.
+def escribir_franja(imagen, filas):
+
+    archivo = imagen["archivo"]
+
+    if imagen["formato"] == "png":
+        filtradas = np.zeros((len(filas), imagen["ancho"] * 3 + 1), dtype=np.uint8)
+        filtradas[:, 1:] = filas.reshape(len(filas), -1)
+        datos = imagen["compresor"].compress(filtradas.tobytes())
+        if datos:
+            archivo.write(fragmento_png(b"IDAT", datos))
+    else:
+        imagen["franjas"].append((archivo.tell(), filas.nbytes, len(filas)))
+        archivo.write(np.ascontiguousarray(filas).tobytes())
+
+    imagen["filas"] = imagen["filas"] + len(filas)
+
+
+# Cierre de una imagen de salida: en un PNG se escriben los últimos datos comprimidos y el
+# final; en un TIFF, el directorio de la imagen, con las posiciones de las franjas.
+def cerrar_imagen(imagen):
+
+    archivo = imagen["archivo"]
+
+    if imagen["formato"] == "png":
+        archivo.write(fragmento_png(b"IDAT", imagen["compresor"].flush()))
+        archivo.write(fragmento_png(b"IEND", b""))
+        archivo.close()
+        return
+
+    franjas = imagen["franjas"]
+    dpi = int(round(imagen["dpi"]))
+    if archivo.tell() % 2:
+        archivo.write(b"\x00")
+
+    valores = archivo.tell()
+    bits = struct.pack("<HHH", 8, 8, 8)
+    resolucion = struct.pack("<II", dpi, 1)
+    posiciones = struct.pack("<%dI" % len(franjas), *[posicion for posicion, _, _ in franjas])
+    bytes_franjas = struct.pack("<%dI" % len(franjas), *[tamano for _, tamano, _ in franjas])
+    archivo.write(bits + resolucion + posiciones + bytes_franjas)
+    direccion_bits = valores
+    direccion_resolucion = valores + len(bits)
+    direccion_posiciones = direccion_resolucion + len(resolucion)
+    direccion_bytes = direccion_posiciones + len(posiciones)
+
+    # Con una sola franja, su posición y su tamaño van en la propia entrada.
+    if len(franjas) == 1:
+        direccion_posiciones = franjas[0][0]
+        direccion_bytes = franjas[0][1]
+
+    entradas = [
+        (256, 4, 1, imagen["ancho"]),
+        (257, 4, 1, imagen["alto"]),
+        (258, 3, 3, direccion_bits),
+        (259, 3, 1, 1),
+        (262, 3, 1, 2),
+        (273, 4, len(franjas), direccion_posiciones),
+        (277, 3, 1, 3),
+        (278, 4, 1, franjas[0][2]),
+        (279, 4, len(franjas), direccion_bytes),
+        (282, 5, 1, direccion_resolucion),
+        (283, 5, 1, direccion_resolucion),
+        (284, 3, 1, 1),
+        (296, 3, 1, 2),
+    ]
+    if archivo.tell() % 2:
+        archivo.write(b"\x00")
+    directorio = archivo.tell()
+    archivo.write(struct.pack("<H", len(entradas)))
+    for etiqueta, tipo, cuenta, valor in entradas:
+        if tipo == 3 and cuenta == 1:
+            archivo.write(struct.pack("<HHIHH", etiqueta, tipo, cuenta, valor, 0))
+        else:
+            archivo.write(struct.pack("<HHII", etiqueta, tipo, cuenta, valor))
+    archivo.write(struct.pack("<I", 0))
+
+    archivo.seek(4)
+    archivo.write(struct.pack("<I", directorio))
+    archivo.close()
+
+
+# Altura en píxeles de las franjas de una imagen de la anchura indicada, para que cada
+# franja quepa en la memoria indicada en bytes.
+def altura_franja(ancho, memoria=MEMORIA):
+
+    return max(1, int(memoria // (ancho * BYTES_PIXEL)))
+
+
+# Exportación del planisferio AzimuthalEquidistant a un PNG o un TIFF, por franjas.
+# Los argumentos son los nueve de impresion_reticula_AzimuthalEquidistant, y las opciones,
+# por ejemplo epoca, residuos o colocar_etiquetas, se le pasan tal cual. Se devuelve un
+# resumen con el tamaño de la imagen, el número de franjas y los segundos empleados.
+def exportar_planisferio(ruta, dpi=DPI, memoria=MEMORIA, argumentos=ARGUMENTOS, **opciones):
+
+    inicio = time.perf_counter()
+
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    formats.impresion_reticula_AzimuthalEquidistant(*argumentos, mostrar="n", figura=fig, **opciones)
+    ax = fig.axes[0]
+
+    pulgadas_ancho, pulgadas_alto = fig.get_size_inches()
+    ancho = int(round(pulgadas_ancho * dpi))
+    alto = int(round(pulgadas_alto * dpi))
+    ax.apply_aspect()
+    x0, y0, anchura, altura = ax.get_position().bounds
+    x0, y0, anchura, altura = x0 * ancho, y0 * alto, anchura * ancho, altura * alto
+
+    fig.set_dpi(dpi)
+    fig.set_size_inches(ancho / dpi, alto / dpi)
+    anotaciones = [texto for texto in ax.texts if isinstance(texto, Annotation)]
+    alturas = ax.transData.transform(np.array([anotacion.xy for anotacion in anotaciones]).reshape(-1, 2))[:, 1]
+    margen = MARGEN_ETIQUETAS * dpi / 72.0
+
+    franja = min(alto, altura_franja(ancho, memoria))
+    imagen = abrir_imagen(ruta, ancho, alto, dpi)
+    franjas = 0
+    try:
+        for superior in range(0, alto, franja):
+            filas = min(franja, alto - superior)
+            inferior = alto - superior - filas
+            fig.set_size_inches(ancho / dpi, filas / dpi)
+            ax.set_position([x0 / ancho, (y0 - inferior) / filas, anchura / ancho, altura / filas])
+            visibles = (alturas >= inferior - margen) & (alturas <= inferior + filas + margen)
+            for anotacion, visible in zip(anotaciones, visibles):
+                anotacion.set_visible(visible)
+            fig.canvas.draw()
+            rgba = np.asarray(fig.canvas.buffer_rgba())
+            escribir_franja(imagen, rgba[:filas, :ancho, :3])
+            franjas = franjas + 1
+    finally:
+        cerrar_imagen(imagen)
+
+    return {
+        "ruta": ruta,
+        "ancho": ancho,
+        "alto": alto,
+        "dpi": dpi,
+        "franjas": franjas,
+        "altura_franja": franja,
+        "segundos": time.perf_counter() - inicio,
+    }
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Exportación del planisferio a alta resolución, por franjas.")
+    parser.add_argument("ruta", help="fichero de salida, .png o .tif")
+    parser.add_argument("--dpi", type=int, default=DPI)
+    parser.add_argument("--memoria", type=int, default=MEMORIA // (1024 * 1024), help="memoria por franja, en MB")
+    parser.add_argument("--epoca", type=float, default=None, help="año de las estrellas actuales")
+    parser.add_argument("--colocar-etiquetas", action="store_true", help="colocar las etiquetas sin solapes")
+    argumentos = parser.parse_args()
+
+    resumen = exportar_planisferio(
+        argumentos.ruta,
+        argumentos.dpi,
+        argumentos.memoria * 1024 * 1024,
+        epoca=argumentos.epoca,
+        colocar_etiquetas="s" if argumentos.colocar_etiquetas else "n",
+    )
+    print(
+        str(resumen["ancho"]) + "x" + str(resumen["alto"]),
+        "píxeles en",
+        resumen["franjas"],
+        "franjas,",
+        round(resumen["segundos"], 1),
+        "segundos",
+    )
+
+
+if __name__ == "__main__":
+    main()
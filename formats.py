@@ -3,10 +3,21 @@
 
 import math
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.ticker as ptk
-import cartopy.crs as ccrs
-from cartopy.mpl.ticker import LongitudeFormatter, LatitudeFormatter
+import ajuste_epoca
+import catalogos
+import constelaciones
+import detalle
+import indice
+import precesion
+import proyeccion
+
+# matplotlib, cartopy y el módulo etiquetas.py se importan dentro de las funciones de
+# dibujo, la primera vez que se usan, de modo que los programas que solo leen los
+# catálogos o calculan posiciones y residuos no los cargan.
+# Catálogos del planisferio AzimuthalEquidistant, por la variable que los selecciona.
+CATALOGOS_PLANISFERIO = {"ptolomeo": "ptolomeo", "alfonso": "alfonso_ptolomeo", "j2000": "actuales"}
+
+_residuos = {}
 
 
 # Impresión planisferio celeste en proyección AzimuthalEquidistant
@@ -36,6 +47,26 @@ from cartopy.mpl.ticker import LongitudeFormatter, LatitudeFormatter
 # de las coordenadas eclípticas de las dos o tres eras, girando hacia el pasado los grados
 # de precesión correspondientes, por medio de una resta de los grados de precesión real
 # aplicados a cada una de las longitudes eclípticas.
+# Con una "n" en la variable mostrar no se abre la ventana del gráfico, y se devuelve la
+# figura, por ejemplo para guardarla con savefig. En la variable figura se puede indicar
+# una figura ya creada, que se borra y se reutiliza.
+# Con un año en la variable epoca, las estrellas actuales no se toman giradas del
+# fichero, sino que se precesan desde J2000 hasta esa época con el módulo precesion.py,
+# incluido el movimiento de la eclíptica.
+# Con una "s" en la variable residuos se dibuja, para cada estrella del Almagesto
+# emparejada con una estrella actual, una flecha desde la posición actual, precesada a la
+# época indicada o al año 138, hasta la posición del Almagesto. Con una "s" en la
+# variable colorear_residuos, las flechas se colorean según el tamaño del residuo.
+# Con una "s" en la variable colocar_etiquetas, las etiquetas de todos los catálogos se
+# colocan a la vez con el módulo etiquetas.py, evitando que se solapen; la posición de
+# los ficheros es la preferida, pero no obligatoria.
+# Con un tamaño de punto en la variable tam_minimo solo se dibujan las estrellas con ese
+# tamaño o mayor, y con una densidad en la variable densidad, en estrellas por pulgada
+# cuadrada de los ejes, solo las más brillantes de cada catálogo hasta esa densidad. Las
+# variables tam_minimo_etiquetas y densidad_etiquetas limitan del mismo modo las
+# etiquetas, entre las estrellas que se dibujan.
+# En la variable externo se puede indicar la ruta de un catálogo grande, con el formato
+# del fichero de estrellas actuales, cuyas estrellas se dibujan leyéndolo por trozos.
 def impresion_reticula_AzimuthalEquidistant(
     ptolomeo,
     plotear_puntos_ptolomeo,
@@ -46,15 +77,35 @@ def impresion_reticula_AzimuthalEquidistant(
     j2000,
     plotear_puntos_j2000,
     anotar_puntos_j2000,
+    mostrar="s",
+    figura=None,
+    epoca=None,
+    residuos="n",
+    colorear_residuos="n",
+    colocar_etiquetas="n",
+    tam_minimo=None,
+    densidad=None,
+    tam_minimo_etiquetas=None,
+    densidad_etiquetas=None,
+    externo=None,
 ):
 
-    if plotear_puntos_ptolomeo == "s" or plotear_puntos_alfonso == "s" or plotear_puntos_j2000 == "s":
-        plt.figure(figsize=[40, 40], facecolor="white")
+    import matplotlib.pyplot as plt
+    import matplotlib.ticker as ptk
+    import cartopy.crs as ccrs
+    from cartopy.mpl.ticker import LongitudeFormatter, LatitudeFormatter
+    import etiquetas
+
+    dibujo = plotear_puntos_ptolomeo == "s" or plotear_puntos_alfonso == "s" or plotear_puntos_j2000 == "s"
+    dibujo = dibujo or residuos == "s"
+
+    if dibujo:
+        fig = preparar_figura(figura, [40, 40], "white")
     else:
-        plt.figure(figsize=[40, 40], facecolor="none")
+        fig = preparar_figura(figura, [40, 40], "none")
 
-    projection, transform = ccrs.AzimuthalEquidistant(central_latitude=90), ccrs.PlateCarree()
-    ax = plt.axes(projection=projection)
+    projection = ccrs.AzimuthalEquidistant(central_latitude=90)
+    ax = fig.add_subplot(projection=projection)
 
     ax.set_global()
 
@@ -65,7 +116,7 @@ def impresion_reticula_AzimuthalEquidistant(
     longitude_formatter = LongitudeFormatter(cardinal_labels=cardinal_labels)
     latitude_formatter = LatitudeFormatter(cardinal_labels=cardinal_labels)
 
-    if plotear_puntos_ptolomeo == "s" or plotear_puntos_alfonso == "s" or plotear_puntos_j2000 == "s":
+    if dibujo:
         ax.set_facecolor("black")
         gl = ax.gridlines(
             crs=ccrs.PlateCarree(central_longitude=0),
@@ -90,142 +141,105 @@ def impresion_reticula_AzimuthalEquidistant(
         ax.set_facecolor("black")
         ax.set_title(" ", fontsize=14, fontweight="bold")
 
+    pendientes = [] if colocar_etiquetas == "s" else None
+
     if ptolomeo == "s":
 
-        archivo = open("Constelaciones y estrellas ptolemaicas.prn", "r")
-
-        j = 0
-
-        while j == 0:
-            linea = archivo.readline()
-            if len(linea) <= 1:
-                j = 1
-                archivo.close()
-            else:
-                lon = float(linea[100:105].replace(",", "."))
-                lat = float(linea[106:111].replace(",", "."))
-                tam = float(linea[112:115].replace(",", "."))
-                if plotear_puntos_ptolomeo == "s":
-                    ax.scatter(
-                        lon, lat, color="white", s=np.pi * tam**2, alpha=1, transform=transform
-                    )  # dibujar punto en (lon, lat) dados
-                if anotar_puntos_ptolomeo == "s":
-                    if linea[136:137].strip() == "L":
-                        lon_etiq = lon + float(linea[128:131].replace(",", "."))
-                        ha_etiq = "left"
-                    elif linea[136:137].strip() == "C":
-                        lon_etiq = lon + float(linea[128:131].replace(",", "."))
-                        ha_etiq = "center"
-                    elif linea[136:137].strip() == "R":
-                        lon_etiq = lon - float(linea[128:131].replace(",", "."))
-                        ha_etiq = "right"
-                    if linea[138:139].strip() == "T":
-                        lat_etiq = lat + float(linea[132:135].replace(",", "."))
-                        va_etiq = "top"
-                    elif linea[138:139].strip() == "C":
-                        lat_etiq = lat + float(linea[132:135].replace(",", "."))
-                        va_etiq = "center"
-                    elif linea[138:139].strip() == "B":
-                        lat_etiq = lat - float(linea[132:135].replace(",", "."))
-                        va_etiq = "bottom"
-                    if linea[4:6].strip() + " " + linea[8:10].strip() == "PR 25":
-                        print(linea[8:10].strip() + " " + linea[4:7].strip(), lon, lon_etiq, lat, lat_etiq)
-                    ax.annotate(
-                        linea[8:10].strip() + " " + linea[4:7].strip(),
-                        (lon_etiq, lat_etiq),
-                        color="brown",
-                        weight="bold",
-                        ha=ha_etiq,
-                        va=va_etiq,
-                        size=7,
-                        transform=transform,
-                    )
+        estrellas = catalogos.cargar_catalogo(CATALOGOS_PLANISFERIO["ptolomeo"])
+        puntos = detalle.seleccion_detalle(ax, estrellas, slice(None), tam_minimo, densidad)
+        rotulos = detalle.seleccion_detalle(ax, estrellas, puntos, tam_minimo_etiquetas, densidad_etiquetas)
+        if plotear_puntos_ptolomeo == "s":
+            dibujar_puntos(ax, estrellas, "white", puntos, CATALOGOS_PLANISFERIO["ptolomeo"])
+        if anotar_puntos_ptolomeo == "s":
+            textos = np.char.add(np.char.add(estrellas["secuencia"].astype(str), " "), estrellas["codigo"])
+            textos = np.char.add(textos, np.where(estrellas["cerca"], "C", ""))
+            lon_etiq, lat_etiq, ha_etiq, va_etiq = etiquetas_planisferio(estrellas)
+            anotar(
+                ax,
+                estrellas,
+                "etiquetas_planisferio",
+                textos,
+                lon_etiq,
+                lat_etiq,
+                ha_etiq,
+                va_etiq,
+                rotulos,
+                pendientes,
+                color="brown",
+                weight="bold",
+                size=7,
+            )
 
     if alfonso == "s":
 
-        archivo = open("Constelaciones alfonsíes ptolomeo - python.prn", "r")
-
-        j = 0
-
-        while j == 0:
-            linea = archivo.readline()
-            if len(linea) <= 1:
-                archivo.close()
-                j = 1
-            else:
-                lon = float(linea[123:129].replace(",", "."))
-                lat = float(linea[133:139].replace(",", "."))
-                tam = float(linea[143:146].replace(",", "."))
-                if plotear_puntos_alfonso == "s":
-                    ax.scatter(
-                        lon, lat, color="grey", s=np.pi * tam**2, alpha=1, transform=transform
-                    )  # dibujar punto en (lon, lat) dados
-                if anotar_puntos_alfonso == "s":
-                    ax.annotate(
-                        linea[10:12].strip() + " " + linea[6:9].strip(),
-                        (lon - 1.0, lat - 1.0),
-                        color="violet",
-                        weight="bold",
-                        ha="right",
-                        va="bottom",
-                        size=7,
-                        transform=transform,
-                    )
+        estrellas = catalogos.cargar_catalogo(CATALOGOS_PLANISFERIO["alfonso"])
+        puntos = detalle.seleccion_detalle(ax, estrellas, slice(None), tam_minimo, densidad)
+        rotulos = detalle.seleccion_detalle(ax, estrellas, puntos, tam_minimo_etiquetas, densidad_etiquetas)
+        if plotear_puntos_alfonso == "s":
+            dibujar_puntos(ax, estrellas, "grey", puntos, CATALOGOS_PLANISFERIO["alfonso"])
+        if anotar_puntos_alfonso == "s":
+            textos = np.char.add(np.char.add(estrellas["secuencia"].astype(str), " "), estrellas["codigo"])
+            anotar(
+                ax,
+                estrellas,
+                "etiquetas_alfonso",
+                textos,
+                estrellas["lon"] - 1.0,
+                estrellas["lat"] - 1.0,
+                np.full(len(textos), "right"),
+                np.full(len(textos), "bottom"),
+                rotulos,
+                pendientes,
+                color="violet",
+                weight="bold",
+                size=7,
+            )
 
     if j2000 == "s":
 
-        archivo = open("Constelaciones y estrellas actuales.prn", "r")
-
-        j = 0
-
-        while j == 0:
-            linea = archivo.readline()
-            if len(linea) <= 1:
-                j = 1
-                archivo.close()
-            else:
-                lon = float(linea[28:34].replace(",", "."))
-                lat = float(linea[40:46].replace(",", "."))
-                tam = float(linea[52:55].replace(",", "."))
-                if plotear_puntos_j2000 == "s":
-                    ax.scatter(
-                        lon, lat, color="dodgerblue", s=np.pi * tam**2, alpha=1, transform=transform
-                    )  # dibujar punto en (lon, lat) dados
-                if anotar_puntos_j2000 == "s":
-                    if linea[83:84].strip() == "L":
-                        lon_etiq = lon + float(linea[73:76].replace(",", "."))
-                        ha_etiq = "left"
-                    elif linea[83:84].strip() == "C":
-                        lon_etiq = lon + float(linea[73:76].replace(",", "."))
-                        ha_etiq = "center"
-                    elif linea[83:84].strip() == "R":
-                        lon_etiq = lon - float(linea[73:76].replace(",", "."))
-                        ha_etiq = "right"
-                    if linea[86:87].strip() == "T":
-                        lat_etiq = lat + float(linea[78:81].replace(",", "."))
-                        va_etiq = "top"
-                    elif linea[86:87].strip() == "C":
-                        lat_etiq = lat + float(linea[78:81].replace(",", "."))
-                        va_etiq = "center"
-                    elif linea[86:87].strip() == "B":
-                        lat_etiq = lat - float(linea[78:81].replace(",", "."))
-                        va_etiq = "bottom"
-                    ax.annotate(
-                        linea[3:5].strip() + " " + linea[0:2].strip(),
-                        (lon_etiq, lat_etiq),
-                        color="green",
-                        weight="bold",
-                        ha=ha_etiq,
-                        va=va_etiq,
-                        size=7,
-                        transform=transform,
-                    )
+        if epoca is None:
+            estrellas = catalogos.cargar_catalogo(CATALOGOS_PLANISFERIO["j2000"])
+        else:
+            estrellas = precesion.catalogo_en_epoca(CATALOGOS_PLANISFERIO["j2000"], epoca)
+        puntos = detalle.seleccion_detalle(ax, estrellas, slice(None), tam_minimo, densidad)
+        rotulos = detalle.seleccion_detalle(ax, estrellas, puntos, tam_minimo_etiquetas, densidad_etiquetas)
+        if plotear_puntos_j2000 == "s":
+            dibujar_puntos(ax, estrellas, "dodgerblue", puntos, CATALOGOS_PLANISFERIO["j2000"])
+        if anotar_puntos_j2000 == "s":
+            textos = np.char.add(np.char.add(estrellas["secuencia"].astype(str), " "), estrellas["codigo"])
+            lon_etiq, lat_etiq, ha_etiq, va_etiq = etiquetas_planisferio(estrellas)
+            anotar(
+                ax,
+                estrellas,
+                "etiquetas_planisferio",
+                textos,
+                lon_etiq,
+                lat_etiq,
+                ha_etiq,
+                va_etiq,
+                rotulos,
+                pendientes,
+                color="green",
+                weight="bold",
+                size=7,
+            )
+
+    if externo is not None:
+        dibujar_externo(ax, externo)
+
+    if residuos == "s":
+        dibujar_residuos(ax, epoca=epoca, colorear=colorear_residuos)
 
     ax.invert_xaxis()
 
-    plt.show()
+    if pendientes:
+        etiquetas.colocar_etiquetas(ax, pendientes)
+
+    if mostrar == "s":
+        plt.show()
+        return ()
 
-    return ()
+    return fig
 
 
 # Impresión planisferio celeste en proyección PlateCarrée/Constelación
@@ -233,75 +247,58 @@ def impresion_reticula_AzimuthalEquidistant(
 # que se va a procesar. Se obtiene la proyección PlateCarrée de los catálogos de estrellas
 # que se quiera comparar: Almagesto, Teón, Alfonso y J2000. Las coordenadas eclípticas,
 # longitudes y latitudes, están en cada uno los ficheros planos de proceso.
+# El título, el tamaño de la figura, la longitud central y la extensión de cada
+# constelación están en el registro del módulo constelaciones.py. Una "s" en la variable
+# extension_automatica calcula la extensión a partir de las estrellas que se dibujan,
+# con el margen indicado en grados. Las variables mostrar, figura, epoca, residuos,
+# colorear_residuos y colocar_etiquetas tienen el mismo significado que en el planisferio
+# AzimuthalEquidistant; los residuos son los de las estrellas de la constelación. Las
+# variables tam_minimo, densidad, tam_minimo_etiquetas y densidad_etiquetas seleccionan,
+# como en el planisferio, las estrellas más brillantes de la constelación. Del catálogo
+# de la variable externo solo se analizan las filas de los códigos de la constelación.
 def impresion_reticula_PlateCarree_Constelacion(
-    Constelacion, diferencia_ptolomeo_alfonso, anotar_puntos, ptolomeo, teon, alfonso, j2000
+    Constelacion,
+    diferencia_ptolomeo_alfonso,
+    anotar_puntos,
+    ptolomeo,
+    teon,
+    alfonso,
+    j2000,
+    extension_automatica="n",
+    margen=5,
+    mostrar="s",
+    figura=None,
+    epoca=None,
+    residuos="n",
+    colorear_residuos="n",
+    colocar_etiquetas="n",
+    tam_minimo=None,
+    densidad=None,
+    tam_minimo_etiquetas=None,
+    densidad_etiquetas=None,
+    externo=None,
 ):
 
-    if Constelacion == "HY" or Constelacion == "AG":
-        plt.figure(figsize=[20, 50], facecolor="white")
-    else:
-        if Constelacion == "DR":
-            plt.figure(figsize=[30, 60], facecolor="white")
-        else:
-            plt.figure(figsize=[10, 20], facecolor="white")
-
-    if (
-        Constelacion == "MA"
-        or Constelacion == "MI"
-        or Constelacion == "DR"
-        or Constelacion == "CF"
-        or Constelacion == "CS"
-        or Constelacion == "PR"
-        or Constelacion == "AU"
-        or Constelacion == "EQ"
-        or Constelacion == "AD"
-        or Constelacion == "TR"
-        or Constelacion == "AR"
-        or Constelacion == "TA"
-        or Constelacion == "GE"
-        or Constelacion == "CR"
-        or Constelacion == "LE"
-        or Constelacion == "PI"
-        or Constelacion == "CT"
-        or Constelacion == "OR"
-        or Constelacion == "AM"
-        or Constelacion == "LP"
-        or Constelacion == "CN"
-        or Constelacion == "PC"
-        or Constelacion == "AG"
-    ):
-        projection, transform = ccrs.PlateCarree(), ccrs.PlateCarree()
-    else:
-        if (
-            Constelacion == "BO"
-            or Constelacion == "CB"
-            or Constelacion == "HE"
-            or Constelacion == "LY"
-            or Constelacion == "CY"
-            or Constelacion == "OP"
-            or Constelacion == "SO"
-            or Constelacion == "ST"
-            or Constelacion == "AL"
-            or Constelacion == "DE"
-            or Constelacion == "PQ"
-            or Constelacion == "VI"
-            or Constelacion == "LI"
-            or Constelacion == "SC"
-            or Constelacion == "SG"
-            or Constelacion == "CP"
-            or Constelacion == "AQ"
-            or Constelacion == "HY"
-            or Constelacion == "PT"
-            or Constelacion == "CO"
-            or Constelacion == "CE"
-            or Constelacion == "FE"
-            or Constelacion == "TU"
-            or Constelacion == "CA"
-            or Constelacion == "PA"
-        ):
-            projection, transform = ccrs.PlateCarree(central_longitude=180), ccrs.PlateCarree()
-
-    ax = plt.axes(projection=projection)
+    import matplotlib.pyplot as plt
+    import cartopy.crs as ccrs
+    import etiquetas
+
+    conf = constelaciones.configuracion(Constelacion, diferencia_ptolomeo_alfonso, teon, alfonso, j2000)
+
+    capas = capas_constelacion(conf, diferencia_ptolomeo_alfonso, ptolomeo, teon, alfonso, j2000, epoca)
+
+    extension = conf["extension"]
+    if extension_automatica == "s" or extension is None:
+        lon = np.concatenate([estrellas["lon"][seleccion] for _, estrellas, seleccion, _, _, _ in capas] + [[]])
+        lat = np.concatenate([estrellas["lat"][seleccion] for _, estrellas, seleccion, _, _, _ in capas] + [[]])
+        if len(lon) > 0:
+            extension = constelaciones.extension_automatica(lon, lat, conf["longitud_central"], margen)
+    long_min, long_max, lat_min, lat_max = extension
+    add_180 = conf["add_180"]
+    add_360 = conf["add_360"]
+
+    fig = preparar_figura(figura, conf["figura"], "white")
+    ax = fig.add_subplot(projection=ccrs.PlateCarree(central_longitude=conf["longitud_central"]))
     ax.set_facecolor("black")
     ax.text(
         -0.07,
@@ -324,550 +321,7 @@ def impresion_reticula_PlateCarree_Constelacion(
         transform=ax.transAxes,
     )  # We want the map to go down to 10 degrees latitude.
 
-    add_180 = 0
-    add_360 = 0
-
-    if Constelacion == "MA":  # osa mayor
-        ax.set_title("MAIORIS VRSAE", fontsize=14, fontweight="bold")
-        if alfonso == "s" and j2000 == "s":
-            long_min = 70
-            long_max = 170
-        else:
-            if diferencia_ptolomeo_alfonso == "s":
-                long_min = 70
-                long_max = 170
-            else:
-                long_min = 80
-                long_max = 160
-        lat_min = 10
-        lat_max = 60
-    elif Constelacion == "MI":  # osa menor
-        ax.set_title("MINORIS VRSAE", fontsize=14, fontweight="bold")
-        if alfonso == "s" and j2000 == "s":
-            long_min = 70
-            long_max = 140
-        else:
-            long_min = 50
-            if diferencia_ptolomeo_alfonso == "s":
-                long_max = 140
-            else:
-                long_max = 120
-        lat_min = 60
-        lat_max = 90
-    elif Constelacion == "DR":  # dragón
-        ax.set_title("DRACONIS", fontsize=14, fontweight="bold")
-        long_min = -180
-        long_max = 180
-        lat_min = 50
-        lat_max = 90
-        add_360 = 360
-    elif Constelacion == "CF":  # cefeo
-        ax.set_title("CEPHEUS", fontsize=14, fontweight="bold")
-        long_min = -30
-        long_max = 90
-        lat_min = 50
-        lat_max = 80
-        add_360 = 360
-    elif Constelacion == "BO":  # bootes
-        ax.set_title("BOOTES", fontsize=14, fontweight="bold")
-        long_min = 150
-        if alfonso == "s" and j2000 == "s":
-            long_max = 220
-        else:
-            if diferencia_ptolomeo_alfonso == "s":
-                long_max = 220
-            else:
-                long_max = 200
-        lat_min = 20
-        lat_max = 70
-        add_180 = 180
-    elif Constelacion == "CB":  # corona borealis
-        ax.set_title("CORONA BOREALIS", fontsize=14, fontweight="bold")
-        long_min = 190
-        if alfonso == "s" and j2000 == "s":
-            long_max = 230
-        else:
-            if diferencia_ptolomeo_alfonso == "s":
-                long_max = 220
-            else:
-                long_max = 210
-        lat_min = 40
-        lat_max = 60
-        add_180 = 180
-    elif Constelacion == "HE":  # hércules
-        ax.set_title("HERCULES", fontsize=14, fontweight="bold")
-        long_min = 180
-        if diferencia_ptolomeo_alfonso == "s":
-            long_max = 260
-        else:
-            long_max = 250
-        lat_min = 30
-        lat_max = 80
-        add_180 = 180
-    elif Constelacion == "LY":  # lira
-        ax.set_title("LYRA", fontsize=14, fontweight="bold")
-        if alfonso == "s" and j2000 == "s":
-            long_min = 270
-            long_max = 290
-        else:
-            long_min = 250
-            if diferencia_ptolomeo_alfonso == "s":
-                long_max = 290
-            else:
-                long_max = 280
-        lat_min = 50
-        lat_max = 70
-        add_180 = 180
-    elif Constelacion == "CY":  # cisne o auis callina
-        ax.set_title("CYGNUS", fontsize=14, fontweight="bold")
-        if alfonso == "s" and j2000 == "s":
-            long_min = 280
-            long_max = 340
-        else:
-            long_min = 270
-            if diferencia_ptolomeo_alfonso == "s":
-                long_max = 340
-            else:
-                long_max = 320
-        lat_min = 30
-        lat_max = 80
-        add_180 = 180
-    elif Constelacion == "CS":  # cassiopeia
-        ax.set_title("CASSIOPEIA", fontsize=14, fontweight="bold")
-        if alfonso == "s" and j2000 == "s":
-            long_min = 10
-            long_max = 50
-        else:
-            long_min = 0
-            if diferencia_ptolomeo_alfonso == "s":
-                long_max = 50
-            else:
-                long_max = 30
-        lat_min = 40
-        lat_max = 60
-    elif Constelacion == "PR":  # perseus
-        ax.set_title("PERSEUS", fontsize=14, fontweight="bold")
-        long_min = 20
-        if diferencia_ptolomeo_alfonso == "s":
-            long_max = 70
-        else:
-            long_max = 50
-        lat_min = 10
-        lat_max = 50
-    elif Constelacion == "AU":  # auriga
-        ax.set_title("AURIGA", fontsize=14, fontweight="bold")
-        long_min = 40
-        if diferencia_ptolomeo_alfonso == "s":
-            long_max = 90
-        else:
-            long_max = 70
-        lat_min = 0
-        lat_max = 40
-    elif Constelacion == "OP":  # ophiucus
-        ax.set_title("OPHIUCUS", fontsize=14, fontweight="bold")
-        if alfonso == "s" and j2000 == "s":
-            long_min = 190
-            long_max = 270
-            lat_max = 50
-        else:
-            long_min = 210
-            if diferencia_ptolomeo_alfonso == "s":
-                long_max = 280
-                lat_max = 50
-            else:
-                long_max = 250
-                lat_max = 40
-        lat_min = -10
-        add_180 = 180
-    elif Constelacion == "SO":  # serpentis ophiuchi
-        ax.set_title("SERPENTIS OPHIUCHI", fontsize=14, fontweight="bold")
-        long_min = 190
-        long_max = 260
-        lat_min = 0
-        lat_max = 50
-        add_180 = 180
-    elif Constelacion == "ST":  # sagitta
-        ax.set_title("SAGITTA", fontsize=14, fontweight="bold")
-        long_min = 270
-        if diferencia_ptolomeo_alfonso == "s":
-            long_max = 300
-        else:
-            long_max = 290
-        lat_min = 30
-        lat_max = 50
-        add_180 = 180
-    elif Constelacion == "AL":  # aquila
-        ax.set_title("AQUILA", fontsize=14, fontweight="bold")
-        long_min = 260
-        long_max = 310
-        lat_min = 10
-        lat_max = 40
-        add_180 = 180
-    elif Constelacion == "DE":  # delphinis
-        ax.set_title("DELPHINIS", fontsize=14, fontweight="bold")
-        long_min = 270
-        if diferencia_ptolomeo_alfonso == "s":
-            long_max = 320
-        else:
-            long_max = 300
-        lat_min = 10
-        lat_max = 40
-        add_180 = 180
-    elif Constelacion == "PQ":  # praecisionis equi
-        ax.set_title("PRAECISIONIS EQUI", fontsize=14, fontweight="bold")
-        long_min = 290
-        if diferencia_ptolomeo_alfonso == "s":
-            long_max = 320
-        else:
-            long_max = 300
-        lat_min = 20
-        lat_max = 30
-        add_180 = 180
-    elif Constelacion == "EQ":  # equi
-        ax.set_title("EQUI", fontsize=14, fontweight="bold")
-        long_min = -60
-        long_max = -10
-        lat_min = 10
-        lat_max = 50
-    elif Constelacion == "AD":  # andrómeda
-        ax.set_title("ANDROMEDA", fontsize=14, fontweight="bold")
-        long_min = -20
-        if diferencia_ptolomeo_alfonso == "s":
-            long_max = 40
-        else:
-            long_max = 20
-        lat_min = 10
-        lat_max = 50
-    elif Constelacion == "TR":  # trianguli
-        ax.set_title("TRIANGULI", fontsize=14, fontweight="bold")
-        long_min = 10
-        if diferencia_ptolomeo_alfonso == "s":
-            long_max = 40
-        else:
-            long_max = 20
-        lat_min = 10
-        lat_max = 30
-    elif Constelacion == "AR":  # aries
-        ax.set_title("ARIES", fontsize=14, fontweight="bold")
-        if alfonso == "s" and j2000 == "s":
-            long_min = 20
-            long_max = 50
-        else:
-            long_min = 0
-            if diferencia_ptolomeo_alfonso == "s":
-                long_max = 50
-            else:
-                long_max = 30
-        lat_min = -10
-        lat_max = 20
-    elif Constelacion == "TA":  # tauro
-        ax.set_title("TAURUS", fontsize=14, fontweight="bold")
-        if alfonso == "s" and j2000 == "s":
-            long_min = 30
-            long_max = 90
-        else:
-            long_min = 20
-            if diferencia_ptolomeo_alfonso == "s":
-                long_max = 90
-            else:
-                long_max = 70
-        lat_min = -20
-        lat_max = 10
-    elif Constelacion == "GE":  # gemini
-        ax.set_title("GEMINI", fontsize=14, fontweight="bold")
-        if alfonso == "s" and j2000 == "s":
-            long_min = 70
-            long_max = 120
-        else:
-            long_min = 60
-            if diferencia_ptolomeo_alfonso == "s":
-                long_max = 120
-            else:
-                long_max = 100
-        lat_min = -20
-        lat_max = 20
-    elif Constelacion == "CR":  # cancer
-        ax.set_title("CANCER", fontsize=14, fontweight="bold")
-        long_min = 80
-        if alfonso == "s" and j2000 == "s":
-            long_max = 130
-        else:
-            if diferencia_ptolomeo_alfonso == "s":
-                long_max = 130
-            else:
-                long_max = 120
-        lat_min = -20
-        lat_max = 20
-    elif Constelacion == "LE":  # leo
-        ax.set_title("LEO", fontsize=14, fontweight="bold")
-        if alfonso == "s" and j2000 == "s":
-            long_min = 120
-            long_max = 170
-            lat_min = -35
-        else:
-            if diferencia_ptolomeo_alfonso == "s":
-                long_min = 100
-                long_max = 170
-                lat_min = -35
-            else:
-                long_min = 100
-                long_max = 150
-                lat_min = -10
-        lat_max = 40
-    elif Constelacion == "VI":  # virgo
-        ax.set_title("VIRGO", fontsize=14, fontweight="bold")
-        if alfonso == "s" and j2000 == "s":
-            long_min = 150
-            long_max = 220
-        else:
-            long_min = 140
-            if diferencia_ptolomeo_alfonso == "s":
-                long_max = 220
-            else:
-                long_max = 200
-        lat_min = -10
-        lat_max = 30
-        add_180 = 180
-    elif Constelacion == "LI":  # libra
-        if teon == "s":
-            ax.set_title("LIBRA/ESCORPION", fontsize=14, fontweight="bold")
-            long_min = 190
-            long_max = 250
-            lat_min = -30
-        else:
-            ax.set_title("LIBRA", fontsize=14, fontweight="bold")
-            if alfonso == "s" and j2000 == "s":
-                long_min = 210
-                long_max = 240
-                lat_min = -20
-            else:
-                long_min = 190
-                if diferencia_ptolomeo_alfonso == "s":
-                    long_max = 240
-                else:
-                    long_max = 220
-                lat_min = -20
-        lat_max = 20
-        add_180 = 180
-    elif Constelacion == "SC":  # escorpión
-        ax.set_title("SCORPIUS", fontsize=14, fontweight="bold")
-        if alfonso == "s" and j2000 == "s":
-            long_min = 220
-            long_max = 270
-        else:
-            long_min = 200
-            if diferencia_ptolomeo_alfonso == "s":
-                long_max = 270
-            else:
-                long_max = 250
-        lat_min = -30
-        lat_max = 20
-        add_180 = 180
-    elif Constelacion == "SG":  # sagitario
-        ax.set_title("SAGITTARIUS", fontsize=14, fontweight="bold")
-        if teon == "s":
-            long_min = 230
-            long_max = 280
-        else:
-            if alfonso == "s" and j2000 == "s":
-                long_min = 250
-                long_max = 300
-            else:
-                long_min = 240
-                if diferencia_ptolomeo_alfonso == "s":
-                    long_max = 300
-                else:
-                    long_max = 280
-        lat_min = -30
-        lat_max = 10
-        add_180 = 180
-    elif Constelacion == "CP":  # capricornio
-        ax.set_title("CAPRICORNUS", fontsize=14, fontweight="bold")
-        if teon == "s":
-            long_min = 260
-            long_max = 300
-        else:
-            if alfonso == "s" and j2000 == "s":
-                long_min = 290
-                long_max = 320
-            else:
-                long_min = 270
-                if diferencia_ptolomeo_alfonso == "s":
-                    long_max = 320
-                else:
-                    long_max = 300
-        lat_min = -10
-        lat_max = 10
-        add_180 = 180
-    elif Constelacion == "AQ":  # aquario
-        ax.set_title("AQUARIUS", fontsize=14, fontweight="bold")
-        if alfonso == "s" and j2000 == "s":
-            long_min = 290
-            long_max = 350
-        else:
-            long_min = 280
-            if diferencia_ptolomeo_alfonso == "s":
-                long_max = 350
-            else:
-                long_max = 340
-        lat_min = -30
-        lat_max = 20
-        add_180 = 180
-    elif Constelacion == "PI":  # pisces
-        ax.set_title("PISCES", fontsize=14, fontweight="bold")
-        if alfonso == "s" and j2000 == "s":
-            long_min = -50
-            long_max = 30
-        else:
-            long_min = -50
-            if diferencia_ptolomeo_alfonso == "s":
-                long_max = 30
-            else:
-                long_max = 10
-        lat_min = -20
-        lat_max = 30
-    elif Constelacion == "CT":  # cetus
-        ax.set_title("CETUS", fontsize=14, fontweight="bold")
-        long_min = -30
-        if diferencia_ptolomeo_alfonso == "s":
-            long_max = 40
-        else:
-            long_max = 30
-        lat_min = -40
-        lat_max = 0
-    elif Constelacion == "OR":  # orionis
-        ax.set_title("ORIONIS", fontsize=14, fontweight="bold")
-        if alfonso == "s" and j2000 == "s":
-            long_max = 90
-            long_min = 50
-        else:
-            long_min = 40
-            long_max = 70
-        lat_min = -40
-        lat_max = 0
-    elif Constelacion == "AM":  # eridanus
-        ax.set_title("ERIDANUS", fontsize=14, fontweight="bold")
-        long_min = -10
-        if alfonso == "s":
-            long_max = 90
-            lat_max = 0
-        else:
-            long_max = 50
-            lat_max = -20
-        lat_min = -60
-    elif Constelacion == "LP":  # leporis
-        ax.set_title("LEPORIS", fontsize=14, fontweight="bold")
-        long_min = 40
-        if diferencia_ptolomeo_alfonso == "s":
-            long_max = 90
-        else:
-            long_max = 80
-        lat_min = -50
-        lat_max = -30
-    elif Constelacion == "CN":  # canis
-        ax.set_title("CANIS", fontsize=14, fontweight="bold")
-        long_min = 40
-        if diferencia_ptolomeo_alfonso == "s":
-            long_max = 110
-        else:
-            long_max = 100
-        lat_min = -70
-        lat_max = -20
-    elif Constelacion == "PC":  # precanis
-        ax.set_title("PRECANIS", fontsize=14, fontweight="bold")
-        long_min = 80
-        if diferencia_ptolomeo_alfonso == "s":
-            long_max = 110
-        else:
-            long_max = 100
-        lat_min = -20
-        lat_max = -10
-    elif Constelacion == "AG":  # navis
-        ax.set_title("NAVIS", fontsize=14, fontweight="bold")
-        long_min = 60
-        if diferencia_ptolomeo_alfonso == "s":
-            long_max = 180
-        else:
-            long_max = 170
-        lat_min = -80
-        lat_max = -40
-    elif Constelacion == "HY":  # hydra
-        ax.set_title("HYDRA", fontsize=14, fontweight="bold")
-        long_min = 70
-        if diferencia_ptolomeo_alfonso == "s":
-            long_max = 220
-        else:
-            long_max = 200
-        lat_min = -50
-        lat_max = 0
-        add_180 = 180
-    elif Constelacion == "PT":  # patera
-        ax.set_title("PATERA", fontsize=14, fontweight="bold")
-        long_min = 140
-        if diferencia_ptolomeo_alfonso == "s":
-            long_max = 180
-        else:
-            long_max = 165
-        lat_min = -30
-        lat_max = -10
-        add_180 = 180
-    elif Constelacion == "CO":  # corvus
-        ax.set_title("CORVUS", fontsize=14, fontweight="bold")
-        long_min = 160
-        if diferencia_ptolomeo_alfonso == "s":
-            long_max = 190
-        else:
-            long_max = 180
-        lat_min = -30
-        lat_max = -10
-        add_180 = 180
-    elif Constelacion == "CE":  # centaurus
-        ax.set_title("CENTAURUS", fontsize=14, fontweight="bold")
-        long_min = 170
-        if diferencia_ptolomeo_alfonso == "s":
-            long_max = 240
-        else:
-            long_max = 230
-        lat_min = -60
-        lat_max = 0
-        add_180 = 180
-    elif Constelacion == "FE":  # fera
-        ax.set_title("FERA", fontsize=14, fontweight="bold")
-        long_min = 200
-        long_max = 220
-        lat_min = -40
-        lat_max = 0
-        add_180 = 180
-    elif Constelacion == "TU":  # turibuli
-        ax.set_title("TURIBULI", fontsize=14, fontweight="bold")
-        long_min = 230
-        if diferencia_ptolomeo_alfonso == "s":
-            long_max = 260
-        else:
-            long_max = 250
-        lat_min = -40
-        lat_max = -10
-        add_180 = 180
-    elif Constelacion == "CA":  # corona australis
-        ax.set_title("CORONA AUSTRALIS", fontsize=14, fontweight="bold")
-        long_min = 240
-        if diferencia_ptolomeo_alfonso == "s":
-            long_max = 280
-        else:
-            long_max = 260
-        lat_min = -30
-        lat_max = -10
-        add_180 = 180
-    elif Constelacion == "PA":  # pisces austrinus
-        ax.set_title("PISCES AUSTRINUS", fontsize=14, fontweight="bold")
-        long_min = 270
-        if diferencia_ptolomeo_alfonso == "s":
-            long_max = 330
-        else:
-            long_max = 310
-        lat_min = -30
-        lat_max = -10
-        add_180 = 180
+    ax.set_title(conf["titulo"], fontsize=14, fontweight="bold")
 
     ax.set_extent([long_min, long_max, lat_min, lat_max], crs=ccrs.PlateCarree())
     ax.set_xticks(range(long_min, long_max, 10), crs=ccrs.PlateCarree())
@@ -899,206 +353,298 @@ def impresion_reticula_PlateCarree_Constelacion(
 
     ax.set_yticklabels(new_labels)
 
-    if ptolomeo == "s":
+    pendientes = [] if colocar_etiquetas == "s" else None
+    for nombre, estrellas, seleccion, textos, color, estilo in capas:
+        puntos = detalle.seleccion_detalle(ax, estrellas, seleccion, tam_minimo, densidad)
+        dibujar_puntos(ax, estrellas, color, puntos, nombre)
+        if anotar_puntos == "s":
+            lon_etiq, lat_etiq, ha_etiq, va_etiq = etiquetas_constelacion(estrellas)
+            anotar(
+                ax,
+                estrellas,
+                "etiquetas_constelacion",
+                textos,
+                lon_etiq,
+                lat_etiq,
+                ha_etiq,
+                va_etiq,
+                detalle.seleccion_detalle(ax, estrellas, puntos, tam_minimo_etiquetas, densidad_etiquetas),
+                pendientes,
+                size=9,
+                **estilo,
+            )
+
+    if externo is not None:
+        dibujar_externo(ax, externo, codigos=conf["codigos"])
+
+    if residuos == "s":
+        dibujar_residuos(ax, conf["codigos"], epoca, colorear_residuos)
 
-        archivo = open("Constelaciones y estrellas ptolemaicas.prn", "r")
-
-        j = 0
-
-        while j == 0:
-            linea = archivo.readline()
-            if len(linea) <= 1:
-                archivo.close()
-                j = 1
-            else:
-                if linea[4:6] == Constelacion or (alfonso == "s" and Constelacion == "OP" and linea[4:8] == "SO"):
-                    lon = float(linea[100:105].replace(",", "."))
-                    lat = float(linea[106:111].replace(",", "."))
-                    tam = float(linea[112:115].replace(",", "."))
-                    ax.scatter(
-                        lon, lat, color="white", s=np.pi * tam**2, alpha=1, transform=transform
-                    )  # dibujar punto en (lon, lat) dados
-                    if anotar_puntos == "s":
-                        if linea[124:125].strip() == "L":
-                            lon_etiq = lon - float(linea[116:119].replace(",", "."))
-                            ha_etiq = "left"
-                        else:
-                            lon_etiq = lon + float(linea[116:119].replace(",", "."))
-                            ha_etiq = "right"
-                        if linea[126:127].strip() == "T":
-                            lat_etiq = lat + float(linea[120:123].replace(",", "."))
-                            va_etiq = "top"
-                        else:
-                            lat_etiq = lat - float(linea[120:123].replace(",", "."))
-                            va_etiq = "bottom"
-                        if linea[6:7] == "C":
-                            etiqueta = linea[8:10].strip() + linea[6:7].strip()
-                        else:
-                            etiqueta = linea[8:10].strip()
-                        ax.annotate(
-                            etiqueta,
-                            (lon_etiq, lat_etiq),
-                            color="brown",
-                            weight="bold",
-                            ha=ha_etiq,
-                            va=va_etiq,
-                            size=9,
-                            transform=transform,
-                        )
+    ax.invert_xaxis()
 
-    if teon == "s":
+    if pendientes:
+        etiquetas.colocar_etiquetas(ax, pendientes)
 
-        archivo = open("Lugares de las fijas de los doce signos de Teón de Alejandría - python.prn", "r")
-
-        j = 0
-
-        while j == 0:
-            linea = archivo.readline()
-            if len(linea) <= 1:
-                archivo.close()
-                j = 1
-            else:
-                if linea[6:9] == Constelacion:
-                    lon = float(linea[90:97].replace(",", "."))
-                    lat = float(linea[98:105].replace(",", "."))
-                    tam = float(linea[108:112].replace(",", "."))
-                    ax.scatter(
-                        lon, lat, color="orange", s=np.pi * tam**2, alpha=1, transform=transform
-                    )  # dibujar punto en (lon, lat) dados
-                    if anotar_puntos == "s":
-                        if linea[132:133].strip() == "L":
-                            lon_etiq = lon - float(linea[113:116].replace(",", "."))
-                            ha_etiq = "left"
-                        else:
-                            lon_etiq = lon + float(linea[113:116].replace(",", "."))
-                            ha_etiq = "right"
-                        if linea[135:136].strip() == "T":
-                            lat_etiq = lat + float(linea[119:122].replace(",", "."))
-                            va_etiq = "top"
-                        else:
-                            lat_etiq = lat - float(linea[119:122].replace(",", "."))
-                            va_etiq = "bottom"
-                        ax.annotate(
-                            linea[10:12].strip(),
-                            (lon_etiq, lat_etiq),
-                            color="orange",
-                            weight="regular",
-                            ha=ha_etiq,
-                            va=va_etiq,
-                            size=9,
-                            transform=transform,
-                        )
+    if mostrar == "s":
+        plt.show()
+        return ()
 
-    if alfonso == "s":
+    return fig
 
-        if ptolomeo == "s" and diferencia_ptolomeo_alfonso == "n":
-            archivo = open("Constelaciones alfonsíes ptolomeo - python.prn", "r")
-        else:
-            archivo = open("Constelaciones alfonsíes j2000 - python.prn", "r")
-
-        j = 0
-
-        while j == 0:
-            linea = archivo.readline()
-            if len(linea) <= 1:
-                archivo.close()
-                j = 1
-            else:
-                if linea[6:8] == Constelacion:
-                    lon = float(linea[123:129].replace(",", "."))
-                    lat = float(linea[133:139].replace(",", "."))
-                    tam = float(linea[143:146].replace(",", "."))
-                    ax.scatter(
-                        lon, lat, color="grey", s=np.pi * tam**2, alpha=1, transform=transform
-                    )  # dibujar punto en (lon, lat) dados
-                    if anotar_puntos == "s":
-                        if ptolomeo == "s" and diferencia_ptolomeo_alfonso == "n":
-                            if linea[157:158].strip() == "L":
-                                lon_etiq = lon - float(linea[147:150].replace(",", "."))
-                                ha_etiq = "left"
-                            else:
-                                lon_etiq = lon + float(linea[147:150].replace(",", "."))
-                                ha_etiq = "right"
-                            if linea[160:161].strip() == "T":
-                                lat_etiq = lat + float(linea[152:155].replace(",", "."))
-                                va_etiq = "top"
-                            else:
-                                lat_etiq = lat - float(linea[152:155].replace(",", "."))
-                                va_etiq = "bottom"
-                        else:
-                            if linea[161:162].strip() == "L":
-                                lon_etiq = lon - float(linea[150:153].replace(",", "."))
-                                ha_etiq = "left"
-                            else:
-                                lon_etiq = lon + float(linea[150:153].replace(",", "."))
-                                ha_etiq = "right"
-                            if linea[164:165].strip() == "T":
-                                lat_etiq = lat + float(linea[156:159].replace(",", "."))
-                                va_etiq = "top"
-                            else:
-                                lat_etiq = lat - float(linea[156:159].replace(",", "."))
-                                va_etiq = "bottom"
-                        ax.annotate(
-                            linea[9:11].strip(),
-                            (lon_etiq, lat_etiq),
-                            color="grey",
-                            weight="regular",
-                            ha=ha_etiq,
-                            va=va_etiq,
-                            size=9,
-                            transform=transform,
-                        )
 
-    if j2000 == "s":
+# Capas de un gráfico de constelación.
+# Cada capa es una tupla con el nombre del catálogo, sus estrellas, la selección de las
+# estrellas de la constelación, los textos de las etiquetas, el color de los puntos y el
+# estilo de las etiquetas. Con una época, las estrellas actuales se precesan desde J2000.
+# La selección son los índices de las filas de la constelación, tomadas del índice por
+# constelación de cada catálogo, sin recorrer el catálogo completo.
+# La usa también la impresión incremental del atlas para saber qué filas de cada catálogo
+# intervienen en cada gráfico.
+def capas_constelacion(conf, diferencia, ptolomeo, teon, alfonso, j2000, epoca=None):
+
+    capas = []
 
+    if ptolomeo == "s":
+        nombre = "ptolomeo"
+        estrellas = catalogos.cargar_catalogo(nombre)
+        textos = np.char.add(estrellas["secuencia"].astype(str), np.where(estrellas["cerca"], "C", ""))
+        estilo = {"color": "brown", "weight": "bold"}
+        capas.append(
+            (nombre, estrellas, indice.filas_seleccion(nombre, estrellas, conf, "ptolomeo"), textos, "white", estilo)
+        )
+
+    if teon == "s":
+        nombre = "teon"
+        estrellas = catalogos.cargar_catalogo(nombre)
+        textos = estrellas["secuencia"].astype(str)
+        estilo = {"color": "orange", "weight": "regular"}
+        capas.append(
+            (nombre, estrellas, indice.filas_seleccion(nombre, estrellas, conf, "teon"), textos, "orange", estilo)
+        )
+
+    if alfonso == "s":
+        if ptolomeo == "s" and diferencia == "n":
+            nombre = "alfonso_ptolomeo"
+        else:
+            nombre = "alfonso_j2000"
+        estrellas = catalogos.cargar_catalogo(nombre)
+        textos = estrellas["secuencia"].astype(str)
+        estilo = {"color": "grey", "weight": "regular"}
+        capas.append(
+            (nombre, estrellas, indice.filas_seleccion(nombre, estrellas, conf, "alfonso"), textos, "grey", estilo)
+        )
+
+    if j2000 == "s":
         if alfonso == "s":
-            archivo = open("Constelaciones y estrellas actuales alfonso - python.prn", "r")
+            nombre = "actuales_alfonso"
+        else:
+            nombre = "actuales"
+        if epoca is None:
+            estrellas = catalogos.cargar_catalogo(nombre)
         else:
-            archivo = open("Constelaciones y estrellas actuales.prn", "r")
-
-        j = 0
-
-        while j == 0:
-            linea = archivo.readline()
-            if len(linea) <= 1:
-                archivo.close()
-                j = 1
-            else:
-                if linea[0:2] == Constelacion or (
-                    teon == "s" and Constelacion == "LIB" and linea[0:3].strip() == "SCO"
-                ):
-                    lon = float(linea[28:34].replace(",", "."))
-                    lat = float(linea[40:46].replace(",", "."))
-                    tam = float(linea[52:55].replace(",", "."))
-                    ax.scatter(
-                        lon, lat, color="dodgerblue", s=np.pi * tam**2, alpha=1, transform=transform
-                    )  # dibujar punto en (lon, lat) dados
-                    if anotar_puntos == "s":
-                        if linea[67:68].strip() == "L":
-                            lon_etiq = lon - float(linea[57:60].replace(",", "."))
-                            ha_etiq = "left"
-                        else:
-                            lon_etiq = lon + float(linea[57:60].replace(",", "."))
-                            ha_etiq = "right"
-                        if linea[70:71].strip() == "T":
-                            lat_etiq = lat + float(linea[62:65].replace(",", "."))
-                            va_etiq = "top"
-                        else:
-                            lat_etiq = lat - float(linea[62:65].replace(",", "."))
-                            va_etiq = "bottom"
-                        ax.annotate(
-                            linea[3:5].strip(),
-                            (lon_etiq, lat_etiq),
-                            color="pink",
-                            weight="bold",
-                            ha=ha_etiq,
-                            va=va_etiq,
-                            size=9,
-                            transform=transform,
-                        )
+            estrellas = precesion.catalogo_en_epoca(nombre, epoca)
+        textos = estrellas["secuencia"].astype(str)
+        estilo = {"color": "pink", "weight": "bold"}
+        capas.append(
+            (nombre, estrellas, indice.filas_seleccion(nombre, estrellas, conf, "j2000"), textos, "dodgerblue", estilo)
+        )
 
-    ax.invert_xaxis()
+    return capas
+
+
+# Figura de un gráfico, con el tamaño en pulgadas y el color de fondo indicados.
+# Si no se indica una figura, se crea una nueva con pyplot; si se indica, se borra y se
+# reutiliza, lo que evita crear una figura por gráfico en la impresión por lotes.
+def preparar_figura(figura, figsize, facecolor):
+
+    import matplotlib.pyplot as plt
+
+    if figura is None:
+        return plt.figure(figsize=figsize, facecolor=facecolor)
+
+    figura.clf()
+    figura.set_size_inches(figsize)
+    figura.set_facecolor(facecolor)
+
+    return figura
+
+
+# Posición de las etiquetas en el planisferio AzimuthalEquidistant.
+# Se calculan a la vez las etiquetas de todas las estrellas de un catálogo, con los
+# campos "_planisferio". Las anclas "L" y "C" suman el desplazamiento a la longitud, y "R"
+# lo resta; las anclas "T" y "C" lo suman a la latitud, y "B" lo resta. Se devuelven las
+# coordenadas de cada etiqueta y su alineación horizontal y vertical.
+def etiquetas_planisferio(estrellas):
 
-    plt.show()
+    ancla_lon = estrellas["ancla_lon_planisferio"]
+    ancla_lat = estrellas["ancla_lat_planisferio"]
+
+    lon_etiq = np.where(
+        ancla_lon == "R",
+        estrellas["lon"] - estrellas["desp_lon_planisferio"],
+        estrellas["lon"] + estrellas["desp_lon_planisferio"],
+    )
+    ha_etiq = np.select([ancla_lon == "L", ancla_lon == "C"], ["left", "center"], "right")
+    lat_etiq = np.where(
+        ancla_lat == "B",
+        estrellas["lat"] - estrellas["desp_lat_planisferio"],
+        estrellas["lat"] + estrellas["desp_lat_planisferio"],
+    )
+    va_etiq = np.select([ancla_lat == "T", ancla_lat == "C"], ["top", "center"], "bottom")
+
+    return lon_etiq, lat_etiq, ha_etiq, va_etiq
+
+
+# Posición de las etiquetas en los gráficos PlateCarrée de constelación.
+# El eje de longitudes está invertido, por lo que el ancla "L" resta el desplazamiento a
+# la longitud, y cualquier otra lo suma; el ancla "T" suma el desplazamiento a la latitud,
+# y cualquier otra lo resta.
+def etiquetas_constelacion(estrellas):
+
+    izquierda = estrellas["ancla_lon"] == "L"
+    arriba = estrellas["ancla_lat"] == "T"
+
+    lon_etiq = np.where(izquierda, estrellas["lon"] - estrellas["desp_lon"], estrellas["lon"] + estrellas["desp_lon"])
+    ha_etiq = np.where(izquierda, "left", "right")
+    lat_etiq = np.where(arriba, estrellas["lat"] + estrellas["desp_lat"], estrellas["lat"] - estrellas["desp_lat"])
+    va_etiq = np.where(arriba, "top", "bottom")
+
+    return lon_etiq, lat_etiq, ha_etiq, va_etiq
+
+
+# Dibujo de las estrellas de un catálogo.
+# Todas las estrellas seleccionadas se dibujan en una sola colección de puntos, con el
+# tamaño de cada punto, np.pi * tam**2, característico de su magnitud visual. Los puntos
+# se dibujan en las coordenadas nativas de la proyección del gráfico, proyectadas una
+# sola vez por catálogo y proyección, y no se vuelven a proyectar al dibujar. La colección
+# lleva como identificador el nombre del catálogo, con el que la encuentra la animación.
+def dibujar_puntos(ax, estrellas, color, seleccion=slice(None), nombre=None):
+
+    x, y = proyeccion.coordenadas_nativas(estrellas, "puntos", ax.projection, estrellas["lon"], estrellas["lat"])
+
+    return ax.scatter(
+        x[seleccion],
+        y[seleccion],
+        color=color,
+        s=np.pi * estrellas["tam"][seleccion] ** 2,
+        alpha=1,
+        transform=ax.transData,
+        gid=nombre,
+    )
+
+
+# Dibujo de las estrellas de un catálogo grande, leído por trozos.
+# El catálogo, en el formato de columnas del catálogo indicado, se lee con
+# catalogos.trozos_catalogo, con los filtros indicados: codigos, magnitud_maxima y caja.
+# De cada trozo solo se guardan las coordenadas nativas y el tamaño de los puntos de sus
+# estrellas, y todas se dibujan en una sola colección de puntos.
+def dibujar_externo(
+    ax, catalogo, color="gold", formato="actuales", filas=catalogos.FILAS_TROZO, nombre=None, **filtros
+):
+
+    xs, ys, tamanos = [], [], []
+    for trozo in catalogos.trozos_catalogo(catalogo, formato, filas, **filtros):
+        x, y = proyeccion.proyectar(ax.projection, trozo["lon"], trozo["lat"])
+        xs.append(x)
+        ys.append(y)
+        tamanos.append(np.pi * trozo["tam"] ** 2)
+
+    return ax.scatter(
+        np.concatenate(xs + [[]]),
+        np.concatenate(ys + [[]]),
+        color=color,
+        s=np.concatenate(tamanos + [[]]),
+        alpha=1,
+        transform=ax.transData,
+        gid=nombre,
+    )
+
+
+# Residuos de las estrellas del Almagesto emparejadas con las estrellas actuales, con las
+# actuales precesadas a una época. Se calculan una sola vez por época.
+def residuos_ptolomeo(epoca):
+
+    if epoca not in _residuos:
+        indices, _, lon_j2000, lat_j2000 = ajuste_epoca.parejas_catalogos("ptolomeo", "actuales", epoca)
+        estrellas = catalogos.cargar_catalogo("ptolomeo")
+        lon_actual, lat_actual = precesion.precesar(lon_j2000, lat_j2000, epoca)
+        lon = np.asarray(estrellas["lon"][indices], dtype=np.float64)
+        lat = np.asarray(estrellas["lat"][indices], dtype=np.float64)
+        coseno = np.einsum("ij,ij->i", precesion.vectores(lon_actual, lat_actual), precesion.vectores(lon, lat))
+        _residuos[epoca] = {
+            "codigo": estrellas["codigo"][indices],
+            "lon_actual": lon_actual,
+            "lat_actual": lat_actual,
+            "lon": lon,
+            "lat": lat,
+            "separacion": np.degrees(np.arccos(np.clip(coseno, -1.0, 1.0))),
+        }
+
+    return _residuos[epoca]
+
+
+# Dibujo de los residuos del Almagesto como un campo de flechas.
+# Todas las flechas, de la posición actual precesada a la del Almagesto, de las
+# constelaciones indicadas o de todas, se dibujan con una sola llamada a quiver, en las
+# coordenadas nativas de la proyección. La proyección del gráfico se indica como sistema
+# de las flechas para que cartopy no las vuelva a transformar. Con colorear="s" el color
+# de cada flecha indica la separación en grados; la ampliación multiplica la longitud de
+# las flechas.
+def dibujar_residuos(ax, codigos=None, epoca=None, colorear="n", ampliacion=1.0):
+
+    import cartopy.crs as ccrs
+
+    if epoca is None:
+        epoca = ajuste_epoca.EPOCA_PTOLOMEO
+    residuos = residuos_ptolomeo(float(epoca))
+
+    seleccion = slice(None) if codigos is None else np.isin(residuos["codigo"], codigos)
+    x0, y0 = proyeccion.proyectar(ax.projection, residuos["lon_actual"][seleccion], residuos["lat_actual"][seleccion])
+    x1, y1 = proyeccion.proyectar(ax.projection, residuos["lon"][seleccion], residuos["lat"][seleccion])
+
+    u = x1 - x0
+    if isinstance(ax.projection, ccrs.PlateCarree):
+        u = (u + 180.0) % 360.0 - 180.0
+    argumentos = [x0, y0, u * ampliacion, (y1 - y0) * ampliacion]
+    estilo = {"color": "yellow"}
+    if colorear == "s":
+        argumentos.append(residuos["separacion"][seleccion])
+        estilo = {"cmap": "plasma"}
+
+    return ax.quiver(
+        *argumentos, angles="xy", scale_units="xy", scale=1, width=0.002, transform=ax.projection, **estilo
+    )
+
+
+# Anotación de las etiquetas de un catálogo, con sus coordenadas y alineaciones.
+# Las coordenadas de las etiquetas de la capa indicada se proyectan, como los puntos, una
+# sola vez por catálogo y proyección. Si se indica una lista de pendientes, las etiquetas
+# no se dibujan, sino que se añaden a la lista como un grupo de colocar_etiquetas del
+# módulo etiquetas.py.
+def anotar(
+    ax, estrellas, capa, textos, lon_etiq, lat_etiq, ha_etiq, va_etiq, seleccion=slice(None), pendientes=None, **estilo
+):
+
+    x, y = proyeccion.coordenadas_nativas(estrellas, capa, ax.projection, lon_etiq, lat_etiq)
+
+    if pendientes is not None:
+        x_puntos, y_puntos = proyeccion.coordenadas_nativas(
+            estrellas, "puntos", ax.projection, estrellas["lon"], estrellas["lat"]
+        )
+        pendientes.append(
+            {
+                "x": x_puntos[seleccion],
+                "y": y_puntos[seleccion],
+                "x_etiq": x[seleccion],
+                "y_etiq": y[seleccion],
+                "ha": np.asarray(ha_etiq)[seleccion],
+                "va": np.asarray(va_etiq)[seleccion],
+                "textos": np.asarray(textos)[seleccion],
+                "tam": estrellas["tam"][seleccion],
+                "estilo": estilo,
+            }
+        )
+        return
 
-    return ()
+    for i in np.arange(len(textos))[seleccion]:
+        ax.annotate(textos[i], (x[i], y[i]), ha=ha_etiq[i], va=va_etiq[i], transform=ax.transData, **estilo)
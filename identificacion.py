@@ -0,0 +1,180 @@
+# Licensed under the EUPL
+# Módulo identificacion.py
+
+import numpy as np
+from scipy.spatial import cKDTree
+import ajuste_epoca
+import catalogos
+import precesion
+
+# Identificación cruzada de las estrellas de un catálogo antiguo con las actuales.
+# Las estrellas actuales se precesan desde J2000 a la época del catálogo antiguo y se
+# guardan, como vectores unitarios, en un árbol KD. Cada estrella antigua busca en el
+# árbol sus k candidatas más próximas dentro de un radio, y se elige la de menor
+# puntuación: la separación en grados más el peso de magnitud por la diferencia entre la
+# clase de magnitud antigua y la magnitud visual actual. La búsqueda no compara todas las
+# parejas de estrellas, de modo que sirve para catálogos actuales de decenas de miles de
+# estrellas.
+K_CANDIDATAS = 5
+RADIO = 2.0
+PESO_MAGNITUD = 0.25
+MARGEN_AMBIGUEDAD = 0.25
+
+# Radio de la primera búsqueda, con la que se estima el desplazamiento sistemático en
+# longitud del catálogo antiguo antes de la identificación.
+RADIO_DESPLAZAMIENTO = 5.0
+
+
+# Longitud de la cuerda de un arco en grados, que es la distancia entre vectores unitarios.
+def cuerda(grados):
+
+    return 2.0 * np.sin(np.radians(grados) / 2.0)
+
+
+# Arco en grados de una cuerda entre vectores unitarios.
+def arco(cuerdas):
+
+    return np.degrees(2.0 * np.arcsin(np.clip(np.asarray(cuerdas) / 2.0, 0.0, 1.0)))
+
+
+# Árbol KD de los vectores unitarios de unas longitudes y latitudes.
+def arbol_estrellas(lon, lat):
+
+    return cKDTree(precesion.vectores(lon, lat))
+
+
+# Identificación cruzada de unas estrellas con las de un árbol KD.
+# Se devuelve una tabla de columnas, una fila por estrella buscada: número de candidatas
+# dentro del radio, índice de la elegida, o -1, su separación en grados, su diferencia de
+# magnitud y su puntuación, índice y separación de la segunda candidata, y las marcas
+# "ambigua", si la segunda candidata tiene una puntuación casi igual, y "compartida", si la
+# estrella elegida lo ha sido también por otra estrella buscada.
+def identificar(
+    arbol,
+    lon,
+    lat,
+    magnitud=None,
+    magnitud_ref=None,
+    k=K_CANDIDATAS,
+    radio=RADIO,
+    peso_magnitud=PESO_MAGNITUD,
+    margen=MARGEN_AMBIGUEDAD,
+):
+
+    distancias, indices = arbol.query(precesion.vectores(lon, lat), k=k, distance_upper_bound=cuerda(radio))
+    distancias = distancias.reshape(len(distancias), -1)
+    indices = indices.reshape(len(indices), -1)
+
+    encontradas = np.isfinite(distancias)
+    indices = np.where(encontradas, indices, -1)
+    separaciones = np.where(encontradas, arco(np.where(encontradas, distancias, 0.0)), np.inf)
+
+    diferencias = np.zeros_like(separaciones)
+    if magnitud is not None and magnitud_ref is not None:
+        magnitud_ref = np.append(np.asarray(magnitud_ref, dtype=np.float64), np.nan)
+        diferencias = np.abs(np.asarray(magnitud, dtype=np.float64)[:, np.newaxis] - magnitud_ref[indices])
+        diferencias = np.where(np.isnan(diferencias), 0.0, diferencias)
+    puntuaciones = np.where(encontradas, separaciones + peso_magnitud * diferencias, np.inf)
+
+    orden = np.argsort(puntuaciones, axis=1)
+    filas = np.arange(len(orden))
+    primera = orden[:, 0]
+    segunda = orden[:, 1] if orden.shape[1] > 1 else orden[:, 0]
+
+    indice = indices[filas, primera]
+    puntuacion = puntuaciones[filas, primera]
+    indice_segunda = np.where(orden.shape[1] > 1, indices[filas, segunda], -1)
+    puntuacion_segunda = puntuaciones[filas, segunda] if orden.shape[1] > 1 else np.full(len(filas), np.inf)
+
+    with np.errstate(invalid="ignore"):
+        ambigua = (indice_segunda >= 0) & (puntuacion_segunda - puntuacion < margen)
+
+    elegidas = indice[indice >= 0]
+    repeticiones = np.bincount(elegidas, minlength=arbol.n)
+    compartida = (indice >= 0) & (repeticiones[np.maximum(indice, 0)] > 1)
+
+    return {
+        "candidatas": encontradas.sum(axis=1),
+        "indice": indice,
+        "separacion": np.where(indice >= 0, separaciones[filas, primera], np.nan),
+        "diferencia_magnitud": np.where(indice >= 0, diferencias[filas, primera], np.nan),
+        "puntuacion": np.where(indice >= 0, puntuacion, np.nan),
+        "indice_segunda": indice_segunda,
+        "separacion_segunda": np.where(indice_segunda >= 0, separaciones[filas, segunda], np.nan),
+        "ambigua": ambigua,
+        "compartida": compartida,
+    }
+
+
+# Desplazamiento sistemático en longitud de unas estrellas respecto a las de un árbol KD:
+# mediana de las diferencias de longitud con la estrella más próxima, dentro del radio.
+def desplazamiento_sistematico(arbol, lon, lat, lon_ref, radio=RADIO_DESPLAZAMIENTO):
+
+    distancias, indices = arbol.query(precesion.vectores(lon, lat), k=1, distance_upper_bound=cuerda(radio))
+    encontradas = np.isfinite(distancias)
+    if not encontradas.any():
+        return 0.0
+
+    diferencias = (np.asarray(lon)[encontradas] - lon_ref[indices[encontradas]] + 180.0) % 360.0 - 180.0
+
+    return float(np.median(diferencias))
+
+
+# Identificación cruzada de un catálogo antiguo con un fichero de estrellas actuales,
+# o con las longitudes, latitudes J2000 y magnitudes de otro catálogo actual.
+# Las estrellas actuales se precesan a la época nominal del catálogo antiguo, o a la
+# indicada, y con corregir=True se resta antes el desplazamiento sistemático en longitud
+# del catálogo antiguo. A la tabla de identificar() se añaden el código y la secuencia de
+# las estrellas antiguas y de las elegidas, la marca "misma_constelacion" y el
+# desplazamiento restado.
+def cruzar_catalogo(
+    antiguo="ptolomeo",
+    actual="actuales",
+    epoca=None,
+    corregir=True,
+    k=K_CANDIDATAS,
+    radio=RADIO,
+    peso_magnitud=PESO_MAGNITUD,
+    margen=MARGEN_AMBIGUEDAD,
+    posiciones=None,
+):
+
+    estrellas = catalogos.cargar_catalogo(antiguo)
+    if epoca is None:
+        epoca = ajuste_epoca.EPOCAS_CATALOGOS.get(antiguo, precesion.EPOCA_J2000)
+
+    if posiciones is None:
+        actuales = catalogos.cargar_catalogo(actual)
+        lon_j2000, lat_j2000 = precesion.posiciones_j2000(actual)
+        posiciones = {
+            "lon": lon_j2000,
+            "lat": lat_j2000,
+            "magnitud": actuales["magnitud"],
+            "codigo": actuales["codigo"],
+            "secuencia": actuales["secuencia"],
+        }
+
+    lon_ref, lat_ref = precesion.precesar(posiciones["lon"], posiciones["lat"], epoca)
+    arbol = arbol_estrellas(lon_ref, lat_ref)
+
+    lon = np.asarray(estrellas["lon"], dtype=np.float64)
+    lat = np.asarray(estrellas["lat"], dtype=np.float64)
+    desplazamiento = desplazamiento_sistematico(arbol, lon, lat, lon_ref) if corregir else 0.0
+
+    tabla = identificar(
+        arbol, lon - desplazamiento, lat, estrellas["magnitud"], posiciones["magnitud"], k, radio, peso_magnitud, margen
+    )
+
+    elegida = np.maximum(tabla["indice"], 0)
+    identificada = tabla["indice"] >= 0
+    tabla["codigo"] = estrellas["codigo"]
+    tabla["secuencia"] = estrellas["secuencia"]
+    if "codigo" in posiciones:
+        tabla["codigo_actual"] = np.where(identificada, posiciones["codigo"][elegida], "")
+        tabla["misma_constelacion"] = identificada & (tabla["codigo_actual"] == estrellas["codigo"])
+    if "secuencia" in posiciones:
+        tabla["secuencia_actual"] = np.where(identificada, posiciones["secuencia"][elegida], -1)
+    tabla["desplazamiento"] = desplazamiento
+    tabla["epoca"] = float(epoca)
+
+    return tabla
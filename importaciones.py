@@ -0,0 +1,141 @@
+# Licensed under the EUPL
+# Módulo importaciones.py
+
+import argparse
+import os
+import subprocess
+import sys
+
+# Presupuesto del tiempo de importación de los módulos.
+# Cada módulo se importa en un intérprete nuevo con la opción -X importtime, que da el
+# tiempo acumulado de la importación del módulo y de todo lo que importa, sin el arranque
+# del intérprete, y se toma el menor de varios intentos. Como el tiempo depende de la
+# máquina, el presupuesto de cada módulo se expresa en veces el tiempo de importar NumPy,
+# medido del mismo modo. Los módulos de lectura de los catálogos, precesión, estadística
+# y selección de estrellas solo pueden cargar NumPy: si cargan matplotlib, cartopy o scipy,
+# la comprobación falla aunque estén dentro del presupuesto.
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+INTENTOS = 5
+
+MODULO_REFERENCIA = "numpy"
+MODULOS_PESADOS = ("matplotlib", "cartopy", "scipy")
+
+# Presupuesto de cada módulo, en veces el tiempo de importar NumPy, y si puede cargar los
+# módulos pesados. El tiempo medido varía mucho de una ejecución a otra, porque también
+# varía el de NumPy, y cada presupuesto es una vez y media el peor tiempo medido: hasta
+# 1,5 veces en los módulos de análisis, 6,6 en identificacion.py, 3,9 en etiquetas.py, de
+# 7,6 a 11,4 en los módulos de dibujo y 13,8 en explorador.py. La comprobación estricta es
+# la de los módulos pesados en los módulos de análisis.
+PRESUPUESTOS = {
+    "cache_catalogos": (2.5, False),
+    "catalogos": (2.5, False),
+    "constelaciones": (2.5, False),
+    "precesion": (2.5, False),
+    "ajuste_epoca": (2.5, False),
+    "datacion": (2.5, False),
+    "rotaciones": (2.5, False),
+    "montecarlo": (2.5, False),
+    "detalle": (2.5, False),
+    "indice": (2.5, False),
+    "validacion": (2.5, False),
+    "proyeccion": (2.5, False),
+    "formats": (2.5, False),
+    "identificacion": (10.0, True),
+    "etiquetas": (6.0, True),
+    "atlas": (13.0, True),
+    "animacion": (15.0, True),
+    "exportacion": (12.0, True),
+    "teselas": (17.0, True),
+    "explorador": (21.0, True),
+}
+
+
+# Importación de un módulo en un intérprete nuevo. Se devuelve el tiempo acumulado de su
+# importación, en segundos, y los módulos pesados que quedan cargados.
+def medir_importacion(modulo):
+
+    programa = (
+        "import " + modulo + "\n"
+        "import sys\n"
+        "print(' '.join(nombre for nombre in " + repr(MODULOS_PESADOS) + " if nombre in sys.modules))\n"
+    )
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", programa],
+        cwd=DIRECTORIO,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    segundos = None
+    for linea in resultado.stderr.splitlines():
+        partes = linea.split("|")
+        if len(partes) == 3 and partes[2].rstrip() == " " + modulo:
+            segundos = int(partes[1]) / 1e6
+
+    return segundos, resultado.stdout.split()
+
+
+# Menor tiempo de importación de un módulo en los intentos indicados, y módulos pesados
+# que carga.
+def tiempo_importacion(modulo, intentos=INTENTOS):
+
+    medidas = [medir_importacion(modulo) for _ in range(intentos)]
+
+    return min(segundos for segundos, _ in medidas), medidas[-1][1]
+
+
+# Comprobación del presupuesto de importación de los módulos indicados, o de todos.
+# Se devuelve un diccionario con el tiempo de referencia y, por módulo, el tiempo medido,
+# las veces el tiempo de referencia, el presupuesto, los módulos pesados cargados y si
+# cumple el presupuesto.
+def comprobar_presupuesto(modulos=None, intentos=INTENTOS):
+
+    referencia, _ = tiempo_importacion(MODULO_REFERENCIA, intentos)
+
+    resultados = {}
+    for modulo in modulos or PRESUPUESTOS:
+        presupuesto, pesados_permitidos = PRESUPUESTOS[modulo]
+        segundos, pesados = tiempo_importacion(modulo, intentos)
+        veces = segundos / referencia
+        resultados[modulo] = {
+            "segundos": segundos,
+            "veces": veces,
+            "presupuesto": presupuesto,
+            "pesados": pesados,
+            "cumple": veces <= presupuesto and (pesados_permitidos or not pesados),
+        }
+
+    return {"referencia": referencia, "modulos": resultados}
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Comprobación del presupuesto de importación de los módulos.")
+    parser.add_argument("modulos", nargs="*", help="módulos que se comprueban; por omisión, todos")
+    parser.add_argument("--intentos", type=int, default=INTENTOS)
+    argumentos = parser.parse_args()
+
+    comprobacion = comprobar_presupuesto(argumentos.modulos, argumentos.intentos)
+    print(MODULO_REFERENCIA, round(comprobacion["referencia"] * 1000), "ms")
+
+    fallos = 0
+    for modulo, resultado in comprobacion["modulos"].items():
+        print(
+            modulo.ljust(16),
+            str(round(resultado["segundos"] * 1000)).rjust(5),
+            "ms",
+            format(resultado["veces"], ".2f").rjust(6),
+            "/",
+            format(resultado["presupuesto"], ".2f"),
+            " ".join(resultado["pesados"]),
+            "" if resultado["cumple"] else "FALLO",
+        )
+        fallos = fallos + (not resultado["cumple"])
+
+    if fallos:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
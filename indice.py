@@ -0,0 +1,261 @@
+# Licensed under the EUPL
+# Módulo indice.py
+
+import hashlib
+import json
+import os
+import numpy as np
+import cache_catalogos
+import catalogos
+
+# Índice de las estrellas de los catálogos por constelación y por píxel del cielo.
+# En cada catálogo, las filas se ordenan una sola vez por el código de la constelación, y
+# las de cada código son un intervalo de ese orden; y se ordenan también por píxel del
+# cielo, con el principio de las filas de cada píxel, de modo que las filas de una
+# constelación o de un conjunto de píxeles se obtienen sin recorrer el catálogo. Los
+# píxeles tienen la misma área, como los de HEALPix: el cielo se divide en bandas de
+# latitud con la misma diferencia de seno de la latitud, y cada banda en columnas de la
+# misma longitud. Las consultas por cono y por caja toman las filas de los píxeles que
+# cortan la región y solo en ellas comprueban la posición exacta. El índice se guarda en
+# la copia binaria de cada catálogo, y es válido mientras lo sea la copia. Los píxeles son
+# los de las posiciones de los ficheros, no los de las estrellas precesadas a otra época.
+BANDAS = 64
+COLUMNAS = 128
+PIXELES = BANDAS * COLUMNAS
+
+FICHERO_INDICE = "indice.npz"
+
+# Versión del índice. Se cambia cuando cambia su contenido.
+VERSION_INDICE = 1
+
+_indices = {}
+
+
+# Píxel del cielo de unas longitudes y latitudes en grados.
+def pixel(lon, lat):
+
+    return banda(lat) * COLUMNAS + columna(lon)
+
+
+# Banda de unas latitudes en grados.
+def banda(lat):
+
+    seno = np.sin(np.radians(np.asarray(lat, dtype=np.float64)))
+
+    return np.clip(np.floor((seno + 1.0) / 2.0 * BANDAS), 0, BANDAS - 1).astype(np.int64)
+
+
+# Columna de unas longitudes en grados.
+def columna(lon):
+
+    lon = np.asarray(lon, dtype=np.float64) % 360.0
+
+    return np.clip(np.floor(lon / 360.0 * COLUMNAS), 0, COLUMNAS - 1).astype(np.int64)
+
+
+# Descripción del índice de un catálogo: resumen de la versión, la resolución, la
+# descripción del catálogo y el resumen del contenido de su fichero plano.
+def descripcion_indice(nombre):
+
+    firma = cache_catalogos.leer_firma(catalogos.ruta_catalogo(nombre))
+    descripcion = json.dumps(
+        [VERSION_INDICE, BANDAS, COLUMNAS, catalogos.descripcion_catalogo(nombre), firma and firma.get("resumen")]
+    )
+
+    return hashlib.sha256(descripcion.encode("ascii")).hexdigest()
+
+
+# Construcción del índice de un catálogo: orden de las filas por código, códigos con el
+# principio y el final de sus filas en ese orden, orden de las filas por píxel, y
+# principio de las filas de cada píxel en ese orden.
+def construir_indice(estrellas):
+
+    codigo = np.asarray(estrellas["codigo"])
+    orden_codigo = np.argsort(codigo, kind="stable")
+    codigos, inicios = np.unique(codigo[orden_codigo], return_index=True)
+
+    pixeles = pixel(estrellas["lon"], estrellas["lat"])
+    orden_pixel = np.argsort(pixeles, kind="stable")
+
+    return {
+        "orden_codigo": orden_codigo,
+        "codigos": codigos,
+        "inicio_codigo": np.append(inicios, len(codigo)),
+        "orden_pixel": orden_pixel,
+        "inicio_pixel": np.searchsorted(pixeles[orden_pixel], np.arange(PIXELES + 1)),
+    }
+
+
+# Lectura del índice guardado de un catálogo, o None si no existe o no es válido.
+def leer_indice(nombre, descripcion):
+
+    ruta = os.path.join(cache_catalogos.directorio_cache(catalogos.ruta_catalogo(nombre)), FICHERO_INDICE)
+    try:
+        with np.load(ruta) as datos:
+            if str(datos["descripcion"]) != descripcion:
+                return None
+            return {clave: datos[clave] for clave in datos.files if clave != "descripcion"}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+# Escritura del índice de un catálogo en su copia binaria, con un fichero temporal. Si la
+# copia binaria no existe o no admite escritura, no se guarda.
+def escribir_indice(nombre, descripcion, indice):
+
+    directorio = cache_catalogos.directorio_cache(catalogos.ruta_catalogo(nombre))
+    temporal = os.path.join(directorio, FICHERO_INDICE + ".%d.tmp" % os.getpid())
+    try:
+        with open(temporal, "wb") as archivo:
+            np.savez(archivo, descripcion=descripcion, **indice)
+        os.replace(temporal, os.path.join(directorio, FICHERO_INDICE))
+    except OSError:
+        return False
+
+    return True
+
+
+# Índice de un catálogo, leído o construido una sola vez por proceso. Si no hay índice
+# guardado válido, se construye y se guarda.
+def indice_catalogo(nombre):
+
+    if nombre not in _indices:
+        estrellas = catalogos.cargar_catalogo(nombre)
+        descripcion = descripcion_indice(nombre)
+        indice = leer_indice(nombre, descripcion)
+        if indice is None:
+            indice = construir_indice(estrellas)
+            escribir_indice(nombre, descripcion, indice)
+        _indices[nombre] = indice
+
+    return _indices[nombre]
+
+
+# Preparación de los índices de los catálogos indicados, o de todos.
+def indexar_catalogos(nombres=None):
+
+    for nombre in nombres or catalogos.CATALOGOS:
+        _indices.pop(nombre, None)
+        indice_catalogo(nombre)
+
+
+# Filas de las constelaciones indicadas de un catálogo, en el orden del catálogo. Se
+# admite un solo código o una lista de códigos.
+def filas_constelacion(nombre, codigos):
+
+    if isinstance(codigos, str):
+        codigos = [codigos]
+    indice = indice_catalogo(nombre)
+    posiciones = np.searchsorted(indice["codigos"], codigos)
+
+    filas = []
+    for codigo, posicion in zip(codigos, posiciones):
+        if posicion < len(indice["codigos"]) and indice["codigos"][posicion] == codigo:
+            filas.append(
+                indice["orden_codigo"][indice["inicio_codigo"][posicion] : indice["inicio_codigo"][posicion + 1]]
+            )
+
+    return np.sort(np.concatenate(filas + [np.zeros(0, dtype=np.int64)]))
+
+
+# Filas de un catálogo que se dibujan en el gráfico de una constelación, como las de
+# constelaciones.seleccionar, pero solo con las filas de los códigos de la configuración.
+def filas_seleccion(nombre, estrellas, conf, catalogo):
+
+    filas = filas_constelacion(nombre, conf["codigos"] + conf["grupos"].get(catalogo, []))
+    if conf["cerca"] is not None and "cerca" in estrellas:
+        filas = filas[estrellas["cerca"][filas] == conf["cerca"]]
+
+    return filas
+
+
+# Filas de un catálogo en los píxeles indicados, sin ordenar.
+def filas_pixeles(nombre, pixeles):
+
+    indice = indice_catalogo(nombre)
+    inicios = indice["inicio_pixel"][pixeles]
+    cuentas = indice["inicio_pixel"][np.asarray(pixeles) + 1] - inicios
+    desplazamientos = np.repeat(inicios - np.cumsum(cuentas) + cuentas, cuentas)
+
+    return indice["orden_pixel"][desplazamientos + np.arange(cuentas.sum())]
+
+
+# Píxeles que cortan una caja de longitudes y latitudes. Si lon_min es mayor que lon_max,
+# la caja cruza el meridiano origen.
+def pixeles_caja(lon_min, lon_max, lat_min, lat_max):
+
+    bandas = np.arange(banda(lat_min), banda(lat_max) + 1)
+    if lon_max - lon_min >= 360.0:
+        columnas = np.arange(COLUMNAS)
+    else:
+        primera, ultima = int(columna(lon_min)), int(columna(lon_max))
+        if lon_min % 360.0 > lon_max % 360.0:
+            ultima = ultima + COLUMNAS
+        columnas = np.unique(np.arange(primera, ultima + 1) % COLUMNAS)
+
+    return (bandas[:, np.newaxis] * COLUMNAS + columnas[np.newaxis, :]).ravel()
+
+
+# Filas de un catálogo dentro de una caja de longitudes y latitudes, en el orden del
+# catálogo.
+def filas_caja(nombre, lon_min, lon_max, lat_min, lat_max):
+
+    estrellas = catalogos.cargar_catalogo(nombre)
+    filas = filas_pixeles(nombre, pixeles_caja(lon_min, lon_max, lat_min, lat_max))
+
+    lon = np.asarray(estrellas["lon"][filas], dtype=np.float64)
+    lat = np.asarray(estrellas["lat"][filas], dtype=np.float64)
+    if lon_max - lon_min >= 360.0:
+        en_lon = np.ones(len(filas), dtype=bool)
+    elif lon_min % 360.0 <= lon_max % 360.0:
+        en_lon = (lon % 360.0 >= lon_min % 360.0) & (lon % 360.0 <= lon_max % 360.0)
+    else:
+        en_lon = (lon % 360.0 >= lon_min % 360.0) | (lon % 360.0 <= lon_max % 360.0)
+
+    return np.sort(filas[en_lon & (lat >= lat_min) & (lat <= lat_max)])
+
+
+# Filas de un catálogo a menos del radio indicado, en grados, de un punto, en el orden
+# del catálogo. Se toman los píxeles de la caja que contiene el cono y se comprueba la
+# separación exacta.
+def filas_cono(nombre, lon, lat, radio):
+
+    lat_min, lat_max = max(lat - radio, -90.0), min(lat + radio, 90.0)
+    seno = np.sin(np.radians(radio))
+    coseno_lat = np.cos(np.radians(lat))
+    if lat_max >= 90.0 or lat_min <= -90.0 or seno >= coseno_lat:
+        pixeles = pixeles_caja(0.0, 360.0, lat_min, lat_max)
+    else:
+        ancho = np.degrees(np.arcsin(seno / coseno_lat))
+        pixeles = pixeles_caja(lon - ancho, lon + ancho, lat_min, lat_max)
+
+    estrellas = catalogos.cargar_catalogo(nombre)
+    filas = filas_pixeles(nombre, pixeles)
+    lon_filas = np.radians(np.asarray(estrellas["lon"][filas], dtype=np.float64))
+    lat_filas = np.radians(np.asarray(estrellas["lat"][filas], dtype=np.float64))
+    coseno = np.sin(np.radians(lat)) * np.sin(lat_filas) + coseno_lat * np.cos(lat_filas) * np.cos(
+        lon_filas - np.radians(lon)
+    )
+
+    return np.sort(filas[coseno >= np.cos(np.radians(radio))])
+
+
+# Consulta de varios catálogos, o de todos: diccionario con las filas de cada catálogo
+# dentro de un cono, (lon, lat, radio), de una caja, (lon_min, lon_max, lat_min, lat_max),
+# o de las constelaciones indicadas, un código o una lista de códigos. Se indica uno solo
+# de los tres filtros.
+def consultar(nombres=None, cono=None, caja=None, codigos=None):
+
+    if sum(filtro is not None for filtro in (cono, caja, codigos)) != 1:
+        raise ValueError("indique uno solo de los filtros cono, caja o codigos")
+
+    resultado = {}
+    for nombre in nombres or catalogos.CATALOGOS:
+        if cono is not None:
+            resultado[nombre] = filas_cono(nombre, *cono)
+        elif caja is not None:
+            resultado[nombre] = filas_caja(nombre, *caja)
+        else:
+            resultado[nombre] = filas_constelacion(nombre, codigos)
+
+    return resultado
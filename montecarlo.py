@@ -0,0 +1,158 @@
+# Licensed under the EUPL
+# Módulo montecarlo.py
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import numpy as np
+import ajuste_epoca
+
+# Incertidumbre del desplazamiento en longitud por Monte Carlo y remuestreo.
+# En cada sorteo se remuestrean las estrellas emparejadas, con reemplazamiento, y se
+# perturban sus longitudes con una distribución uniforme dentro del paso de cuantificación
+# del catálogo, un sexto de grado (10') en el Almagesto. Se calcula de nuevo el
+# desplazamiento medio, antiguo menos actual precesado, en la época del catálogo, y los
+# años que equivalen a ese desplazamiento con la precesión de la época. Los sorteos se
+# hacen por lotes, como matrices de sorteos por estrellas, y los lotes se reparten en un
+# conjunto de procesos. Cada lote tiene su propia semilla, derivada de la semilla inicial,
+# de modo que el resultado no depende del número de procesos.
+PASO_LONGITUD = 1.0 / 6.0
+SORTEOS = 100000
+LOTE = 2000
+NIVEL = 0.95
+
+_preparado = None
+
+
+# Preparación del Monte Carlo: parejas de estrellas y grupos del ajuste de época, con una
+# rejilla de dos épocas, un año antes y después de la del catálogo, de la que se obtiene
+# la precesión anual en longitud de cada estrella.
+def preparar_montecarlo(antiguo="ptolomeo", actual="actuales", epoca_catalogo=ajuste_epoca.EPOCA_PTOLOMEO):
+
+    preparado = ajuste_epoca.preparar_ajuste(
+        antiguo, actual, epoca_catalogo, [epoca_catalogo - 1.0, epoca_catalogo + 1.0]
+    )
+    lon_rejilla = preparado["lon_rejilla"]
+    preparado["tasa"] = ajuste_epoca.diferencia_longitud(lon_rejilla[1], lon_rejilla[0]) / 2.0
+
+    return preparado
+
+
+# Preparación de cada proceso del Monte Carlo.
+def iniciar_proceso(antiguo, actual, epoca_catalogo):
+
+    global _preparado
+
+    _preparado = preparar_montecarlo(antiguo, actual, epoca_catalogo)
+
+
+# Un lote de sorteos.
+# El remuestreo se representa con los pesos de cada estrella en cada sorteo, el número de
+# veces que sale, de modo que las medias por grupo de todos los sorteos se calculan con
+# un producto de matrices. Se devuelven dos matrices de sorteos por grupos, con los
+# desplazamientos en grados y los años equivalentes; un grupo sin estrellas en un sorteo
+# tiene NaN.
+def sortear_lote(semilla, sorteos, paso=PASO_LONGITUD, preparado=None):
+
+    if preparado is None:
+        preparado = _preparado
+
+    generador = np.random.default_rng(semilla)
+    estrellas = len(preparado["lon"])
+    pesos = generador.multinomial(estrellas, np.full(estrellas, 1.0 / estrellas), size=sorteos).astype(np.float64)
+    lon = preparado["lon"] + generador.uniform(-paso / 2.0, paso / 2.0, size=(sorteos, estrellas))
+
+    diferencias = ajuste_epoca.diferencia_longitud(lon, preparado["lon_catalogo"])
+    pertenencia = preparado["pertenencia"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cuenta = pesos @ pertenencia
+        desplazamientos = ((pesos * diferencias) @ pertenencia) / cuenta
+        tasas = ((pesos * preparado["tasa"]) @ pertenencia) / cuenta
+
+    return desplazamientos, desplazamientos / tasas
+
+
+# Resumen de los sorteos de un grupo: media, desviación típica e intervalo de confianza
+# con el nivel indicado, a partir de los percentiles.
+def resumen_sorteos(valores, nivel=NIVEL):
+
+    valores = valores[np.isfinite(valores)]
+    if len(valores) == 0:
+        return {"media": None, "desviacion": None, "intervalo": None}
+
+    colas = (1.0 - nivel) / 2.0 * 100.0
+    inferior, superior = np.percentile(valores, [colas, 100.0 - colas])
+
+    return {
+        "media": float(valores.mean()),
+        "desviacion": float(valores.std()),
+        "intervalo": [float(inferior), float(superior)],
+    }
+
+
+# Monte Carlo del desplazamiento en longitud de un catálogo antiguo.
+# Se devuelve un informe con la misma forma que el del ajuste de época, con una entrada
+# para todas las estrellas, otra por constelación y otra por región. Cada entrada tiene el
+# número de estrellas, el desplazamiento y los años del catálogo sin perturbar, y el
+# resumen de los sorteos de ambos. Con devolver_sorteos=True se añaden las matrices de
+# sorteos por grupos.
+def montecarlo(
+    antiguo="ptolomeo",
+    actual="actuales",
+    epoca_catalogo=ajuste_epoca.EPOCA_PTOLOMEO,
+    sorteos=SORTEOS,
+    lote=LOTE,
+    procesos=None,
+    semilla=0,
+    paso=PASO_LONGITUD,
+    nivel=NIVEL,
+    devolver_sorteos=False,
+):
+
+    tamanos = [lote] * (sorteos // lote) + ([sorteos % lote] if sorteos % lote else [])
+    semillas = np.random.SeedSequence(semilla).spawn(len(tamanos))
+
+    with ProcessPoolExecutor(
+        max_workers=procesos, initializer=iniciar_proceso, initargs=(antiguo, actual, epoca_catalogo)
+    ) as ejecutor:
+        resultados = list(ejecutor.map(sortear_lote, semillas, tamanos, repeat(paso)))
+
+    desplazamientos = np.concatenate([resultado[0] for resultado in resultados])
+    anos = np.concatenate([resultado[1] for resultado in resultados])
+
+    preparado = preparar_montecarlo(antiguo, actual, epoca_catalogo)
+    pertenencia = preparado["pertenencia"]
+    estrellas = pertenencia.sum(axis=0)
+    desplazamiento = (
+        ajuste_epoca.diferencia_longitud(preparado["lon"], preparado["lon_catalogo"]) @ pertenencia
+    ) / estrellas
+    tasa = (preparado["tasa"] @ pertenencia) / estrellas
+
+    informe = {
+        "sorteos": sorteos,
+        "semilla": semilla,
+        "nivel": nivel,
+        "procesos": procesos or os.cpu_count(),
+        "global": None,
+        "constelaciones": {},
+        "regiones": {},
+    }
+    for indice, (tipo, nombre) in enumerate(preparado["grupos"]):
+        entrada = {
+            "estrellas": int(estrellas[indice]),
+            "desplazamiento": float(desplazamiento[indice]),
+            "anos": float(desplazamiento[indice] / tasa[indice]),
+            "sorteos_desplazamiento": resumen_sorteos(desplazamientos[:, indice], nivel),
+            "sorteos_anos": resumen_sorteos(anos[:, indice], nivel),
+        }
+        if tipo == "global":
+            informe["global"] = entrada
+        else:
+            informe[tipo][nombre] = entrada
+
+    if devolver_sorteos:
+        informe["grupos"] = preparado["grupos"]
+        informe["desplazamientos"] = desplazamientos
+        informe["anos_sorteos"] = anos
+
+    return informe
@@ -0,0 +1,187 @@
+# Licensed under the EUPL
+# Módulo precesion.py
+
+import numpy as np
+import catalogos
+
+# Precesión general a largo plazo, con el movimiento de la eclíptica.
+# Se usa el modelo de Vondrák, Capitaine y Wallace (2011, A&A 534, A22), válido para
+# ±200 000 años alrededor de J2000, que da los polos de la eclíptica y del ecuador medios
+# de la fecha en el sistema ecuatorial medio J2000. Las épocas son años julianos, con la
+# numeración astronómica de los años: el año 0 es el 1 a.C., y el -999 es el 1000 a.C.
+SEGUNDOS_RADIAN = np.pi / (180.0 * 3600.0)
+OBLICUIDAD_J2000 = 84381.406 * SEGUNDOS_RADIAN
+
+# Polo de la eclíptica: polinomios de P_A y Q_A y términos periódicos, con el periodo en
+# siglos y los coeficientes del coseno y del seno de P_A y de Q_A, en segundos de arco.
+POLINOMIOS_ECLIPTICA = np.array(
+    [
+        [5851.607687, -0.1189000, -0.00028913, 0.000000101],
+        [-1600.886300, 1.1689818, -0.00000020, -0.000000437],
+    ]
+)
+PERIODICOS_ECLIPTICA = np.array(
+    [
+        [708.15, -5486.751211, -684.661560, 667.666730, -5523.863691],
+        [2309.00, -17.127623, 2446.283880, -2354.886252, -549.747450],
+        [1620.00, -617.517403, 399.671049, -428.152441, -310.998056],
+        [492.20, 413.442940, -356.652376, 376.202861, 421.535876],
+        [1183.00, 78.614193, -186.387003, 184.778874, -36.776172],
+        [622.00, -180.732815, -316.800070, 335.321713, -145.278396],
+        [882.00, -87.676083, 198.296701, -185.138669, -34.744450],
+        [547.00, 46.140315, 101.135679, -120.972830, 22.885731],
+    ]
+)
+
+# Polo del ecuador: polinomios de X y de Y y términos periódicos, con el periodo en siglos
+# y los coeficientes del coseno de X y de Y y del seno de X y de Y, en segundos de arco.
+POLINOMIOS_ECUADOR = np.array(
+    [
+        [5453.282155, 0.4252841, -0.00037173, -0.000000152],
+        [-73750.930350, -0.7675452, -0.00018725, 0.000000231],
+    ]
+)
+PERIODICOS_ECUADOR = np.array(
+    [
+        [256.75, -819.940624, 75004.344875, 81491.287984, 1558.515853],
+        [708.15, -8444.676815, 624.033993, 787.163481, 7774.939698],
+        [274.20, 2600.009459, 1251.136893, 1251.296102, -2219.534038],
+        [241.45, 2755.175630, -1102.212834, -1257.950837, -2523.969396],
+        [2309.00, -167.659835, -2660.664980, -2966.799730, 247.850422],
+        [492.20, 871.855056, 699.291817, 639.744522, -846.485643],
+        [396.10, 44.769698, 153.167220, 131.600209, -1393.124055],
+        [288.90, -512.313065, -950.865637, -445.040117, 368.526116],
+        [231.10, -819.415595, 499.754645, 584.522874, 749.045012],
+        [1610.00, -538.071099, -145.188210, -89.756563, 444.704518],
+        [620.00, -189.793622, 558.116553, 524.429630, 235.934465],
+        [157.87, -402.922932, -23.923029, -13.549067, 374.049623],
+        [220.30, 179.516345, -165.405086, -210.157124, -171.330180],
+        [1200.00, -9.814756, 9.344131, -44.919798, -22.899655],
+    ]
+)
+
+# Giro de las longitudes de los ficheros de estrellas actuales.
+# Las longitudes de estos ficheros son las de J2000 giradas hacia atrás la precesión
+# indicada, en grados: 26,01° hasta el año 138, primero de Antonino Pío, y 10,11° hasta
+# la época de las tablas alfonsíes. Las latitudes son las de J2000.
+GIROS_J2000 = {"actuales": 26.01, "actuales_alfonso": 10.11}
+
+EPOCA_J2000 = 2000.0
+
+_catalogos_precesados = {}
+
+
+# Suma de los polinomios y de los términos periódicos de un polo, en radianes.
+# Las épocas pueden ser un número o una matriz; se devuelven dos matrices con su forma.
+def serie_polo(epoca, polinomios, periodicos):
+
+    t = (np.asarray(epoca, dtype=np.float64) - EPOCA_J2000) / 100.0
+    angulo = 2.0 * np.pi * t[..., np.newaxis] / periodicos[:, 0]
+    coseno = np.cos(angulo)
+    seno = np.sin(angulo)
+
+    potencias = t[..., np.newaxis] ** np.arange(polinomios.shape[1])
+    a = coseno @ periodicos[:, 1] + seno @ periodicos[:, 3] + potencias @ polinomios[0]
+    b = coseno @ periodicos[:, 2] + seno @ periodicos[:, 4] + potencias @ polinomios[1]
+
+    return a * SEGUNDOS_RADIAN, b * SEGUNDOS_RADIAN
+
+
+# Polo de la eclíptica media de la fecha, como vector unitario en el sistema ecuatorial
+# medio J2000. Se devuelve una matriz con la forma de las épocas y un eje final de tres.
+def polo_ecliptica(epoca):
+
+    p, q = serie_polo(epoca, POLINOMIOS_ECLIPTICA, PERIODICOS_ECLIPTICA)
+    w = np.sqrt(np.maximum(1.0 - p * p - q * q, 0.0))
+    s = np.sin(OBLICUIDAD_J2000)
+    c = np.cos(OBLICUIDAD_J2000)
+
+    return np.stack([p, -q * c - w * s, -q * s + w * c], axis=-1)
+
+
+# Polo del ecuador medio de la fecha, como vector unitario en el sistema ecuatorial medio
+# J2000.
+def polo_ecuador(epoca):
+
+    x, y = serie_polo(epoca, POLINOMIOS_ECUADOR, PERIODICOS_ECUADOR)
+    w = np.sqrt(np.maximum(1.0 - x * x - y * y, 0.0))
+
+    return np.stack([x, y, w], axis=-1)
+
+
+# Ejes del sistema eclíptico medio de la fecha en el sistema ecuatorial medio J2000.
+# Las filas de cada matriz son el equinoccio medio de la fecha, el punto de longitud 90° y
+# el polo de la eclíptica de la fecha.
+def ejes_ecliptica(epoca):
+
+    polo = polo_ecliptica(epoca)
+    equinoccio = np.cross(polo_ecuador(epoca), polo)
+    equinoccio = equinoccio / np.linalg.norm(equinoccio, axis=-1, keepdims=True)
+
+    return np.stack([equinoccio, np.cross(polo, equinoccio), polo], axis=-2)
+
+
+# Matriz de precesión entre las eclípticas y equinoccios medios de dos épocas.
+# Convierte los vectores eclípticos de la época de origen en los de la época indicada.
+# Con una matriz de épocas se devuelve una matriz de 3x3 por época.
+def matriz_precesion(epoca, epoca_origen=EPOCA_J2000):
+
+    return ejes_ecliptica(epoca) @ np.swapaxes(ejes_ecliptica(epoca_origen), -1, -2)
+
+
+# Vectores unitarios de longitudes y latitudes en grados, con un eje final de tres.
+def vectores(lon, lat):
+
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+# Longitudes, entre 0° y 360°, y latitudes en grados de unos vectores.
+def coordenadas(vectores):
+
+    lon = np.degrees(np.arctan2(vectores[..., 1], vectores[..., 0])) % 360.0
+    lat = np.degrees(np.arctan2(vectores[..., 2], np.hypot(vectores[..., 0], vectores[..., 1])))
+
+    return lon, lat
+
+
+# Precesión de longitudes y latitudes eclípticas de la época de origen, por omisión J2000,
+# a la época indicada, con una sola operación vectorial. Si la época es una matriz, el
+# resultado tiene la forma de las épocas seguida de la forma de las estrellas, de modo que
+# se puede precesar todo un catálogo a toda una rejilla de épocas de una vez.
+def precesar(lon, lat, epoca, epoca_origen=EPOCA_J2000):
+
+    matriz = matriz_precesion(epoca, epoca_origen)
+    v = vectores(lon, lat)
+    forma = np.shape(v)[:-1]
+    precesados = np.einsum("...ij,nj->...ni", matriz, v.reshape(-1, 3))
+
+    return coordenadas(precesados.reshape(np.shape(matriz)[:-2] + forma + (3,)))
+
+
+# Longitudes y latitudes J2000 de un fichero de estrellas actuales, deshaciendo el giro
+# con que se guardaron.
+def posiciones_j2000(nombre):
+
+    estrellas = catalogos.cargar_catalogo(nombre)
+    lon = (np.asarray(estrellas["lon"], dtype=np.float64) + GIROS_J2000[nombre]) % 360.0
+
+    return lon, np.asarray(estrellas["lat"], dtype=np.float64)
+
+
+# Catálogo de estrellas actuales precesado a una época.
+# Se devuelve una copia de las columnas del catálogo con las longitudes y latitudes J2000
+# precesadas a la época indicada, que se guarda por catálogo y época para que los
+# gráficos siguientes usen las mismas columnas, y con ellas las mismas coordenadas
+# proyectadas.
+def catalogo_en_epoca(nombre, epoca):
+
+    clave = (nombre, float(epoca))
+    if clave not in _catalogos_precesados:
+        estrellas = dict(catalogos.cargar_catalogo(nombre))
+        estrellas["lon"], estrellas["lat"] = precesar(*posiciones_j2000(nombre), float(epoca))
+        _catalogos_precesados[clave] = estrellas
+
+    return _catalogos_precesados[clave]
@@ -0,0 +1,55 @@
+# Licensed under the EUPL
+# Módulo proyeccion.py
+
+import numpy as np
+
+_coordenadas_nativas = {}
+_eclipticas = None
+
+
+# Sistema de las coordenadas de los catálogos: longitudes y latitudes eclípticas. Se crea
+# en la primera proyección, para que importar este módulo no cargue cartopy.
+def eclipticas():
+
+    global _eclipticas
+
+    if _eclipticas is None:
+        import cartopy.crs as ccrs
+
+        _eclipticas = ccrs.PlateCarree()
+
+    return _eclipticas
+
+
+# Proyección de longitudes y latitudes eclípticas a las coordenadas nativas de una
+# proyección de cartopy, con una sola llamada vectorial a transform_points.
+def proyectar(projection, lon, lat):
+
+    puntos = projection.transform_points(
+        eclipticas(), np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64)
+    )
+
+    return puntos[:, 0], puntos[:, 1]
+
+
+# Coordenadas nativas de una capa de un catálogo en una proyección.
+# La capa, por ejemplo "puntos" o "etiquetas_planisferio", distingue las coordenadas que
+# se proyectan de un mismo catálogo. El resultado se guarda por catálogo, capa y
+# proyección, de modo que los gráficos siguientes con la misma proyección no vuelven a
+# proyectar; si el catálogo se vuelve a cargar, se proyecta de nuevo.
+def coordenadas_nativas(estrellas, capa, projection, lon, lat):
+
+    clave = (id(estrellas), capa, projection)
+    guardado = _coordenadas_nativas.get(clave)
+    if guardado is None or guardado[0] is not estrellas:
+        x, y = proyectar(projection, lon, lat)
+        guardado = (estrellas, x, y)
+        _coordenadas_nativas[clave] = guardado
+
+    return guardado[1], guardado[2]
+
+
+# Borrado de las coordenadas nativas guardadas.
+def olvidar_proyecciones():
+
+    _coordenadas_nativas.clear()
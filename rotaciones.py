@@ -0,0 +1,148 @@
+# Licensed under the EUPL
+# Módulo rotaciones.py
+
+import numpy as np
+import ajuste_epoca
+import catalogos
+import precesion
+
+# Ajuste de rotaciones rígidas entre dos catálogos, por constelación.
+# Para cada grupo de estrellas emparejadas, todas, cada constelación y cada región, se
+# busca la rotación que mejor lleva los vectores unitarios de las estrellas actuales,
+# precesadas a la época del catálogo, a los de las estrellas antiguas, por el método de
+# Kabsch: descomposición en valores singulares de la matriz de covarianza de los dos
+# conjuntos de vectores. Las matrices de covarianza de todos los grupos se forman con una
+# sola suma de Einstein sobre la matriz de pertenencia a los grupos, y se descomponen
+# todas a la vez con una sola llamada a np.linalg.svd. Una precesión mal aplicada se ve
+# como un giro alrededor del polo de la eclíptica; un catálogo copiado o girado en una
+# región, como una rotación distinta en sus constelaciones.
+# Con menos estrellas que el mínimo indicado, la rotación no está determinada.
+ESTRELLAS_MINIMAS = 2
+
+
+# Rotaciones de Kabsch de todos los grupos a la vez.
+# Los vectores origen y destino son matrices de estrellas por tres, y la pertenencia una
+# matriz de estrellas por grupos, con los pesos de cada estrella en cada grupo. Se
+# devuelve una matriz de grupos por 3x3, con las rotaciones que llevan el origen al
+# destino.
+def kabsch(origen, destino, pertenencia):
+
+    covarianzas = np.einsum("ig,ij,ik->gjk", pertenencia, origen, destino)
+    u, _, vt = np.linalg.svd(covarianzas)
+    v = np.swapaxes(vt, -1, -2)
+    ut = np.swapaxes(u, -1, -2)
+
+    signo = np.sign(np.linalg.det(v @ ut))
+    correccion = np.zeros_like(covarianzas)
+    correccion[:, 0, 0] = 1.0
+    correccion[:, 1, 1] = 1.0
+    correccion[:, 2, 2] = np.where(signo == 0, 1.0, signo)
+
+    return v @ correccion @ ut
+
+
+# Ángulo en grados y eje unitario de unas matrices de rotación. El eje se da también en
+# longitud y latitud eclípticas. Con un ángulo nulo, el eje no está determinado y es NaN.
+def parametros_rotacion(rotaciones):
+
+    traza = np.trace(rotaciones, axis1=-2, axis2=-1)
+    angulo = np.arccos(np.clip((traza - 1.0) / 2.0, -1.0, 1.0))
+
+    eje = np.stack(
+        [
+            rotaciones[..., 2, 1] - rotaciones[..., 1, 2],
+            rotaciones[..., 0, 2] - rotaciones[..., 2, 0],
+            rotaciones[..., 1, 0] - rotaciones[..., 0, 1],
+        ],
+        axis=-1,
+    )
+    norma = np.linalg.norm(eje, axis=-1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        eje = np.where(norma > 0, eje / norma, np.nan)
+
+    eje_lon, eje_lat = precesion.coordenadas(eje)
+
+    return np.degrees(angulo), eje, eje_lon, eje_lat
+
+
+# Separación en grados entre los vectores de cada estrella rotados por la rotación de cada
+# grupo y los vectores destino: una matriz de grupos por estrellas.
+def separaciones_rotadas(rotaciones, origen, destino):
+
+    rotados = np.einsum("gjk,ik->gij", rotaciones, origen)
+    coseno = np.einsum("gij,ij->gi", rotados, destino)
+
+    return np.degrees(np.arccos(np.clip(coseno, -1.0, 1.0)))
+
+
+# Ajuste de las rotaciones de todos los grupos.
+# Se devuelven, por grupo, la rotación, su ángulo y su eje, el error cuadrático medio de
+# las separaciones antes y después de la rotación, en grados, y el número de estrellas.
+def ajustar_rotaciones(origen, destino, pertenencia, minimas=ESTRELLAS_MINIMAS):
+
+    estrellas = pertenencia.sum(axis=0)
+    rotaciones = kabsch(origen, destino, pertenencia)
+    angulo, eje, eje_lon, eje_lat = parametros_rotacion(rotaciones)
+
+    inicial = np.degrees(np.arccos(np.clip(np.einsum("ij,ij->i", origen, destino), -1.0, 1.0)))
+    separaciones = separaciones_rotadas(rotaciones, origen, destino)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rms_inicial = np.sqrt((inicial * inicial) @ pertenencia / estrellas)
+        rms = np.sqrt(np.einsum("gi,ig->g", separaciones * separaciones, pertenencia) / estrellas)
+
+    indeterminada = estrellas < minimas
+    angulo[indeterminada] = np.nan
+    eje[indeterminada] = np.nan
+    eje_lon[indeterminada] = np.nan
+    eje_lat[indeterminada] = np.nan
+    rms[indeterminada] = np.nan
+
+    return {
+        "rotacion": rotaciones,
+        "angulo": angulo,
+        "eje": eje,
+        "eje_lon": eje_lon,
+        "eje_lat": eje_lat,
+        "rms_inicial": rms_inicial,
+        "rms": rms,
+        "estrellas": estrellas,
+    }
+
+
+# Rotaciones entre un catálogo antiguo y un fichero de estrellas actuales, para todas las
+# estrellas emparejadas, cada constelación y cada región. Las estrellas actuales se
+# precesan a la época nominal del catálogo antiguo, o a la indicada. Se devuelve un
+# informe con la forma del ajuste de época: ángulo en grados, eje en longitud y latitud,
+# y errores cuadráticos medios antes y después de la rotación.
+def rotaciones_constelaciones(antiguo="ptolomeo", actual="actuales", epoca=None, minimas=ESTRELLAS_MINIMAS):
+
+    if epoca is None:
+        epoca = ajuste_epoca.EPOCAS_CATALOGOS.get(antiguo, ajuste_epoca.EPOCA_PTOLOMEO)
+
+    indices_antiguos, _, lon_j2000, lat_j2000 = ajuste_epoca.parejas_catalogos(antiguo, actual, epoca)
+    estrellas = catalogos.cargar_catalogo(antiguo)
+
+    origen = precesion.vectores(*precesion.precesar(lon_j2000, lat_j2000, epoca))
+    destino = precesion.vectores(estrellas["lon"][indices_antiguos], estrellas["lat"][indices_antiguos])
+    pertenencia, grupos = ajuste_epoca.matriz_grupos(
+        estrellas["codigo"][indices_antiguos], ajuste_epoca.regiones_estrellas(estrellas)[indices_antiguos]
+    )
+
+    resultado = ajustar_rotaciones(origen, destino, pertenencia, minimas)
+
+    informe = {"epoca": float(epoca), "global": None, "constelaciones": {}, "regiones": {}}
+    for indice, (tipo, nombre) in enumerate(grupos):
+        entrada = {
+            "estrellas": int(resultado["estrellas"][indice]),
+            "angulo": float(resultado["angulo"][indice]),
+            "eje_lon": float(resultado["eje_lon"][indice]),
+            "eje_lat": float(resultado["eje_lat"][indice]),
+            "rms_inicial": float(resultado["rms_inicial"][indice]),
+            "rms": float(resultado["rms"][indice]),
+        }
+        if tipo == "global":
+            informe["global"] = entrada
+        else:
+            informe[tipo][nombre] = entrada
+
+    return informe
@@ -0,0 +1,373 @@
+# Licensed under the EUPL
+# Módulo teselas.py
+
+import argparse
+import asyncio
+import io
+import os
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import matplotlib.ticker as ptk
+import cartopy.crs as ccrs
+import catalogos
+import detalle
+import formats
+import proyeccion
+
+# Pirámide de teselas del planisferio y servidor local de teselas.
+# El planisferio AzimuthalEquidistant, hasta la latitud -80, se divide en teselas de
+# 256x256 píxeles con la numeración z/x/y de los mapas web: en el nivel z hay 2**z por
+# 2**z teselas, la x crece hacia la derecha y la y hacia abajo, con el eje de longitudes
+# invertido como en el planisferio. Cada proceso crea una figura por nivel, con la
+# retícula, las estrellas y las etiquetas de ese nivel, y para cada tesela solo cambia
+# los límites de los ejes. En cada nivel se dibujan las estrellas más brillantes de cada
+# catálogo hasta una densidad fija en el planisferio completo, con el nivel de detalle
+# del módulo detalle.py, y las etiquetas solo a partir del nivel indicado.
+TAMANO_TESELA = 256
+ZOOMS = range(0, 5)
+ZOOM_MAXIMO = 8
+LATITUD_MINIMA = -80.0
+
+# Densidad de estrellas y de etiquetas de cada catálogo, en estrellas por pulgada cuadrada
+# del planisferio completo en cada nivel, a 72 ppp.
+DENSIDAD_TESELAS = 3.0
+DENSIDAD_ETIQUETAS_TESELAS = 0.5
+ZOOM_ETIQUETAS = 3
+
+# Anchura en puntos del planisferio de formats.py, con la que se escalan los puntos y las
+# etiquetas de cada nivel.
+PUNTOS_PLANISFERIO = 40 * 72
+
+# Capas de las teselas: catálogo, color de los puntos y color de las etiquetas.
+CAPAS_TESELAS = (
+    (formats.CATALOGOS_PLANISFERIO["ptolomeo"], "white", "brown"),
+    (formats.CATALOGOS_PLANISFERIO["j2000"], "dodgerblue", "green"),
+)
+
+# Número de teselas que guarda en memoria el servidor.
+CAPACIDAD_CACHE = 512
+
+RUTA_TESELA = re.compile(r"^/(\d+)/(\d+)/(\d+)\.png$")
+
+# Página del visor, con Leaflet en un sistema de coordenadas simple.
+PAGINA_VISOR = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Planisferio</title>
+<link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css">
+<script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
+<style>html, body, #mapa {height: 100%%; margin: 0; background: black;}</style>
+</head>
+<body>
+<div id="mapa"></div>
+<script>
+var mapa = L.map("mapa", {crs: L.CRS.Simple, maxZoom: %d, minZoom: 0});
+L.tileLayer("/{z}/{x}/{y}.png", {tileSize: %d, noWrap: true, maxZoom: %d}).addTo(mapa);
+mapa.fitBounds([[-%d, 0], [0, %d]]);
+</script>
+</body>
+</html>
+"""
+
+_zooms = {}
+
+
+# Radio en coordenadas nativas del planisferio, hasta la latitud mínima.
+def radio_planisferio(projection):
+
+    x, y = proyeccion.proyectar(projection, [0.0], [LATITUD_MINIMA])
+
+    return float(np.hypot(x[0], y[0]))
+
+
+# Filas de las estrellas más brillantes de un catálogo, o de una selección, para una
+# densidad en un nivel: el número de estrellas es la densidad por el área del círculo del
+# planisferio en ese nivel.
+def estrellas_zoom(estrellas, zoom, densidad, seleccion=None):
+
+    pulgadas = TAMANO_TESELA * 2**zoom / 72.0
+    numero = densidad * np.pi / 4.0 * pulgadas**2
+
+    return np.sort(detalle.corte_brillo(detalle.orden_brillo(estrellas), seleccion, numero=numero))
+
+
+# Figura de un nivel, con la retícula, las estrellas y las etiquetas de ese nivel. Los
+# puntos y las letras se escalan con el tamaño del planisferio en el nivel.
+def preparar_zoom(zoom):
+
+    fig = Figure(figsize=(TAMANO_TESELA / 72.0, TAMANO_TESELA / 72.0), dpi=72, facecolor="black")
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1], projection=ccrs.AzimuthalEquidistant(central_latitude=90))
+    ax.set_facecolor("black")
+
+    gl = ax.gridlines(crs=ccrs.PlateCarree(), linewidth=0.5, color="white", alpha=1, linestyle="-")
+    gl.xlocator = ptk.FixedLocator(np.arange(-180, 180, 10))
+    gl.ylocator = ptk.FixedLocator(np.linspace(-80, 90, 18, endpoint=True))
+
+    escala = min(max(TAMANO_TESELA * 2**zoom / PUNTOS_PLANISFERIO, 0.25), 2.0)
+    for nombre, color, color_etiquetas in CAPAS_TESELAS:
+        estrellas = catalogos.cargar_catalogo(nombre)
+        seleccion = estrellas_zoom(estrellas, zoom, DENSIDAD_TESELAS)
+        x, y = proyeccion.coordenadas_nativas(estrellas, "puntos", ax.projection, estrellas["lon"], estrellas["lat"])
+        ax.scatter(
+            x[seleccion],
+            y[seleccion],
+            color=color,
+            s=np.pi * (estrellas["tam"][seleccion] * escala) ** 2,
+            transform=ax.transData,
+        )
+        if zoom >= ZOOM_ETIQUETAS:
+            textos = np.char.add(np.char.add(estrellas["secuencia"].astype(str), " "), estrellas["codigo"])
+            lon_etiq, lat_etiq, ha_etiq, va_etiq = formats.etiquetas_planisferio(estrellas)
+            formats.anotar(
+                ax,
+                estrellas,
+                "etiquetas_planisferio",
+                textos,
+                lon_etiq,
+                lat_etiq,
+                ha_etiq,
+                va_etiq,
+                estrellas_zoom(estrellas, zoom, DENSIDAD_ETIQUETAS_TESELAS, seleccion),
+                color=color_etiquetas,
+                weight="bold",
+                size=7 * escala,
+            )
+
+    return {"figura": fig, "ax": ax, "radio": radio_planisferio(ax.projection)}
+
+
+# Imagen PNG de una tesela, con la figura de su nivel.
+def dibujar_tesela(z, x, y):
+
+    if z not in _zooms:
+        _zooms[z] = preparar_zoom(z)
+    estado = _zooms[z]
+
+    radio = estado["radio"]
+    lado = 2.0 * radio / 2**z
+    estado["ax"].set_xlim(radio - lado * x, radio - lado * (x + 1))
+    estado["ax"].set_ylim(radio - lado * (y + 1), radio - lado * y)
+
+    salida = io.BytesIO()
+    estado["figura"].savefig(salida, format="png", dpi=72, facecolor="black")
+
+    return salida.getvalue()
+
+
+# Ruta en disco de una tesela.
+def ruta_tesela(directorio, z, x, y):
+
+    return os.path.join(directorio, str(z), str(x), str(y) + ".png")
+
+
+# Escritura de una tesela en disco, con un fichero temporal para que el servidor no lea
+# nunca una tesela a medio escribir.
+def escribir_tesela(directorio, z, x, y, datos):
+
+    ruta = ruta_tesela(directorio, z, x, y)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = ruta + "." + str(os.getpid()) + ".tmp"
+    with open(temporal, "wb") as archivo:
+        archivo.write(datos)
+    os.replace(temporal, ruta)
+
+    return ruta
+
+
+# Preparación de cada proceso de dibujo de teselas: motor Agg y catálogos.
+def iniciar_proceso():
+
+    matplotlib.use("Agg", force=True)
+
+    for nombre, _, _ in CAPAS_TESELAS:
+        catalogos.cargar_catalogo(nombre)
+
+
+# Dibujo y escritura de una columna de teselas de un nivel. Se devuelven las rutas.
+def imprimir_columna(directorio, z, x):
+
+    return [escribir_tesela(directorio, z, x, y, dibujar_tesela(z, x, y)) for y in range(2**z)]
+
+
+# Generación de la pirámide de teselas de los niveles indicados, en un conjunto de
+# procesos. Las columnas de teselas se reparten entre los procesos, del nivel más alto,
+# con más teselas, al más bajo. Se devuelve un resumen con el número de teselas y los
+# segundos empleados.
+def generar_piramide(directorio, zooms=ZOOMS, procesos=None):
+
+    inicio = time.perf_counter()
+    columnas = [(z, x) for z in sorted(zooms, reverse=True) for x in range(2**z)]
+
+    with ProcessPoolExecutor(max_workers=procesos, initializer=iniciar_proceso) as ejecutor:
+        pendientes = [ejecutor.submit(imprimir_columna, directorio, z, x) for z, x in columnas]
+        rutas = [ruta for pendiente in pendientes for ruta in pendiente.result()]
+
+    return {
+        "zooms": list(zooms),
+        "teselas": len(rutas),
+        "procesos": procesos or os.cpu_count(),
+        "segundos": time.perf_counter() - inicio,
+    }
+
+
+# Lectura de un fichero de tesela, o None si no existe.
+def leer_tesela(ruta):
+
+    try:
+        with open(ruta, "rb") as archivo:
+            return archivo.read()
+    except OSError:
+        return None
+
+
+# Carga de una tesela que no está en la caché: se lee del disco, o se dibuja en el
+# conjunto de procesos y se escribe en el disco.
+async def cargar_tesela(servidor, z, x, y):
+
+    bucle = asyncio.get_running_loop()
+    datos = await bucle.run_in_executor(None, leer_tesela, ruta_tesela(servidor["directorio"], z, x, y))
+    if datos is None:
+        datos = await bucle.run_in_executor(servidor["ejecutor"], dibujar_tesela, z, x, y)
+        await bucle.run_in_executor(None, escribir_tesela, servidor["directorio"], z, x, y, datos)
+        servidor["dibujadas"] = servidor["dibujadas"] + 1
+
+    return datos
+
+
+# Tesela para el servidor, de la caché en memoria o cargada. Si la misma tesela se pide
+# varias veces a la vez, se carga una sola vez. La caché se vacía por la tesela usada
+# hace más tiempo.
+async def obtener_tesela(servidor, z, x, y):
+
+    clave = (z, x, y)
+    cache = servidor["cache"]
+    if clave in cache:
+        cache.move_to_end(clave)
+        return cache[clave]
+
+    tarea = servidor["pendientes"].get(clave)
+    if tarea is None:
+        tarea = asyncio.ensure_future(cargar_tesela(servidor, z, x, y))
+        servidor["pendientes"][clave] = tarea
+        tarea.add_done_callback(lambda _: servidor["pendientes"].pop(clave, None))
+    datos = await asyncio.shield(tarea)
+
+    cache[clave] = datos
+    cache.move_to_end(clave)
+    if len(cache) > servidor["capacidad"]:
+        cache.popitem(last=False)
+
+    return datos
+
+
+# Respuesta HTTP con un estado, un tipo de contenido y un cuerpo.
+def respuesta_http(estado, tipo, cuerpo):
+
+    cabecera = (
+        "HTTP/1.1 "
+        + estado
+        + "\r\nContent-Type: "
+        + tipo
+        + "\r\nContent-Length: "
+        + str(len(cuerpo))
+        + "\r\nCache-Control: max-age=3600\r\nConnection: close\r\n\r\n"
+    )
+
+    return cabecera.encode("ascii") + cuerpo
+
+
+# Atención de una conexión: se lee la petición, se sirve la página del visor o una tesela,
+# y se cierra la conexión.
+async def atender(servidor, lector, escritor):
+
+    try:
+        peticion = (await lector.readline()).decode("latin-1").split()
+        while (await lector.readline()).strip():
+            pass
+
+        if len(peticion) < 2 or peticion[0] != "GET":
+            escritor.write(respuesta_http("405 Method Not Allowed", "text/plain", b""))
+            return
+
+        ruta = peticion[1].split("?")[0]
+        encontrada = RUTA_TESELA.match(ruta)
+        if ruta in ("/", "/index.html"):
+            pagina = PAGINA_VISOR % (ZOOM_MAXIMO, TAMANO_TESELA, ZOOM_MAXIMO, TAMANO_TESELA, TAMANO_TESELA)
+            escritor.write(respuesta_http("200 OK", "text/html; charset=utf-8", pagina.encode("utf-8")))
+        elif encontrada:
+            z, x, y = (int(valor) for valor in encontrada.groups())
+            if z > ZOOM_MAXIMO or x >= 2**z or y >= 2**z:
+                escritor.write(respuesta_http("404 Not Found", "text/plain", b""))
+            else:
+                try:
+                    datos = await obtener_tesela(servidor, z, x, y)
+                except Exception as error:
+                    escritor.write(
+                        respuesta_http("500 Internal Server Error", "text/plain", str(error).encode("utf-8"))
+                    )
+                    return
+                escritor.write(respuesta_http("200 OK", "image/png", datos))
+        else:
+            escritor.write(respuesta_http("404 Not Found", "text/plain", b""))
+    finally:
+        await escritor.drain()
+        escritor.close()
+
+
+# Servidor local de teselas, con asyncio.
+# Las teselas se leen del directorio de la pirámide; las que faltan se dibujan en un
+# conjunto de procesos y se escriben en el directorio. Las últimas teselas servidas se
+# guardan en una caché en memoria de la capacidad indicada.
+async def servir(directorio, puerto=8000, anfitrion="127.0.0.1", capacidad=CAPACIDAD_CACHE, procesos=None):
+
+    servidor = {
+        "directorio": directorio,
+        "cache": OrderedDict(),
+        "capacidad": capacidad,
+        "pendientes": {},
+        "dibujadas": 0,
+    }
+
+    with ProcessPoolExecutor(max_workers=procesos, initializer=iniciar_proceso) as ejecutor:
+        servidor["ejecutor"] = ejecutor
+        conexiones = await asyncio.start_server(
+            lambda lector, escritor: atender(servidor, lector, escritor), anfitrion, puerto
+        )
+        async with conexiones:
+            await conexiones.serve_forever()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Pirámide de teselas y servidor local del planisferio.")
+    parser.add_argument("directorio", help="directorio de las teselas")
+    parser.add_argument("--zooms", nargs="+", type=int, default=list(ZOOMS), help="niveles de la pirámide")
+    parser.add_argument("--procesos", type=int, default=None)
+    parser.add_argument("--servir", action="store_true", help="servir las teselas en lugar de generarlas")
+    parser.add_argument("--puerto", type=int, default=8000)
+    parser.add_argument("--capacidad", type=int, default=CAPACIDAD_CACHE, help="teselas en la caché en memoria")
+    argumentos = parser.parse_args()
+
+    if argumentos.servir:
+        print("http://127.0.0.1:" + str(argumentos.puerto) + "/")
+        asyncio.run(
+            servir(
+                argumentos.directorio, argumentos.puerto, capacidad=argumentos.capacidad, procesos=argumentos.procesos
+            )
+        )
+        return
+
+    resumen = generar_piramide(argumentos.directorio, argumentos.zooms, argumentos.procesos)
+    print(resumen["teselas"], "teselas en", round(resumen["segundos"], 1), "segundos")
+
+
+if __name__ == "__main__":
+    main()
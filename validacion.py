@@ -0,0 +1,323 @@
+# Licensed under the EUPL
+# Módulo validacion.py
+
+import argparse
+import re
+import sys
+import numpy as np
+import catalogos
+import constelaciones
+
+# Validación de los ficheros planos de los catálogos.
+# La descripción de cada catálogo en catalogos.CATALOGOS, con la posición de sus campos,
+# se compila una sola vez en una lista de comprobaciones por columna, y cada fichero se
+# lee una sola vez como matriz de bytes, como en catalogos.leer_matriz. Se comprueba que
+# los números estén bien escritos, con coma decimal, que las longitudes y latitudes estén
+# dentro de su intervalo, que las anclas de las etiquetas sean letras conocidas, que los
+# códigos de constelación existan, y que los códigos y números de secuencia coincidan
+# entre los catálogos que describen las mismas estrellas. Cada problema se indica con el
+# fichero, la línea y la columna, contadas desde 1 y en caracteres, como en los
+# compiladores.
+
+# Número con signo opcional y coma decimal, y número entero, con blancos a los lados.
+NUMERO = re.compile(rb" *-?[0-9]+(,[0-9]+)? *")
+ENTERO = re.compile(rb" *[0-9]+ *")
+CARACTERES_NUMERO = np.frombuffer(b" 0123456789,-", dtype=np.uint8)
+
+# Intervalos de las longitudes y latitudes. Las longitudes de las constelaciones que cruzan
+# el meridiano origen se continúan por debajo de 0 o por encima de 360 grados en los
+# ficheros, para que sean continuas.
+INTERVALOS = {"lon": (-360.0, 720.0), "lat": (-90.0, 90.0)}
+
+# Letras admitidas en los campos de letras.
+LETRAS = {
+    "region": ("BOR", "AUS"),
+    "zodiacal": ("", "Z"),
+    "cerca": ("", "C"),
+    "ancla_lon": ("L", "R", "C"),
+    "ancla_lat": ("T", "B", "C"),
+    "ancla_lon_planisferio": ("L", "R", "C"),
+    "ancla_lat_planisferio": ("T", "B", "C"),
+}
+
+# Clases de magnitud de los catálogos antiguos que no son números.
+CLASES_MAGNITUD = ("N", "O", "S", "C", "neb.")
+
+# Campos que no pueden estar en blanco.
+CAMPOS_OBLIGATORIOS = ("codigo", "secuencia", "lon", "lat", "tam")
+
+# Relaciones entre catálogos: los catálogos "iguales" tienen los mismos códigos y números
+# de secuencia, línea a línea; en los "contenidos", cada código y número de secuencia del
+# primero existe en el segundo.
+RELACIONES = (
+    ("alfonso_ptolomeo", "alfonso_j2000", "iguales"),
+    ("actuales", "actuales_alfonso", "iguales"),
+    ("actuales", "ptolomeo", "contenidos"),
+    ("actuales_alfonso", "alfonso_ptolomeo", "contenidos"),
+)
+
+_esquemas = {}
+
+
+# Tipo de comprobación de un campo.
+def tipo_campo(campo):
+
+    if campo in catalogos.CAMPOS_REALES:
+        return "numero"
+    if campo == "secuencia":
+        return "entero"
+    if campo in LETRAS:
+        return "letras"
+
+    return campo if campo in ("codigo", "magnitud") else "texto"
+
+
+# Esquema compilado de un catálogo: lista de (campo, inicio, fin, tipo), en el orden de
+# las columnas. Se compila una sola vez por proceso.
+def esquema_catalogo(nombre):
+
+    if nombre not in _esquemas:
+        campos = catalogos.CATALOGOS[nombre]["campos"]
+        _esquemas[nombre] = [
+            (campo, inicio, fin, tipo_campo(campo))
+            for campo, (inicio, fin) in sorted(campos.items(), key=lambda elemento: elemento[1])
+        ]
+
+    return _esquemas[nombre]
+
+
+# Problema de un fichero, con la línea y la columna contadas desde 1.
+def problema(nombre, linea, columna, campo, mensaje):
+
+    return {
+        "catalogo": nombre,
+        "fichero": catalogos.CATALOGOS[nombre]["fichero"],
+        "linea": int(linea) + 1,
+        "columna": int(columna) + 1,
+        "campo": campo,
+        "mensaje": mensaje,
+    }
+
+
+# Textos de un campo de la matriz de bytes, sin quitar los blancos.
+def celdas(matriz, inicio, fin):
+
+    return np.ascontiguousarray(matriz[:, inicio:fin]).view("S%d" % (fin - inicio)).ravel()
+
+
+# Columna del primer carácter de un número mal escrito: el primero que no puede formar
+# parte de un número o, si no hay ninguno, el primero que no es un blanco.
+def columna_error(fila, inicio):
+
+    extranos = np.flatnonzero(~np.isin(fila, CARACTERES_NUMERO))
+    if len(extranos):
+        return inicio + extranos[0]
+
+    return inicio + np.flatnonzero(fila != ord(" "))[0]
+
+
+# Comprobación de un campo numérico con el patrón indicado. Se devuelven los problemas y
+# la máscara de las filas con un número bien escrito, sin las filas en blanco.
+def validar_numero(nombre, matriz, campo, inicio, fin, patron=NUMERO):
+
+    problemas = []
+    vacios = (matriz[:, inicio:fin] == ord(" ")).all(axis=1)
+    validos = np.array([patron.fullmatch(celda) is not None for celda in celdas(matriz, inicio, fin)], dtype=bool)
+    validos = validos & ~vacios
+
+    for linea in np.flatnonzero(~validos & ~vacios):
+        texto = bytes(matriz[linea, inicio:fin]).decode("latin-1").strip()
+        columna = columna_error(matriz[linea, inicio:fin], inicio)
+        problemas.append(problema(nombre, linea, columna, campo, "número mal escrito: %r" % texto))
+
+    if campo in INTERVALOS and validos.any():
+        minimo, maximo = INTERVALOS[campo]
+        valores = np.full(len(matriz), np.nan)
+        valores[validos] = catalogos.columna_real(matriz[validos], inicio, fin)
+        for linea in np.flatnonzero((valores < minimo) | (valores > maximo)):
+            problemas.append(
+                problema(
+                    nombre,
+                    linea,
+                    inicio,
+                    campo,
+                    "%s fuera del intervalo [%g, %g]: %g" % (campo, minimo, maximo, valores[linea]),
+                )
+            )
+
+    return problemas, validos
+
+
+# Comprobación de un campo de un catálogo según su tipo.
+def validar_campo(nombre, matriz, campo, inicio, fin, tipo):
+
+    problemas = []
+    if campo in CAMPOS_OBLIGATORIOS:
+        for linea in np.flatnonzero((matriz[:, inicio:fin] == ord(" ")).all(axis=1)):
+            problemas.append(problema(nombre, linea, inicio, campo, "campo obligatorio en blanco"))
+
+    if tipo == "numero":
+        problemas = problemas + validar_numero(nombre, matriz, campo, inicio, fin)[0]
+
+    elif tipo == "entero":
+        problemas = problemas + validar_numero(nombre, matriz, campo, inicio, fin, ENTERO)[0]
+
+    elif tipo == "letras":
+        textos = catalogos.columna_texto(matriz, inicio, fin)
+        for linea in np.flatnonzero(~np.isin(textos, LETRAS[campo])):
+            problemas.append(
+                problema(
+                    nombre,
+                    linea,
+                    inicio,
+                    campo,
+                    "letra desconocida %r; se admiten %s" % (str(textos[linea]), ", ".join(LETRAS[campo])),
+                )
+            )
+
+    elif tipo == "codigo":
+        textos = catalogos.columna_texto(matriz, inicio, fin)
+        conocidos = np.array([codigo_conocido(codigo) for codigo in textos], dtype=bool)
+        for linea in np.flatnonzero(~conocidos & (textos != "")):
+            problemas.append(
+                problema(nombre, linea, inicio, campo, "código de constelación desconocido %r" % str(textos[linea]))
+            )
+
+    elif tipo == "magnitud":
+        textos = catalogos.columna_texto(matriz, inicio, fin)
+        numericos = np.array([NUMERO.fullmatch(texto.encode("latin-1")) is not None for texto in textos], dtype=bool)
+        for linea in np.flatnonzero(~numericos & ~np.isin(textos, CLASES_MAGNITUD) & (textos != "")):
+            problemas.append(problema(nombre, linea, inicio, campo, "magnitud desconocida %r" % str(textos[linea])))
+
+    return problemas
+
+
+# Si un código de constelación de un fichero es conocido: los de dos letras, del
+# Almagesto, y los de tres letras que se traducen.
+def codigo_conocido(codigo):
+
+    if len(codigo) == 3:
+        return codigo in catalogos.CODIGOS_TRES_LETRAS
+
+    return codigo in constelaciones.CONSTELACIONES
+
+
+# Validación de la matriz de bytes de un catálogo. Se devuelven los problemas y las
+# claves de sus estrellas, código de dos letras y número de secuencia, para comparar los
+# catálogos; la secuencia es -1 en las filas en que no es un número. Las líneas más
+# cortas que los campos se rellenan con blancos, como en leer_trozos.
+def validar_matriz(nombre, matriz):
+
+    ancho = max(fin for _, _, fin, _ in esquema_catalogo(nombre))
+    if matriz.shape[1] < ancho:
+        relleno = np.full((len(matriz), ancho - matriz.shape[1]), ord(" "), dtype=np.uint8)
+        matriz = np.hstack((matriz, relleno))
+
+    problemas = []
+    for campo, inicio, fin, tipo in esquema_catalogo(nombre):
+        problemas = problemas + validar_campo(nombre, matriz, campo, inicio, fin, tipo)
+
+    campos = catalogos.CATALOGOS[nombre]["campos"]
+    codigos = catalogos.traducir_codigos(catalogos.columna_texto(matriz, *campos["codigo"]))
+    inicio, fin = campos["secuencia"]
+    validos = validar_numero(nombre, matriz, "secuencia", inicio, fin, ENTERO)[1]
+    secuencias = np.full(len(matriz), -1, dtype=np.int16)
+    secuencias[validos] = catalogos.columna_entera(matriz[validos], inicio, fin)
+
+    return problemas, {"codigo": codigos, "secuencia": secuencias}
+
+
+# Comparación de los códigos y números de secuencia de dos catálogos relacionados. Los
+# problemas se indican en las líneas del primero.
+def validar_relacion(nombre, otro, relacion, claves, claves_otro):
+
+    problemas = []
+    inicio = catalogos.CATALOGOS[nombre]["campos"]["codigo"][0]
+
+    if relacion == "iguales":
+        comunes = min(len(claves["codigo"]), len(claves_otro["codigo"]))
+        distintas = (claves["codigo"][:comunes] != claves_otro["codigo"][:comunes]) | (
+            claves["secuencia"][:comunes] != claves_otro["secuencia"][:comunes]
+        )
+        for linea in np.flatnonzero(distintas):
+            problemas.append(
+                problema(
+                    nombre,
+                    linea,
+                    inicio,
+                    "codigo",
+                    "%s %d no coincide con %s %d en la línea %d de %s"
+                    % (
+                        claves["codigo"][linea],
+                        claves["secuencia"][linea],
+                        claves_otro["codigo"][linea],
+                        claves_otro["secuencia"][linea],
+                        linea + 1,
+                        otro,
+                    ),
+                )
+            )
+        if len(claves["codigo"]) != len(claves_otro["codigo"]):
+            problemas.append(
+                problema(
+                    nombre,
+                    comunes,
+                    inicio,
+                    "codigo",
+                    "%d estrellas frente a %d en %s" % (len(claves["codigo"]), len(claves_otro["codigo"]), otro),
+                )
+            )
+
+    else:
+        existentes = set(zip(claves_otro["codigo"].tolist(), claves_otro["secuencia"].tolist()))
+        for linea, clave in enumerate(zip(claves["codigo"].tolist(), claves["secuencia"].tolist())):
+            if clave not in existentes:
+                problemas.append(problema(nombre, linea, inicio, "codigo", "%s %d no existe en %s" % (clave + (otro,))))
+
+    return problemas
+
+
+# Validación de los catálogos indicados, o de todos, en una sola pasada por sus ficheros.
+# Las relaciones entre catálogos se comprueban cuando se validan los dos. Un fichero sin
+# estrellas, vacío o con la primera línea en blanco, es un problema de su primera línea y
+# no se compara con los demás. Se devuelve la lista de problemas, en el orden de los
+# ficheros y de las líneas.
+def validar(nombres=None):
+
+    problemas = []
+    claves = {}
+    for nombre in nombres or catalogos.CATALOGOS:
+        descripcion = catalogos.CATALOGOS[nombre]
+        matriz = catalogos.leer_matriz(catalogos.ruta_catalogo(nombre), descripcion["codificacion"])
+        if len(matriz) == 0:
+            problemas.append(problema(nombre, 0, 0, "fichero", "catálogo sin estrellas"))
+            continue
+        problemas_catalogo, claves[nombre] = validar_matriz(nombre, matriz)
+        problemas = problemas + sorted(problemas_catalogo, key=lambda p: (p["linea"], p["columna"]))
+
+    for nombre, otro, relacion in RELACIONES:
+        if nombre in claves and otro in claves:
+            problemas = problemas + validar_relacion(nombre, otro, relacion, claves[nombre], claves[otro])
+
+    return problemas
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Validación de los ficheros planos de los catálogos.")
+    parser.add_argument("catalogos", nargs="*", help="catálogos que se validan; por omisión, todos")
+    argumentos = parser.parse_args()
+    for nombre in argumentos.catalogos:
+        if nombre not in catalogos.CATALOGOS:
+            parser.error("catálogo desconocido %r; se admiten %s" % (nombre, ", ".join(catalogos.CATALOGOS)))
+
+    problemas = validar(argumentos.catalogos)
+    for p in problemas:
+        print("%s:%d:%d: %s: %s" % (p["fichero"], p["linea"], p["columna"], p["campo"], p["mensaje"]))
+
+    if problemas:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()